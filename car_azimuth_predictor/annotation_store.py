@@ -0,0 +1,123 @@
+"""Typed columnar store of the annotation table.
+
+The table is an uncompressed Arrow IPC file, memory-mapped on read, so a
+reader only touches the pages of the columns it asks for. Angles are
+float32, the image directories are dictionary-encoded and the train/val
+row indexes are kept in the schema metadata. Tables ending in `.csv` are
+read and written with pandas, as before.
+"""
+import os
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from car_azimuth_predictor.utils.angle_codecs import np_shift_05_pi
+
+SPLITS = {"train": 1, "val": 0}
+
+
+def compute_angle_columns(azimuth: np.ndarray) -> Dict[str, np.ndarray]:
+    """Angle columns derived from the azimuth in degrees, in table order"""
+    azimuth_radians = np.asarray(azimuth, dtype=np.float64) / 180 * np.pi
+    azimuth_radians_shifted = np.where(azimuth_radians < np.pi, azimuth_radians, azimuth_radians - 2 * np.pi)
+    azimuth_radians_shifted_05_pi = np_shift_05_pi(azimuth_radians)
+    columns = {
+        "azimuth_radians": azimuth_radians,
+        "azimuth_radians_shifted": azimuth_radians_shifted,
+        "azimuth_radians_abs": np.abs(azimuth_radians_shifted),
+        "azimuth_norm_abs": np.abs(azimuth_radians_shifted) / np.pi,
+        "azimuth_radians_shifted_0.5_pi": azimuth_radians_shifted_05_pi,
+        "azimuth_radians_shifted_0.5_pi_norm_abs": np.abs(azimuth_radians_shifted_05_pi / np.pi),
+        "azimuth_radians_sign": np.sign(azimuth_radians_shifted),
+        "azimuth_sin": np.sin(azimuth_radians),
+        "azimuth_cos": np.cos(azimuth_radians),
+    }
+    return {name: values.astype(np.float32) for name, values in columns.items()}
+
+
+def _is_csv(path) -> bool:
+    return str(path).endswith(".csv")
+
+
+def write_annotations(df: pd.DataFrame, path: str):
+    """Write the annotation table, with an `image_path` and an `is_train` column"""
+    if _is_csv(path):
+        df.to_csv(path, index=False)
+        return
+
+    import pyarrow as pa
+
+    image_dirs, image_files = zip(*map(os.path.split, df["image_path"])) if len(df) else ((), ())
+    columns = {
+        "image_dir": pa.array(image_dirs, pa.string()).dictionary_encode(),
+        "image_file": pa.array(image_files, pa.string()),
+        "is_train": pa.array(df["is_train"].to_numpy(dtype=np.int8)),
+    }
+    for name in df.columns:
+        if name not in ["image_path", "is_train"]:
+            columns[name] = pa.array(df[name].to_numpy(dtype=np.float32))
+
+    is_train = df["is_train"].to_numpy()
+    metadata = {
+        f"{split}_rows": np.flatnonzero(is_train == value).astype(np.int32).tobytes()
+        for split, value in SPLITS.items()
+    }
+    table = pa.table(columns).replace_schema_metadata(metadata)
+
+    # Written to a temporary file first: readers may still map the previous table
+    with pa.OSFile(f"{path}.tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(f"{path}.tmp", path)
+
+
+def read_annotations(path: str, columns: Optional[Iterable[str]] = None, split: str = None) -> pd.DataFrame:
+    """Columns `columns` (default: all) of the rows of `split` ("train", "val" or None for all)"""
+    columns = list(columns) if columns is not None else None
+    if _is_csv(path):
+        usecols = None if columns is None else list(dict.fromkeys(columns + (["is_train"] if split else [])))
+        df = pd.read_csv(path, usecols=usecols)
+        if split is not None:
+            df = df[df["is_train"] == SPLITS[split]]
+        return df if columns is None else df[columns]
+
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    with pa.memory_map(str(path)) as source:
+        table = pa.ipc.open_file(source).read_all()
+    stored_columns = [name for name in table.column_names if name not in ["image_dir", "image_file"]]
+    columns = columns if columns is not None else ["image_path", *stored_columns]
+
+    # Projected before the row selection, so only the requested columns are copied
+    table = table.select(
+        [name for column in columns for name in (["image_dir", "image_file"] if column == "image_path" else [column])]
+    )
+    if split is not None:
+        table = table.take(np.frombuffer(table.schema.metadata[f"{split}_rows".encode()], dtype=np.int32))
+
+    data = {}
+    for name in columns:
+        if name == "image_path":
+            # Joined like os.path.join: no separator after an empty directory or one ending with it
+            image_dir = pc.cast(table["image_dir"], pa.string())
+            needs_sep = pc.and_(pc.not_equal(image_dir, ""), pc.invert(pc.ends_with(image_dir, os.sep)))
+            image_dir = pc.if_else(needs_sep, pc.binary_join_element_wise(image_dir, os.sep, ""), image_dir)
+            data[name] = pc.binary_join_element_wise(image_dir, table["image_file"], "").to_numpy(zero_copy_only=False)
+        else:
+            data[name] = table[name].to_numpy()
+    return pd.DataFrame(data)
+
+
+def count_annotations(path: str) -> Dict[str, int]:
+    """Number of rows of every split, without reading the table"""
+    if _is_csv(path):
+        is_train = pd.read_csv(path, usecols=["is_train"])["is_train"]
+        return {split: int((is_train == value).sum()) for split, value in SPLITS.items()}
+
+    import pyarrow as pa
+
+    with pa.memory_map(str(path)) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata
+    return {split: len(metadata[f"{split}_rows".encode()]) // 4 for split in SPLITS}
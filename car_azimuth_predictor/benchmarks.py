@@ -0,0 +1,339 @@
+"""Offline benchmark suite of the data pipeline, the model and end-to-end inference.
+
+Everything runs on a small synthetic dataset (random JPEGs and annotations)
+and a randomly initialized backbone, so no download is needed. Results are
+plain dicts, written as JSON by scripts/benchmark_suite.py and compared
+between commits with `compare_results`. TensorFlow is imported on use.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+from functools import partial
+from typing import Callable, Dict, Iterable
+
+import numpy as np
+import pandas as pd
+from omegaconf import DictConfig, OmegaConf
+
+from car_azimuth_predictor.annotation_store import compute_angle_columns, write_annotations
+
+BENCHMARKS = ["prepare_input", "augmentation", "train_iterator", "forward_latency", "inference", "metrics"]
+# Names of the results compared with a baseline; counts and parameters are not
+THROUGHPUT_RESULTS = ["images_per_second"]
+TIME_RESULTS = ["median_ms", "p90_ms", "load_seconds"]
+# Suffix of the ns/sample results of benchmark_metrics, named after the codecs and metrics
+NS_PER_SAMPLE_SUFFIX = "_ns"
+
+
+def make_synthetic_dataset(root_path: str, n_images: int = 256, image_size=(240, 320), val_fraction: float = 0.2, seed: int = 0) -> dict:
+    """Random smooth JPEGs of `image_size` (height, width) and their annotation table in `root_path`"""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    images_path = os.path.join(root_path, "images")
+    os.makedirs(images_path, exist_ok=True)
+
+    image_paths = []
+    for i in range(n_images):
+        # Upscaled noise compresses like a photo rather than like white noise
+        noise = rng.integers(0, 256, size=(image_size[0] // 8, image_size[1] // 8, 3), dtype=np.uint8)
+        image_path = os.path.join(images_path, f"synthetic_{i:05d}.jpg")
+        Image.fromarray(noise).resize(image_size[::-1], Image.BILINEAR).save(image_path, quality=90)
+        image_paths.append(image_path)
+
+    azimuth = rng.uniform(0, 360, size=n_images)
+    df = pd.DataFrame(
+        {
+            "image_path": image_paths,
+            "is_train": (rng.random(n_images) >= val_fraction).astype(int),
+            "azimuth": azimuth,
+            "elevation": rng.uniform(-10, 40, size=n_images),
+            "distance": rng.uniform(2, 20, size=n_images),
+        }
+    )
+    for name, values in compute_angle_columns(azimuth).items():
+        df[name] = values
+    annotations_path = os.path.join(root_path, "annotations_angles.arrow")
+    write_annotations(df, annotations_path)
+
+    return {
+        "annotations_path": annotations_path,
+        "images_path": images_path,
+        "n_train": int(df["is_train"].sum()),
+        "n_val": int((df["is_train"] == 0).sum()),
+    }
+
+
+def synthetic_config(config: DictConfig, dataset: dict) -> DictConfig:
+    """Copy of `config` reading the synthetic dataset, with a randomly initialized backbone"""
+    config = OmegaConf.create(OmegaConf.to_container(config, resolve=False))
+    config.dataset_generation.df_path = dataset["annotations_path"]
+    config.dataset_generation.images_zip_path = None
+    config.model_training.backbone_weights = None
+    return config
+
+
+def environment() -> dict:
+    import tensorflow as tf
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "tensorflow": tf.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def time_epochs(dataset, n_epochs: int):
+    """Number of images of an epoch of (x, y) batches, and the time of every epoch"""
+    timings = []
+    for _ in range(n_epochs):
+        start_time = time.perf_counter()
+        n_images = sum(int(x_batch.shape[0]) for x_batch, _ in dataset)
+        timings.append(time.perf_counter() - start_time)
+    return n_images, timings
+
+
+def epoch_report(n_images: int, timings) -> dict:
+    # The first epoch includes tf.data warmup
+    return {"images_per_epoch": n_images, "epoch_seconds": timings, "images_per_second": n_images / min(timings)}
+
+
+def ns_per_sample(fn: Callable, n_samples: int, min_seconds: float = 0.2) -> float:
+    """Best time of repeated calls, in nanoseconds per sample"""
+    fn()
+    best, total, n_calls = float("inf"), 0.0, 0
+    while total < min_seconds or n_calls < 3:
+        start_time = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start_time
+        best, total, n_calls = min(best, elapsed), total + elapsed, n_calls + 1
+    return best / n_samples * 1e9
+
+
+def _decoded_train_dataset(config: DictConfig, gt_cols):
+    import tensorflow as tf
+
+    from car_azimuth_predictor.annotation_store import read_annotations
+    from car_azimuth_predictor.utils.training_tools import prepare_input
+
+    df_train = read_annotations(config.dataset_generation.df_path, ["image_path", *gt_cols], split="train")
+    image_size = (config.dataset_generation.image_height, config.dataset_generation.image_width)
+    return tf.data.Dataset.from_tensor_slices((df_train["image_path"], df_train[gt_cols])).map(
+        partial(prepare_input, image_size=image_size), num_parallel_calls=tf.data.AUTOTUNE
+    )
+
+
+def benchmark_prepare_input(config: DictConfig, approach: str, batch_size: int, n_epochs: int) -> dict:
+    """JPEG read, decode and resize"""
+    import tensorflow as tf
+
+    from car_azimuth_predictor.train_model import get_approach_targets
+
+    gt_cols, _ = get_approach_targets(approach)
+    dataset = _decoded_train_dataset(config, gt_cols).batch(batch_size).prefetch(tf.data.AUTOTUNE)
+    return epoch_report(*time_epochs(dataset, n_epochs))
+
+
+def benchmark_augmentation(config: DictConfig, approach: str, batch_size: int, n_epochs: int) -> dict:
+    """Per-image albumentations and graph batch augmentation of images decoded beforehand"""
+    import tensorflow as tf
+
+    from car_azimuth_predictor.batch_augmentation import augment_batch_compiled, batch_augmentation_seeds
+    from car_azimuth_predictor.train_model import get_approach_targets
+    from car_azimuth_predictor.utils.training_tools import CustomHorizontalFlip, augment_image
+
+    gt_cols, pose_flip_fn = get_approach_targets(approach)
+    decoded = _decoded_train_dataset(config, gt_cols).cache()
+    for _ in decoded:
+        pass
+
+    datasets = {
+        "albumentations": decoded.map(
+            partial(augment_image, custom_horizontal_flip=CustomHorizontalFlip(pose_flip_fn)),
+            num_parallel_calls=tf.data.AUTOTUNE,
+        ).batch(batch_size, drop_remainder=True),
+        "batch": tf.data.Dataset.zip((decoded.batch(batch_size, drop_remainder=True), batch_augmentation_seeds(0))).map(
+            lambda batch, seed: augment_batch_compiled(*batch, seed=seed, pose_flip_fn=pose_flip_fn),
+            num_parallel_calls=tf.data.AUTOTUNE,
+        ),
+    }
+    return {name: epoch_report(*time_epochs(dataset.prefetch(tf.data.AUTOTUNE), n_epochs)) for name, dataset in datasets.items()}
+
+
+def benchmark_train_iterator(config: DictConfig, approach: str, batch_size: int, n_epochs: int) -> dict:
+    """The train dataset of generate_datasets, as configured (with augmentation)"""
+    from car_azimuth_predictor.dataset_generation import generate_datasets
+    from car_azimuth_predictor.train_model import get_approach_targets
+
+    gt_cols, pose_flip_fn = get_approach_targets(approach)
+    train_dataset, _ = generate_datasets(config, gt_cols=gt_cols, pose_flip_fn=pose_flip_fn, batch_size=batch_size, augment=True)
+    return epoch_report(*time_epochs(train_dataset, n_epochs))
+
+
+def benchmark_forward_latency(model, batch_sizes: Iterable[int] = (1, 8, 32, 128), n_repeats: int = 10) -> dict:
+    """Latency of model.predict_on_batch on random images, per batch size"""
+    rng = np.random.default_rng(0)
+    results = {}
+    for batch_size in batch_sizes:
+        images = rng.uniform(0, 255, size=(batch_size, *model.input_shape[1:])).astype(np.float32)
+        model.predict_on_batch(images)
+        timings = []
+        for _ in range(n_repeats):
+            start_time = time.perf_counter()
+            model.predict_on_batch(images)
+            timings.append(time.perf_counter() - start_time)
+        median_seconds = float(np.median(timings))
+        results[str(batch_size)] = {
+            "median_ms": median_seconds * 1e3,
+            "p90_ms": float(np.percentile(timings, 90)) * 1e3,
+            "images_per_second": batch_size / median_seconds,
+        }
+    return results
+
+
+def benchmark_inference(model_path: str, images_path: str, approach: str, batch_size: int, n_epochs: int) -> dict:
+    """Model loading, then the tf.data decoding, prediction and azimuth conversion
+    of scripts/inference.py over every image of `images_path`"""
+    from car_azimuth_predictor.inference import convert_azimuths, generate_inference_dataset, load_inference_model, predict_dataset
+
+    image_paths = [os.path.join(images_path, image) for image in sorted(os.listdir(images_path))]
+    start_time = time.perf_counter()
+    model = load_inference_model(model_path)
+    load_seconds = time.perf_counter() - start_time
+
+    timings = []
+    for _ in range(n_epochs):
+        start_time = time.perf_counter()
+        convert_azimuths(predict_dataset(model, generate_inference_dataset(image_paths, batch_size)), approach)
+        timings.append(time.perf_counter() - start_time)
+    return {"load_seconds": load_seconds, **epoch_report(len(image_paths), timings)}
+
+
+def benchmark_metrics(approach: str, n_samples: int = 100_000) -> dict:
+    """ns/sample of the codecs, of the metric updates and of the loss"""
+    import tensorflow as tf
+
+    from car_azimuth_predictor.train_model import get_loss_and_metrics
+    from car_azimuth_predictor.utils.angle_codecs import CODECS
+
+    rng = np.random.default_rng(0)
+    angles = rng.uniform(-np.pi, np.pi, size=n_samples).astype(np.float32)
+    results = {}
+    for encoding, codec in CODECS.items():
+        encoded = codec.np_encode(angles)
+        out = np.empty(n_samples, np.float32)
+        results[f"{encoding}_np_encode_ns"] = ns_per_sample(lambda: codec.np_encode(angles), n_samples)
+        results[f"{encoding}_np_decode_ns"] = ns_per_sample(lambda: codec.np_decode(encoded, out=out), n_samples)
+
+    loss, metrics = get_loss_and_metrics(approach)
+    encoding = "sin_cos" if approach == "1" else "double_sigmoid"
+    y_true = tf.constant(CODECS[encoding].np_encode(angles))
+    y_pred = tf.constant(CODECS[encoding].np_encode(angles + rng.normal(0, 0.3, size=n_samples).astype(np.float32)))
+    for metric in metrics:
+
+        def update(metric=metric):
+            metric.update_state(y_true, y_pred)
+
+        results[f"{metric.name}_update_ns"] = ns_per_sample(tf.function(update), n_samples)
+    loss_fn = tf.function(lambda: loss(y_true, y_pred))
+    results["loss_ns"] = ns_per_sample(lambda: loss_fn().numpy(), n_samples)
+    return results
+
+
+def run_benchmarks(
+    config: DictConfig,
+    work_path: str,
+    approach: str = "2",
+    benchmarks: Iterable[str] = BENCHMARKS,
+    n_images: int = 256,
+    batch_size: int = 32,
+    n_epochs: int = 3,
+    batch_sizes: Iterable[int] = (1, 8, 32, 128),
+    n_repeats: int = 10,
+) -> dict:
+    """Run `benchmarks` on a synthetic dataset of `n_images` written to `work_path`"""
+    benchmarks = list(benchmarks)
+    unknown = set(benchmarks) - set(BENCHMARKS)
+    if unknown:
+        raise ValueError(f"Unknown benchmarks {sorted(unknown)}, choose from {BENCHMARKS}")
+
+    dataset = make_synthetic_dataset(work_path, n_images)
+    config = synthetic_config(config, dataset)
+    report = {
+        "environment": environment(),
+        "parameters": {"approach": approach, "n_images": n_images, "batch_size": batch_size, "n_epochs": n_epochs},
+        "results": {},
+    }
+    results = report["results"]
+
+    def run(name, fn):
+        start_time = time.perf_counter()
+        results[name] = fn()
+        print(f"{name}: {time.perf_counter() - start_time:.1f}s")
+
+    if "prepare_input" in benchmarks:
+        run("prepare_input", lambda: benchmark_prepare_input(config, approach, batch_size, n_epochs))
+    if "augmentation" in benchmarks:
+        run("augmentation", lambda: benchmark_augmentation(config, approach, batch_size, n_epochs))
+    if "train_iterator" in benchmarks:
+        run("train_iterator", lambda: benchmark_train_iterator(config, approach, batch_size, n_epochs))
+
+    if "forward_latency" in benchmarks or "inference" in benchmarks:
+        from car_azimuth_predictor.model_generation import generate_model, generate_top_model
+
+        model = generate_model(config, top_model=generate_top_model(approach, 100, 0.2))
+        if "forward_latency" in benchmarks:
+            run("forward_latency", lambda: benchmark_forward_latency(model, batch_sizes, n_repeats))
+        if "inference" in benchmarks:
+            model_path = os.path.join(work_path, "model.h5")
+            model.save(model_path)
+            run("inference", lambda: benchmark_inference(model_path, dataset["images_path"], approach, batch_size, n_epochs))
+
+    if "metrics" in benchmarks:
+        run("metrics", lambda: benchmark_metrics(approach))
+
+    return report
+
+
+def flatten_results(results: dict, prefix: str = "") -> Dict[str, float]:
+    """Numeric leaves of nested results, keyed by their dotted path (lists are skipped)"""
+    flat = {}
+    for name, value in results.items():
+        key = f"{prefix}{name}"
+        if isinstance(value, dict):
+            flat.update(flatten_results(value, f"{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[key] = float(value)
+    return flat
+
+
+def compare_results(results: dict, baseline: dict, tolerance: float = 0.1) -> pd.DataFrame:
+    """Every throughput (THROUGHPUT_RESULTS) and time (TIME_RESULTS and ns/sample) next to
+    its baseline value. A regression is a throughput lower, or a time higher, than the
+    baseline by more than `tolerance`"""
+    current, previous = flatten_results(results["results"]), flatten_results(baseline["results"])
+    rows = []
+    for key in sorted(set(current) & set(previous)):
+        name = key.split(".")[-1]
+        higher_is_better = name in THROUGHPUT_RESULTS
+        if not higher_is_better and name not in TIME_RESULTS and not name.endswith(NS_PER_SAMPLE_SUFFIX):
+            continue
+        ratio = current[key] / previous[key] if previous[key] else float("nan")
+        regression = ratio < 1 - tolerance if higher_is_better else ratio > 1 + tolerance
+        rows.append({"result": key, "value": current[key], "baseline": previous[key], "ratio": ratio, "regression": bool(regression)})
+    return pd.DataFrame(rows, columns=["result", "value", "baseline", "ratio", "regression"])
+
+
+def save_report(report: dict, output_path: str):
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
@@ -1,6 +1,4 @@
 import os
-import shutil
-import tempfile
 from pathlib import Path
 
 from omegaconf import DictConfig
@@ -8,18 +6,20 @@ from omegaconf import DictConfig
 from car_azimuth_predictor.utils.zip_tools import unzip
 
 
-def collect_data(config: DictConfig):
-    """Function to collect data into the raw folder"""
+def collect_data(config: DictConfig, num_workers: int = None):
+    """Function to collect data into the raw folder
+
+    Files already extracted by a previous (or interrupted) run are kept.
+    """
 
     output_path = Path(os.getcwd()) / config.data_gathering.local_dataset_path
-    if os.path.exists(output_path):
-        shutil.rmtree(output_path)
     os.makedirs(output_path, exist_ok=True)
 
-    unzip(
+    counts = unzip(
         file_path=config.data_gathering.pascal_zip_file_location,
-        target_path=output_path,
+        target_path=str(output_path),
         members=config.data_gathering.members_to_extract,
+        num_workers=num_workers,
     )
 
-    print(f"Save the output to {output_path}")
+    print(f"Save the output to {output_path} ({counts['extracted']} extracted, {counts['skipped']} up to date)")
@@ -3,16 +3,19 @@ from functools import partial
 from pathlib import Path
 from typing import Callable, Iterable
 
-import pandas as pd
 import tensorflow as tf
 from omegaconf import DictConfig
 
+from car_azimuth_predictor.annotation_store import read_annotations
+from car_azimuth_predictor.batch_augmentation import augment_batch_compiled, batch_augmentation_seeds
+from car_azimuth_predictor.image_shard_cache import build_image_shards, load_image_shards
 from car_azimuth_predictor.utils.training_tools import (
     CustomHorizontalFlip,
     augment_image,
     prepare_input,
     preprocess_image,
 )
+from car_azimuth_predictor.zip_image_source import image_source_from_config
 
 
 def generate_datasets(
@@ -21,8 +24,20 @@ def generate_datasets(
     pose_flip_fn: Callable,
     batch_size: int,
     augment: bool,
+    image_cache_path: str = None,
+    input_context: tf.distribute.InputContext = None,
 ):
-    """Function to adjust prediction values"""
+    """Function to adjust prediction values
+
+    With `image_cache_path`, images are streamed from pre-decoded shards,
+    (re)built there first when missing or stale. Images are read from the
+    zip of `dataset_generation.images_zip_path` when set. With an `input_context`
+    (multi-worker training), every worker only reads its own share of the
+    rows, and `batch_size` is the per-worker batch size.
+    """
+    num_shards, shard_index = 1, 0
+    if input_context is not None:
+        num_shards, shard_index = input_context.num_input_pipelines, input_context.input_pipeline_id
 
     root_path = Path(os.getcwd())
 
@@ -31,51 +46,87 @@ def generate_datasets(
     # df_val_path = root_path / config.dataset_generation.df_val_path
     # df_test_path = root_path / config.dataset_generation.df_test_path
 
-    df = pd.read_csv(df_path)
-    df_train = df[df["is_train"] == 1]
-    df_val = df[df["is_train"] == 0]
-
-    train_dataset = tf.data.Dataset.from_tensor_slices(
-        (df_train["image_path"], df_train[gt_cols])
-    )
-    val_dataset = tf.data.Dataset.from_tensor_slices(
-        (df_val["image_path"], df_val[gt_cols])
-    )
-
-    train_dataset = train_dataset.shuffle(df_train.shape[0])
-
     image_size = (
         config.dataset_generation.image_height,
         config.dataset_generation.image_width,
     )
 
-    prepare_input_partial = partial(prepare_input, image_size=image_size)
-    train_dataset = train_dataset.map(
-        prepare_input_partial,
-        num_parallel_calls=tf.data.AUTOTUNE,
-    )
-
-    if augment:
-        custom_horizontal_flip = CustomHorizontalFlip(pose_flip_fn)
-        augment_image_partial = partial(
-            augment_image, custom_horizontal_flip=custom_horizontal_flip
+    image_source = image_source_from_config(config)
+
+    if image_cache_path is not None:
+        manifest = build_image_shards(
+            df_path,
+            gt_cols,
+            image_size,
+            image_cache_path,
+            n_shards=config.dataset_generation.image_cache_n_shards,
+            shuffle_seed=config.dataset_generation.image_cache_shuffle_seed,
+            image_source=image_source,
         )
-        train_dataset = train_dataset.map(
-            augment_image_partial, num_parallel_calls=tf.data.AUTOTUNE
+        train_dataset = (
+            load_image_shards(image_cache_path, manifest, "train", shuffle=True, num_shards=num_shards, shard_index=shard_index)
+            .shuffle(min(manifest["counts"]["train"], config.dataset_generation.image_cache_shuffle_buffer))
+        )
+        # Val streams in a fixed order, so sharding its records partitions it the
+        # same way as the JPEG path (train_approach_model counts its steps so)
+        val_dataset = load_image_shards(image_cache_path, manifest, "val", shuffle=False).shard(
+            num_shards, shard_index
         )
+    else:
+        df_train = read_annotations(df_path, ["image_path", *gt_cols], split="train")
+        df_val = read_annotations(df_path, ["image_path", *gt_cols], split="val")
 
-    train_dataset = (
-        train_dataset.map(preprocess_image, num_parallel_calls=tf.data.AUTOTUNE)
-        .batch(batch_size, drop_remainder=True)
-        .prefetch(tf.data.AUTOTUNE)
-    )
+        train_dataset = tf.data.Dataset.from_tensor_slices(
+            (df_train["image_path"], df_train[gt_cols])
+        ).shard(num_shards, shard_index)
+        val_dataset = tf.data.Dataset.from_tensor_slices(
+            (df_val["image_path"], df_val[gt_cols])
+        ).shard(num_shards, shard_index)
 
-    val_dataset = (
-        val_dataset.map(
+        train_dataset = train_dataset.shuffle(df_train.shape[0])
+
+        prepare_input_partial = partial(prepare_input, image_size=image_size, image_source=image_source)
+        train_dataset = train_dataset.map(
+            prepare_input_partial,
+            num_parallel_calls=tf.data.AUTOTUNE,
+        )
+        val_dataset = val_dataset.map(
             prepare_input_partial,
             num_parallel_calls=tf.data.AUTOTUNE,
         )
-        .map(preprocess_image, num_parallel_calls=tf.data.AUTOTUNE)
+
+    if augment and config.dataset_generation.augmentation == "batch":
+        train_dataset = tf.data.Dataset.zip(
+            (
+                train_dataset.batch(batch_size, drop_remainder=True),
+                batch_augmentation_seeds(config.dataset_generation.augmentation_seed + shard_index),
+            )
+        )
+        train_dataset = train_dataset.map(
+            lambda batch, seed: augment_batch_compiled(*batch, seed=seed, pose_flip_fn=pose_flip_fn),
+            num_parallel_calls=tf.data.AUTOTUNE,
+        )
+        train_dataset = train_dataset.map(
+            preprocess_image, num_parallel_calls=tf.data.AUTOTUNE
+        ).prefetch(tf.data.AUTOTUNE)
+    else:
+        if augment:
+            custom_horizontal_flip = CustomHorizontalFlip(pose_flip_fn)
+            augment_image_partial = partial(
+                augment_image, custom_horizontal_flip=custom_horizontal_flip
+            )
+            train_dataset = train_dataset.map(
+                augment_image_partial, num_parallel_calls=tf.data.AUTOTUNE
+            )
+
+        train_dataset = (
+            train_dataset.map(preprocess_image, num_parallel_calls=tf.data.AUTOTUNE)
+            .batch(batch_size, drop_remainder=True)
+            .prefetch(tf.data.AUTOTUNE)
+        )
+
+    val_dataset = (
+        val_dataset.map(preprocess_image, num_parallel_calls=tf.data.AUTOTUNE)
         .batch(batch_size, drop_remainder=False)
         .prefetch(tf.data.AUTOTUNE)
     )
@@ -0,0 +1,133 @@
+import json
+import math
+import os
+import shutil
+import socket
+import tempfile
+import time
+from typing import List, Sequence, Tuple
+
+import tensorflow as tf
+from omegaconf import DictConfig
+
+from car_azimuth_predictor.annotation_store import count_annotations
+
+
+def make_tf_config(worker_hosts: Sequence[str], worker_index: int) -> str:
+    """TF_CONFIG of one worker of a cluster; worker 0 is the chief"""
+    return json.dumps({"cluster": {"worker": list(worker_hosts)}, "task": {"type": "worker", "index": worker_index}})
+
+
+def free_local_ports(n_ports: int) -> List[int]:
+    sockets = []
+    for _ in range(n_ports):
+        sock = socket.socket()
+        sock.bind(("localhost", 0))
+        sockets.append(sock)
+    ports = [sock.getsockname()[1] for sock in sockets]
+    for sock in sockets:
+        sock.close()
+    return ports
+
+
+def get_distribution_strategy(distributed: bool) -> tf.distribute.Strategy:
+    """MultiWorkerMirroredStrategy over the cluster of TF_CONFIG, or the default strategy.
+
+    Must be called before any other TensorFlow operation of the process.
+    """
+    if not distributed:
+        return tf.distribute.get_strategy()
+    if "TF_CONFIG" not in os.environ:
+        raise ValueError("Distributed training needs TF_CONFIG, see scripts/launch_local_workers.py")
+    return tf.distribute.MultiWorkerMirroredStrategy(
+        communication_options=tf.distribute.experimental.CommunicationOptions(
+            implementation=tf.distribute.experimental.CommunicationImplementation.RING
+        )
+    )
+
+
+def is_chief(strategy: tf.distribute.Strategy) -> bool:
+    resolver = getattr(strategy, "cluster_resolver", None)
+    if resolver is None or resolver.task_type is None:
+        return True
+    return resolver.task_type == "chief" or (
+        resolver.task_type == "worker"
+        and resolver.task_id == 0
+        and "chief" not in resolver.cluster_spec().as_dict()
+    )
+
+
+def writable_path(strategy: tf.distribute.Strategy, path: str) -> str:
+    """`path` on the chief; a temporary path on the other workers, which must
+    take part in every save but whose files are thrown away"""
+    if path is None or is_chief(strategy):
+        return path
+    return os.path.join(tempfile.mkdtemp(prefix="worker_"), os.path.basename(path.rstrip("/")))
+
+
+def remove_worker_path(strategy: tf.distribute.Strategy, path: str):
+    if path is not None and not is_chief(strategy):
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+
+def count_split_rows(config: DictConfig) -> dict:
+    return count_annotations(os.path.join(os.getcwd(), config.dataset_generation.df_path))
+
+
+def distributed_steps(n_train_rows: int, n_val_rows: int, batch_size: int, n_workers: int) -> Tuple[int, int]:
+    """Steps per epoch and validation steps of `n_workers` workers with a per-worker `batch_size`.
+
+    The train split is repeated, an epoch is as many global batches as fit in
+    it. The validation split is read once and sharded row by row, so the
+    worker with the most rows sets the number of steps, and the others get
+    partial or empty batches: every validation row is evaluated exactly once.
+    """
+    steps_per_epoch = n_train_rows // (batch_size * n_workers)
+    validation_steps = max(1, math.ceil(math.ceil(n_val_rows / n_workers) / batch_size))
+    return steps_per_epoch, validation_steps
+
+
+def scaled_learning_rate(learning_rate: float, n_workers: int) -> float:
+    """Linear scaling rule: the learning rate follows the global batch size"""
+    return learning_rate * n_workers
+
+
+class ThroughputLogger(tf.keras.callbacks.Callback):
+    """Times every epoch and writes the training throughput to `report_path` (JSON),
+    unless it is None"""
+
+    def __init__(self, report_path: str, n_workers: int, global_batch_size: int, steps_per_epoch: int):
+        super().__init__()
+        self.report_path = report_path
+        self.n_workers = n_workers
+        self.global_batch_size = global_batch_size
+        self.steps_per_epoch = steps_per_epoch
+        self.epoch_seconds = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.start_time = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        # Excludes the validation at the end of the epoch
+        self.train_end_time = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.epoch_seconds.append(self.train_end_time - self.start_time)
+
+    def on_train_end(self, logs=None):
+        if self.report_path is None:
+            return
+        # The first epoch includes the tracing and the dataset warmup
+        steady_seconds = min(self.epoch_seconds[1:] or self.epoch_seconds)
+        with open(self.report_path, "w") as f:
+            json.dump(
+                {
+                    "n_workers": self.n_workers,
+                    "global_batch_size": self.global_batch_size,
+                    "steps_per_epoch": self.steps_per_epoch,
+                    "epoch_seconds": self.epoch_seconds,
+                    "images_per_sec": self.steps_per_epoch * self.global_batch_size / steady_seconds,
+                },
+                f,
+                indent=2,
+            )
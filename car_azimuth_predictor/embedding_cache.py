@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+from functools import partial
+from pathlib import Path
+from typing import Callable, Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+from omegaconf import DictConfig
+from tqdm import tqdm
+
+from car_azimuth_predictor.annotation_store import read_annotations
+from car_azimuth_predictor.prediction_cache import hash_file
+from car_azimuth_predictor.utils.training_tools import (
+    CustomHorizontalFlip,
+    augment_image,
+    prepare_input,
+    preprocess_image,
+)
+
+EMBEDDING_SIZE = 1280
+METADATA_FILENAME = "metadata.json"
+
+
+def embeddings_fingerprint(
+    df_path: str,
+    df,
+    gt_cols: Iterable[str],
+    image_size: Tuple[int, int],
+    backbone: tf.keras.Model,
+    n_augmented_variants: int,
+) -> str:
+    """Hash of the annotation table, of the targets, of the image size, of the
+    number of augmented variants, of the backbone weights and of the size and
+    modification time of every source image"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(hash_file(df_path).encode())
+    digest.update(json.dumps([list(gt_cols), list(image_size), n_augmented_variants]).encode())
+    for weights in backbone.get_weights():
+        digest.update(f"{weights.dtype}{weights.shape}".encode())
+        digest.update(np.ascontiguousarray(weights).tobytes())
+    for image_path in df["image_path"]:
+        stat = os.stat(image_path)
+        digest.update(f"{image_path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def _image_dataset(df, gt_cols, image_size, batch_size, augment_fn=None):
+    dataset = tf.data.Dataset.from_tensor_slices((df["image_path"], df[gt_cols]))
+    dataset = dataset.map(
+        partial(prepare_input, image_size=image_size), num_parallel_calls=tf.data.AUTOTUNE
+    )
+    if augment_fn is not None:
+        dataset = dataset.map(augment_fn, num_parallel_calls=tf.data.AUTOTUNE)
+    return (
+        dataset.map(preprocess_image, num_parallel_calls=tf.data.AUTOTUNE)
+        .batch(batch_size, drop_remainder=False)
+        .prefetch(tf.data.AUTOTUNE)
+    )
+
+
+def _write_split(backbone, datasets, n_rows, n_targets, output_path: Path, split: str):
+    embeddings = np.lib.format.open_memmap(
+        output_path / f"{split}_embeddings.npy", mode="w+", dtype=np.float32, shape=(n_rows, EMBEDDING_SIZE)
+    )
+    targets = np.lib.format.open_memmap(
+        output_path / f"{split}_targets.npy", mode="w+", dtype=np.float32, shape=(n_rows, n_targets)
+    )
+
+    row = 0
+    for dataset in datasets:
+        for x_batch, y_batch in tqdm(dataset, desc=split):
+            batch_embeddings = backbone.predict_on_batch(x_batch)
+            embeddings[row:row + len(batch_embeddings)] = batch_embeddings
+            targets[row:row + len(batch_embeddings)] = y_batch.numpy()
+            row += len(batch_embeddings)
+
+    embeddings.flush()
+    targets.flush()
+
+
+def extract_embeddings(
+    config: DictConfig,
+    backbone: tf.keras.Model,
+    gt_cols: Iterable[str],
+    pose_flip_fn: Callable,
+    output_path: str,
+    batch_size: int = 64,
+    n_augmented_variants: int = 0,
+) -> dict:
+    """Run the backbone once over the train/val splits and store the embeddings and targets.
+
+    The train split is stored once as is, followed by `n_augmented_variants`
+    augmented passes (the targets follow the pose-aware flip). Arrays are
+    written as memory-mapped `.npy` files in `output_path`. Does nothing when
+    `output_path` already holds embeddings with the same
+    `embeddings_fingerprint`, otherwise they are replaced. Returns the metadata.
+    """
+    gt_cols = list(gt_cols)
+    root_path = Path(os.getcwd())
+    output_path = Path(output_path)
+    os.makedirs(output_path, exist_ok=True)
+
+    df_path = root_path / config.dataset_generation.df_path
+    df_train = read_annotations(df_path, ["image_path", *gt_cols], split="train")
+    df_val = read_annotations(df_path, ["image_path", *gt_cols], split="val")
+
+    image_size = (
+        config.dataset_generation.image_height,
+        config.dataset_generation.image_width,
+    )
+    fingerprint = embeddings_fingerprint(
+        df_path, pd.concat([df_train, df_val]), gt_cols, image_size, backbone, n_augmented_variants
+    )
+
+    metadata_path = output_path / METADATA_FILENAME
+    if metadata_path.exists():
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+        if metadata.get("fingerprint") == fingerprint:
+            print(f"Reusing the embeddings of {output_path}")
+            return metadata
+        # Removed first, so an interrupted rebuild is never picked up
+        os.remove(metadata_path)
+
+    augment_fn = partial(augment_image, custom_horizontal_flip=CustomHorizontalFlip(pose_flip_fn))
+    train_datasets = [_image_dataset(df_train, gt_cols, image_size, batch_size)] + [
+        _image_dataset(df_train, gt_cols, image_size, batch_size, augment_fn)
+        for _ in range(n_augmented_variants)
+    ]
+    _write_split(
+        backbone, train_datasets, len(df_train) * (1 + n_augmented_variants), len(gt_cols), output_path, "train"
+    )
+    _write_split(
+        backbone, [_image_dataset(df_val, gt_cols, image_size, batch_size)], len(df_val), len(gt_cols), output_path, "val"
+    )
+
+    metadata = {
+        "fingerprint": fingerprint,
+        "gt_cols": gt_cols,
+        "n_augmented_variants": n_augmented_variants,
+        "df_path": str(config.dataset_generation.df_path),
+        "image_size": list(image_size),
+        "n_train": len(df_train),
+        "n_val": len(df_val),
+    }
+    with open(metadata_path, "w") as f:
+        json.dump(metadata, f, indent=2)
+
+    return metadata
+
+
+def _embedding_dataset(embeddings_path, targets_path, batch_size, shuffle):
+    embeddings = np.load(embeddings_path, mmap_mode="r")
+    targets = np.load(targets_path, mmap_mode="r")
+
+    def gather(indexes):
+        # Sorted reads are sequential on the memory map
+        indexes = np.sort(indexes)
+        return np.asarray(embeddings[indexes]), np.asarray(targets[indexes])
+
+    def gather_batch(indexes):
+        x, y = tf.numpy_function(gather, [indexes], Tout=[tf.float32, tf.float32])
+        x.set_shape([None, embeddings.shape[1]])
+        y.set_shape([None, targets.shape[1]])
+        return x, y
+
+    dataset = tf.data.Dataset.range(len(embeddings))
+    if shuffle:
+        dataset = dataset.shuffle(len(embeddings), reshuffle_each_iteration=True)
+    return dataset.batch(batch_size).map(gather_batch).prefetch(tf.data.AUTOTUNE)
+
+
+def load_embedding_datasets(
+    cache_path: str, gt_cols: Iterable[str], batch_size: int
+) -> Tuple[tf.data.Dataset, tf.data.Dataset]:
+    """Train/val datasets of (embedding, target) batches read from the memory-mapped cache"""
+    cache_path = Path(cache_path)
+    with open(cache_path / METADATA_FILENAME) as f:
+        metadata = json.load(f)
+    if metadata["gt_cols"] != list(gt_cols):
+        raise ValueError(
+            f"Embedding cache was built for targets {metadata['gt_cols']}, not {list(gt_cols)}"
+        )
+
+    train_dataset = _embedding_dataset(
+        cache_path / "train_embeddings.npy", cache_path / "train_targets.npy", batch_size, shuffle=True
+    )
+    val_dataset = _embedding_dataset(
+        cache_path / "val_embeddings.npy", cache_path / "val_targets.npy", batch_size, shuffle=False
+    )
+
+    return train_dataset, val_dataset
@@ -0,0 +1,120 @@
+"""Angle errors of a prediction store sliced by the annotations of the images.
+
+The store rows are joined with the annotation table on the image path, then
+the errors are grouped by azimuth, elevation and distance bin and by split.
+Every statistic is computed for all groups at once: counts and sums with
+`np.bincount`, percentiles from a single sort by (group, error).
+"""
+from typing import Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+from car_azimuth_predictor.annotation_store import SPLITS, read_annotations
+from car_azimuth_predictor.prediction_store import store_angles
+from car_azimuth_predictor.utils.numpy_metrics import np_absolute_angle_errors
+
+# Quadrants of the azimuth told apart by the front/rear (α) and left/right (β) outputs of approach 2,
+# in the order of np_get_angle_from_double_sigmoids (counter-clockwise from the front)
+QUADRANTS = ["front_right", "rear_right", "rear_left", "front_left"]
+
+
+def join_annotations(store: dict, annotations_path: str, columns: Iterable[str] = ("azimuth", "elevation", "distance")) -> pd.DataFrame:
+    """Annotation rows (`columns` and `is_train`) of the images of the store, in store order"""
+    annotations = read_annotations(annotations_path, ["image_path", "is_train", *columns])
+    rows = pd.Index(annotations["image_path"]).get_indexer(np.asarray(store["image_ids"]))
+    if (rows < 0).any():
+        raise ValueError(f"{int((rows < 0).sum())} images of the store are not in {annotations_path}")
+    return annotations.iloc[rows].reset_index(drop=True)
+
+
+def grouped_error_statistics(groups: np.ndarray, n_groups: int, abs_errors: np.ndarray, percentiles: Iterable[float] = (50, 90)) -> pd.DataFrame:
+    """Count, mean, RMSE, percentiles (nearest rank) and acc_pi_6 of the absolute
+    errors (degrees) of every group in [0, n_groups)"""
+    groups = np.asarray(groups, dtype=np.int64)
+    abs_errors = np.asarray(abs_errors, dtype=np.float64)
+    counts = np.bincount(groups, minlength=n_groups)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        statistics = {
+            "count": counts,
+            "mean_absolute_angle_error": np.bincount(groups, abs_errors, n_groups) / counts,
+            "rmse": np.sqrt(np.bincount(groups, abs_errors ** 2, n_groups) / counts),
+        }
+
+        # Errors sorted inside every group; group g starts at starts[g]
+        sorted_errors = abs_errors[np.lexsort((abs_errors, groups))]
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        for percentile in percentiles:
+            ranks = np.ceil(percentile / 100 * counts).astype(np.int64) - 1
+            positions = starts + np.clip(ranks, 0, None)
+            values = sorted_errors[np.minimum(positions, len(sorted_errors) - 1)] if len(sorted_errors) else np.zeros(n_groups)
+            statistics[f"p{percentile:g}_absolute_angle_error"] = np.where(counts > 0, values, np.nan)
+
+        statistics["acc_pi_6"] = np.bincount(groups, abs_errors < 30, n_groups) / counts
+
+    return pd.DataFrame(statistics)
+
+
+def binned_error_statistics(values: np.ndarray, bin_edges: np.ndarray, abs_errors: np.ndarray) -> pd.DataFrame:
+    """Error statistics of the bins [bin_edges[i], bin_edges[i + 1]) of `values`; the last bin is closed"""
+    bins = np.clip(np.searchsorted(bin_edges, values, side="right") - 1, 0, len(bin_edges) - 2)
+    statistics = grouped_error_statistics(bins, len(bin_edges) - 1, abs_errors)
+    statistics.insert(0, "bin_start", bin_edges[:-1])
+    statistics.insert(1, "bin_end", bin_edges[1:])
+    return statistics
+
+
+def quadrant_indexes(angle_radians: np.ndarray) -> np.ndarray:
+    """Index in QUADRANTS of every azimuth in [-π, π]"""
+    return (np.mod(angle_radians, 2 * np.pi) // (np.pi / 2)).astype(np.int64) % 4
+
+
+def quadrant_confusion_matrix(y_true_angle: np.ndarray, y_pred_angle: np.ndarray) -> pd.DataFrame:
+    """Counts of the true (rows) against the predicted (columns) quadrants"""
+    pairs = quadrant_indexes(y_true_angle) * 4 + quadrant_indexes(y_pred_angle)
+    matrix = np.bincount(pairs, minlength=16).reshape(4, 4)
+    return pd.DataFrame(matrix, index=pd.Index(QUADRANTS, name="true"), columns=pd.Index(QUADRANTS, name="predicted"))
+
+
+def analyze_errors(
+    store: dict,
+    annotations_path: str,
+    azimuth_bin_degrees: float = 15,
+    elevation_bin_degrees: float = 10,
+    n_distance_bins: int = 10,
+    decoding=None,
+) -> Dict[str, pd.DataFrame]:
+    """Error statistics per azimuth, elevation and distance bin and per split, and the quadrant confusion matrix.
+
+    Azimuth and elevation bins have a fixed width in degrees, distance bins
+    hold equal numbers of images (deciles by default).
+    """
+    y_true_angle, y_pred_angle = store_angles(store, decoding)
+    abs_errors = np_absolute_angle_errors(y_true_angle, y_pred_angle)
+    annotations = join_annotations(store, annotations_path)
+
+    elevation = annotations["elevation"].to_numpy()
+    elevation_edges = np.arange(
+        np.floor(elevation.min() / elevation_bin_degrees),
+        np.floor(elevation.max() / elevation_bin_degrees) + 2,
+    ) * elevation_bin_degrees
+    distance = annotations["distance"].to_numpy()
+    # Tied quantiles would give empty bins
+    distance_edges = np.unique(np.quantile(distance, np.linspace(0, 1, n_distance_bins + 1)))
+    if len(distance_edges) < 2:
+        distance_edges = np.array([distance_edges[0], distance_edges[0]])
+
+    split_names = sorted(SPLITS, key=SPLITS.get)
+    by_split = grouped_error_statistics(annotations["is_train"].to_numpy(), len(split_names), abs_errors)
+    by_split.insert(0, "split", split_names)
+
+    return {
+        "azimuth": binned_error_statistics(
+            annotations["azimuth"].to_numpy(), np.arange(0, 360 + azimuth_bin_degrees, azimuth_bin_degrees), abs_errors
+        ),
+        "elevation": binned_error_statistics(elevation, elevation_edges, abs_errors),
+        "distance": binned_error_statistics(distance, distance_edges, abs_errors),
+        "split": by_split[by_split["count"] > 0].reset_index(drop=True),
+        "quadrant_confusion": quadrant_confusion_matrix(y_true_angle, y_pred_angle),
+    }
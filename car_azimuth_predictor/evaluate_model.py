@@ -1,6 +1,8 @@
 import os
+import time
 from pathlib import Path
 
+import numpy as np
 import tensorflow as tf
 from omegaconf import DictConfig
 
@@ -35,3 +37,36 @@ def evaluate_model(
     model_evaluation_result = model.evaluate(test_dataset)
 
     return model, model_evaluation_result
+
+
+def compare_flip_tta(model, dataset: tf.data.Dataset, approach: str) -> dict:
+    """Accuracy gain against the throughput cost of the flip test-time augmentation"""
+    from car_azimuth_predictor.inference import FlipTTAModel, get_azimuth_converter
+    from car_azimuth_predictor.utils.numpy_metrics import np_angle_metrics
+
+    azimuth_converter = get_azimuth_converter(approach)
+    report = {}
+    for name, predictor in [("plain", model), ("flip_tta", FlipTTAModel(model, approach))]:
+        y_true, y_pred, elapsed = [], [], 0.0
+        for x_batch, y_true_batch in dataset:
+            if not y_pred:
+                # Warm up (tracing) outside of the timed calls
+                predictor.predict_on_batch(x_batch)
+            start = time.perf_counter()
+            y_pred.append(np.asarray(predictor.predict_on_batch(x_batch)))
+            elapsed += time.perf_counter() - start
+            y_true.append(np.asarray(y_true_batch))
+
+        y_true, y_pred = np.concatenate(y_true), np.concatenate(y_pred)
+        report[name] = {
+            **np_angle_metrics(azimuth_converter(y_true), azimuth_converter(y_pred)),
+            "images_per_sec": len(y_pred) / elapsed,
+        }
+
+    report["throughput_ratio"] = report["flip_tta"]["images_per_sec"] / report["plain"]["images_per_sec"]
+    report["mean_absolute_angle_error_gain"] = (
+        report["plain"]["mean_absolute_angle_error"] - report["flip_tta"]["mean_absolute_angle_error"]
+    )
+    report["acc_pi_6_gain"] = report["flip_tta"]["acc_pi_6"] - report["plain"]["acc_pi_6"]
+
+    return report
@@ -1,18 +1,90 @@
+import json
+import multiprocessing
 import os
 from pathlib import Path
 
-import numpy as np
 import pandas as pd
 import scipy.io as sio
 from omegaconf import DictConfig
 from tqdm import tqdm
 
-from car_azimuth_predictor.utils.training_tools import np_shift_05_pi
-
-
-def generate_features(config: DictConfig):
-    """Function to generate the features"""
-    features = ["azimuth", "elevation", "distance"]
+from car_azimuth_predictor.annotation_store import compute_angle_columns, write_annotations
+
+
+FEATURES = ["azimuth", "elevation", "distance"]
+
+
+def _parse_annotation(annotation_path: str) -> list:
+    """Viewpoint features of the first object of a PASCAL3D+ annotation file"""
+    mat = sio.loadmat(annotation_path)
+    viewpoint = mat["record"][0, 0]["objects"][0, 0]["viewpoint"][0, 0]
+    return [float(viewpoint[el][0, 0]) for el in FEATURES]
+
+
+def _file_signature(file_path: str) -> list:
+    stat = os.stat(file_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def parse_annotations(
+    annotations_path: str,
+    manifest_path: str = None,
+    num_workers: int = None,
+) -> dict:
+    """Features of every annotation file of `annotations_path`, by file name.
+
+    Files are parsed across `num_workers` processes (default: CPU count).
+    With `manifest_path`, only the files whose size or modification time
+    differs from the manifest of the previous run are parsed; the features
+    of the others come from the manifest, which is then rewritten. Only the
+    parsing is incremental: the caller still rebuilds the whole table.
+    """
+    manifest = {}
+    if manifest_path is not None and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    annotations = {}
+    to_parse = []
+    for annotation_file in sorted(os.listdir(annotations_path)):
+        signature = _file_signature(os.path.join(annotations_path, annotation_file))
+        entry = manifest.get(annotation_file)
+        if entry is not None and entry["signature"] == signature:
+            annotations[annotation_file] = entry
+        else:
+            to_parse.append((annotation_file, signature))
+
+    paths = [os.path.join(annotations_path, annotation_file) for annotation_file, _ in to_parse]
+    num_workers = min(num_workers or os.cpu_count() or 1, max(1, len(paths)))
+    if num_workers > 1:
+        # TensorFlow may already be loaded, and forking its thread pools is unsafe
+        with multiprocessing.get_context("spawn").Pool(processes=num_workers) as pool:
+            # Large chunks, the files only take a few milliseconds each
+            chunksize = max(1, len(paths) // (num_workers * 8))
+            parsed = list(tqdm(pool.imap(_parse_annotation, paths, chunksize=chunksize), total=len(paths)))
+    else:
+        parsed = [_parse_annotation(path) for path in tqdm(paths)]
+
+    for (annotation_file, signature), features in zip(to_parse, parsed):
+        annotations[annotation_file] = {"signature": signature, "features": features}
+    annotations = dict(sorted(annotations.items()))
+
+    if manifest_path is not None:
+        # Written to a temporary file first, so an interrupted run leaves the previous manifest
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump(annotations, f)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    return annotations
+
+
+def generate_features(config: DictConfig, num_workers: int = None, incremental: bool = False):
+    """Function to generate the features
+
+    With `incremental`, only the annotation files added or changed since the
+    previous run are parsed (see parse_annotations).
+    """
+    features = FEATURES
     df_list = []
     root_path = Path(os.getcwd())
 
@@ -25,56 +97,30 @@ def generate_features(config: DictConfig):
         val_set = set(f.read().splitlines())
 
     # Read annotations
-    for annotation_file in tqdm(
-        sorted(
-            os.listdir(os.path.join(dataset_base_path, "Annotations", "car_imagenet"))
-        )
-    ):
-        # Reading annotations from matlab file
-        mat = sio.loadmat(
-            os.path.join(
-                os.path.join(dataset_base_path, "Annotations", "car_imagenet"),
-                annotation_file,
-            )
-        )
+    manifest_path = os.path.join(dataset_base_path, config.data_processing.annotations_manifest_filename)
+    if not incremental and os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    annotations = parse_annotations(
+        os.path.join(dataset_base_path, "Annotations", "car_imagenet"),
+        manifest_path=manifest_path,
+        num_workers=num_workers,
+    )
 
+    for annotation_file, annotation in annotations.items():
         filebase = annotation_file.split(".")[0]
         is_train = filebase in train_set
         if not is_train:
             assert filebase in val_set, f"File {filebase} is not in train or val set"
 
-        row = [annotation_file.split(".")[0], is_train]
-        for el in features:
-            feature = mat["record"][0, 0]["objects"][0, 0]["viewpoint"][0, 0][el][0, 0]
-            row.append(feature)
-
-        df_list.append(row)
+        df_list.append([filebase, is_train, *annotation["features"]])
 
     df = pd.DataFrame(df_list, columns=["image_path", "is_train"] + features)
 
     # Convert azimuth and file_path
-    df["image_path"] = df["image_path"].apply(
-        lambda x: os.path.join(dataset_base_path, "Images", "car_imagenet", x) + ".JPEG"
-    )
+    images_path = os.path.join(dataset_base_path, "Images", "car_imagenet")
+    df["image_path"] = [os.path.join(images_path, filebase) + ".JPEG" for filebase in df["image_path"]]
     df["is_train"] = df["is_train"].astype("int")
+    for name, values in compute_angle_columns(df["azimuth"].to_numpy()).items():
+        df[name] = values
 
-    df["azimuth_radians"] = df["azimuth"] / 180 * np.pi
-    df["azimuth_radians_shifted"] = df["azimuth_radians"].apply(
-        lambda x: x if x < np.pi else x - 2 * np.pi
-    )
-    df["azimuth_radians_abs"] = np.abs(df["azimuth_radians_shifted"])
-    df["azimuth_norm_abs"] = df["azimuth_radians_abs"] / np.pi
-
-    df["azimuth_radians_shifted_0.5_pi"] = np_shift_05_pi(df["azimuth_radians"])
-    df["azimuth_radians_shifted_0.5_pi_norm_abs"] = np.abs(
-        df["azimuth_radians_shifted_0.5_pi"] / np.pi
-    )
-
-    df["azimuth_radians_sign"] = np.sign(df["azimuth_radians_shifted"])
-    df["azimuth_sin"] = np.sin(df["azimuth_radians"])
-    df["azimuth_cos"] = np.cos(df["azimuth_radians"])
-
-    df.to_csv(
-        os.path.join(dataset_base_path, config.data_processing.csv_filename),
-        index=False,
-    )
+    write_annotations(df, os.path.join(dataset_base_path, config.data_processing.annotations_filename))
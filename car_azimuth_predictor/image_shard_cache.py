@@ -0,0 +1,196 @@
+import contextlib
+import hashlib
+import json
+import os
+import uuid
+from functools import partial
+from pathlib import Path
+from typing import Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+from tqdm import tqdm
+
+from car_azimuth_predictor.annotation_store import read_annotations
+from car_azimuth_predictor.prediction_cache import hash_file
+from car_azimuth_predictor.utils.training_tools import prepare_input
+
+MANIFEST_FILENAME = "manifest.json"
+# Same dtype as the angle columns of the annotation table
+TARGET_DTYPE = np.float32
+
+
+def shards_fingerprint(
+    df_path: str,
+    df: pd.DataFrame,
+    gt_cols: Iterable[str],
+    image_size: Tuple[int, int],
+    image_source=None,
+    shuffle_seed: int = 0,
+) -> str:
+    """Hash of the annotation table, of the targets and their dtype, of the image
+    size, of the train shuffle seed and of the size and modification time of every source
+    image (size and CRC when read from `image_source`)"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(hash_file(df_path).encode())
+    digest.update(json.dumps([list(gt_cols), np.dtype(TARGET_DTYPE).name, list(image_size), shuffle_seed]).encode())
+    for image_path in df["image_path"]:
+        if image_source is not None:
+            digest.update(f"{image_path}:{image_source.signature(image_path)}".encode())
+        else:
+            stat = os.stat(image_path)
+            digest.update(f"{image_path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def _serialize_example(image: np.ndarray, target: np.ndarray) -> bytes:
+    feature = {
+        "image": tf.train.Feature(bytes_list=tf.train.BytesList(value=[image.tobytes()])),
+        "target": tf.train.Feature(bytes_list=tf.train.BytesList(value=[target.astype(TARGET_DTYPE).tobytes()])),
+    }
+    return tf.train.Example(features=tf.train.Features(feature=feature)).SerializeToString()
+
+
+def _shard_fingerprint(shard_file: str) -> str:
+    # Shards are named {split}-{fingerprint}-{index}-of-{n_shards}.tfrecord
+    return shard_file.split("-")[1]
+
+
+def _write_split(
+    df: pd.DataFrame, gt_cols, image_size, cache_path: Path, split: str, n_shards: int, fingerprint: str, image_source=None
+):
+    dataset = tf.data.Dataset.from_tensor_slices((df["image_path"], df[gt_cols]))
+    dataset = dataset.map(
+        partial(prepare_input, image_size=image_size, image_source=image_source), num_parallel_calls=tf.data.AUTOTUNE
+    ).map(
+        lambda img, y: (tf.cast(tf.clip_by_value(tf.round(img), 0, 255), tf.uint8), y),
+        num_parallel_calls=tf.data.AUTOTUNE,
+    ).prefetch(tf.data.AUTOTUNE)
+
+    n_shards = max(1, min(n_shards, len(df)))
+    shard_paths = [
+        str(cache_path / f"{split}-{fingerprint}-{i:05d}-of-{n_shards:05d}.tfrecord") for i in range(n_shards)
+    ]
+    # Written under temporary names and renamed once complete: workers of one
+    # machine may build the same cache at once, and their shards are identical
+    tmp_suffix = uuid.uuid4().hex
+    tmp_paths = [f"{shard_path}.tmp-{tmp_suffix}" for shard_path in shard_paths]
+    writers = [tf.io.TFRecordWriter(tmp_path) for tmp_path in tmp_paths]
+    try:
+        # Round-robin, so every shard gets a similar slice of the (train: permuted) table
+        for i, (image, target) in enumerate(tqdm(dataset.as_numpy_iterator(), total=len(df), desc=split)):
+            writers[i % n_shards].write(_serialize_example(image, target))
+    finally:
+        for writer in writers:
+            writer.close()
+    for tmp_path, shard_path in zip(tmp_paths, shard_paths):
+        os.replace(tmp_path, shard_path)
+
+    return [os.path.basename(shard_path) for shard_path in shard_paths]
+
+
+def build_image_shards(
+    df_path: str,
+    gt_cols: Iterable[str],
+    image_size: Tuple[int, int],
+    cache_path: str,
+    n_shards: int = 16,
+    image_source=None,
+    shuffle_seed: int = 0,
+) -> dict:
+    """Write the decoded, resized uint8 train/val images and their targets to TFRecord shards.
+
+    The train rows are written in an order permuted with `shuffle_seed`, so
+    the interleaved stream is already random and the shuffle buffer of
+    load_image_shards only needs to vary it between epochs. Val rows keep
+    the table order. Does nothing when `cache_path` already holds shards
+    with the same `shards_fingerprint`. Shard names include the fingerprint:
+    once the new manifest is written, only the shards of other fingerprints
+    are removed, so concurrent builds never delete each other's shards of
+    the same data. The images are read from `image_source` (a
+    ZipImageSource) when given. Returns the manifest.
+    """
+    gt_cols = list(gt_cols)
+    cache_path = Path(cache_path)
+    df = read_annotations(df_path, ["image_path", "is_train", *gt_cols])
+    fingerprint = shards_fingerprint(df_path, df, gt_cols, image_size, image_source, shuffle_seed)
+
+    manifest_path = cache_path / MANIFEST_FILENAME
+    if manifest_path.exists():
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest["fingerprint"] == fingerprint:
+            return manifest
+
+    os.makedirs(cache_path, exist_ok=True)
+    splits = {"train": df[df["is_train"] == 1].sample(frac=1, random_state=shuffle_seed), "val": df[df["is_train"] == 0]}
+    manifest = {
+        "fingerprint": fingerprint,
+        "gt_cols": gt_cols,
+        "image_size": list(image_size),
+        "counts": {split: len(split_df) for split, split_df in splits.items()},
+        "shards": {
+            split: _write_split(split_df, gt_cols, image_size, cache_path, split, n_shards, fingerprint, image_source)
+            for split, split_df in splits.items()
+        },
+    }
+    # Written last, so an interrupted build is never picked up
+    tmp_manifest_path = f"{manifest_path}.tmp-{uuid.uuid4().hex}"
+    with open(tmp_manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_manifest_path, manifest_path)
+
+    for shard_file in os.listdir(cache_path):
+        if shard_file.endswith(".tfrecord") and _shard_fingerprint(shard_file) != fingerprint:
+            # Another worker may be removing them too
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(cache_path / shard_file)
+
+    return manifest
+
+
+def load_image_shards(
+    cache_path: str, manifest: dict, split: str, shuffle: bool, num_shards: int = 1, shard_index: int = 0
+) -> tf.data.Dataset:
+    """(float32 image, float32 target) pairs streamed from the shards of `split` with a parallel interleave.
+
+    With `num_shards` > 1 (multi-worker training), only every `num_shards`-th
+    shard file from `shard_index` is read, so the workers read disjoint rows
+    whatever the shuffling.
+    """
+    height, width = manifest["image_size"]
+    n_targets = len(manifest["gt_cols"])
+    shard_paths = [str(Path(cache_path) / shard_file) for shard_file in manifest["shards"][split]]
+    if num_shards > len(shard_paths):
+        raise ValueError(
+            f"{len(shard_paths)} {split} shard files for {num_shards} workers, "
+            "raise dataset_generation.image_cache_n_shards"
+        )
+    shard_paths = shard_paths[shard_index::num_shards]
+
+    files = tf.data.Dataset.from_tensor_slices(shard_paths)
+    if shuffle:
+        files = files.shuffle(len(shard_paths), reshuffle_each_iteration=True)
+    dataset = files.interleave(
+        tf.data.TFRecordDataset,
+        # One record per shard in turn undoes the round-robin split, so
+        # unshuffled shards come back in the order they were written
+        cycle_length=len(shard_paths),
+        block_length=1,
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=not shuffle,
+    )
+
+    feature_description = {
+        "image": tf.io.FixedLenFeature([], tf.string),
+        "target": tf.io.FixedLenFeature([], tf.string),
+    }
+
+    def parse(record):
+        example = tf.io.parse_single_example(record, feature_description)
+        image = tf.reshape(tf.io.decode_raw(example["image"], tf.uint8), (height, width, 3))
+        target = tf.reshape(tf.io.decode_raw(example["target"], tf.as_dtype(TARGET_DTYPE)), (n_targets,))
+        return tf.cast(image, tf.float32), target
+
+    return dataset.map(parse, num_parallel_calls=tf.data.AUTOTUNE)
@@ -0,0 +1,191 @@
+from typing import Iterable, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from car_azimuth_predictor.utils.training_tools import (
+    AngleErrorPercentiles,
+    AngleMetrics,
+    horizontal_flip_pose_sin_cos_output,
+    tf_acc_pi_6_sin_cos_output,
+    tf_mean_absolute_angle_error_sin_cos_output,
+    tf_median_absolute_angle_error_sin_cos_output,
+    tf_r2_angle_score_sin_cos_output,
+    tf_rmse_angle_sin_cos_output,
+    # Approach 2
+    angle_double_output_loss,
+    horizontal_flip_pose_double_sigmoid,
+    tf_mean_absolute_angle_error_double_sigmoid,
+    tf_median_absolute_angle_error_double_sigmoid,
+    tf_r2_angle_score_double_sigmoid,
+    tf_rmse_angle_score_double_sigmoid,
+    tf_acc_pi_6_double_sigmoid,
+)
+from car_azimuth_predictor.utils.angle_codecs import CODECS, np_circular_mean
+
+APPROACH_CODECS = {"1": CODECS["sin_cos"], "2": CODECS["double_sigmoid"]}
+
+AZIMUTH_CONVERTERS = {approach: codec.np_decode for approach, codec in APPROACH_CODECS.items()}
+
+AZIMUTH_ENCODERS = {approach: codec.np_encode for approach, codec in APPROACH_CODECS.items()}
+
+POSE_FLIPS = {approach: codec.np_flip for approach, codec in APPROACH_CODECS.items()}
+
+
+def get_azimuth_converter(approach: str):
+    if approach not in AZIMUTH_CONVERTERS:
+        raise ValueError("Unknown approach")
+    return AZIMUTH_CONVERTERS[approach]
+
+
+def convert_azimuths(predictions: np.ndarray, approach: str, units: str = "degrees") -> np.ndarray:
+    """Decode raw model outputs into azimuths in the requested units"""
+    azimuths = get_azimuth_converter(approach)(np.asarray(predictions))
+    if units == "degrees":
+        azimuths = azimuths / np.pi * 180
+    elif units != "radians":
+        raise ValueError("Unknown units")
+    return azimuths
+
+
+class FlipTTAModel:
+    """Horizontal-flip test-time augmentation in a single forward pass.
+
+    Every batch is concatenated with its mirrored copy, so the backbone runs
+    once on a batch twice as large. The mirrored predictions are un-flipped,
+    both azimuths are fused with a circular mean and the result is encoded
+    back to the output representation of the approach, so the wrapper is a
+    drop-in replacement of the model.
+    """
+
+    def __init__(self, model, approach: str):
+        self.model = model
+        self.azimuth_converter = get_azimuth_converter(approach)
+        self.azimuth_encoder = AZIMUTH_ENCODERS[approach]
+        self.pose_flip = POSE_FLIPS[approach]
+
+    def predict_on_batch(self, images) -> np.ndarray:
+        images = np.asarray(images)
+        outputs = np.asarray(self.model.predict_on_batch(np.concatenate([images, images[:, :, ::-1]])))
+        n_images = len(images)
+
+        azimuths = np_circular_mean(
+            self.azimuth_converter(outputs[:n_images]),
+            self.azimuth_converter(self.pose_flip(outputs[n_images:])),
+        )
+        return self.azimuth_encoder(azimuths).astype(outputs.dtype)
+
+    def predict(self, x, verbose=0) -> np.ndarray:
+        if isinstance(x, tf.data.Dataset):
+            batches = (batch[0] if isinstance(batch, tuple) else batch for batch in x)
+            return np.concatenate([self.predict_on_batch(batch) for batch in batches])
+        return self.predict_on_batch(x)
+
+
+def get_custom_objects() -> dict:
+    import tensorflow_hub as hub
+
+    return {
+        "KerasLayer": hub.KerasLayer,
+        "AngleErrorPercentiles": AngleErrorPercentiles,
+        "AngleMetrics": AngleMetrics,
+        "angle_double_output_loss": angle_double_output_loss,
+        "tf_mean_absolute_angle_error_double_sigmoid": tf_mean_absolute_angle_error_double_sigmoid,
+        "tf_rmse_angle_score_double_sigmoid": tf_rmse_angle_score_double_sigmoid,
+        "tf_r2_angle_score_double_sigmoid": tf_r2_angle_score_double_sigmoid,
+        "tf_median_absolute_angle_error_double_sigmoid": tf_median_absolute_angle_error_double_sigmoid,
+        "tf_acc_pi_6_double_sigmoid": tf_acc_pi_6_double_sigmoid,
+        "horizontal_flip_pose_double_sigmoid": horizontal_flip_pose_double_sigmoid,
+        "tf_mean_absolute_angle_error_sin_cos_output": tf_mean_absolute_angle_error_sin_cos_output,
+        "tf_rmse_angle_sin_cos_output": tf_rmse_angle_sin_cos_output,
+        "tf_r2_angle_score_sin_cos_output": tf_r2_angle_score_sin_cos_output,
+        "tf_median_absolute_angle_error_sin_cos_output": tf_median_absolute_angle_error_sin_cos_output,
+        "tf_acc_pi_6_sin_cos_output": tf_acc_pi_6_sin_cos_output,
+        "horizontal_flip_pose_sin_cos_output": horizontal_flip_pose_sin_cos_output,
+    }
+
+
+def load_inference_model(
+    model_path: str,
+    flip_tta_approach: str = None,
+    precision: str = "float32",
+    jit_compile: bool = False,
+    num_threads: int = None,
+):
+    """Load a Keras model, or a TFLite model (e.g. int8 quantized) if the path ends with .tflite.
+
+    Keras models can be rebuilt with a mixed `precision` policy (see
+    precision.PRECISIONS) and have their predict step compiled with XLA.
+    TFLite interpreters run `num_threads` threads (default: all cores).
+    When `flip_tta_approach` is given, the model is wrapped in FlipTTAModel.
+    """
+    if model_path.endswith(".tflite"):
+        from car_azimuth_predictor.quantization import TFLiteModel
+
+        model = TFLiteModel(model_path, num_threads=num_threads)
+    else:
+        from car_azimuth_predictor.precision import cast_model_to_precision
+
+        model = tf.keras.models.load_model(model_path, custom_objects=get_custom_objects())
+        model = cast_model_to_precision(model, precision, get_custom_objects())
+        model.jit_compile = jit_compile
+
+    if flip_tta_approach is not None:
+        model = FlipTTAModel(model, flip_tta_approach)
+    return model
+
+
+def decode_and_resize_image(file_path: tf.Tensor, image_size: Tuple[int, int], image_source=None) -> tf.Tensor:
+    """Graph version of the PIL based loader used by scripts/inference.py
+
+    JPEGs are decoded with the accurate integer DCT, which is what libjpeg uses
+    behind PIL, so the resulting tensors are identical to the serial path.
+    With `image_source` (a zip_image_source.ZipImageSource), the file is read
+    from the archive.
+    """
+    raw = image_source.read_file(file_path) if image_source is not None else tf.io.read_file(file_path)
+    image = tf.cond(
+        tf.io.is_jpeg(raw),
+        lambda: tf.io.decode_jpeg(raw, channels=3, dct_method="INTEGER_ACCURATE"),
+        lambda: tf.io.decode_image(raw, channels=3, expand_animations=False),
+    )
+    image = tf.cast(image, tf.float32)
+    image = tf.image.resize(image, image_size)
+
+    return image
+
+
+def generate_inference_dataset(
+    image_paths: Iterable[str],
+    batch_size: int,
+    image_size: Tuple[int, int] = (224, 224),
+    image_source=None,
+) -> tf.data.Dataset:
+    """Streaming dataset with parallel decode/resize, batching and prefetch"""
+    dataset = tf.data.Dataset.from_tensor_slices(list(image_paths))
+    dataset = (
+        dataset.map(
+            lambda file_path: decode_and_resize_image(file_path, image_size, image_source),
+            num_parallel_calls=tf.data.AUTOTUNE,
+            deterministic=True,
+        )
+        .batch(batch_size, drop_remainder=False)
+        .prefetch(tf.data.AUTOTUNE)
+    )
+
+    return dataset
+
+
+def predict_dataset(model, dataset: tf.data.Dataset) -> np.ndarray:
+    """Run the model over the dataset, decoding overlaps with the forward pass"""
+    return model.predict(dataset, verbose=0)
+
+
+def report_throughput(n_images: int, elapsed_seconds: float) -> float:
+    images_per_second = n_images / elapsed_seconds if elapsed_seconds > 0 else float("inf")
+    print(
+        f"Processed {n_images} images in {elapsed_seconds:.2f}s "
+        f"({images_per_second:.1f} images/sec)"
+    )
+    return images_per_second
+
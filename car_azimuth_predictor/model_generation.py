@@ -4,10 +4,15 @@ import tensorflow as tf
 from omegaconf import DictConfig
 
 
-def generate_model(config: DictConfig, top_model: Callable):
+def generate_backbone(config: DictConfig) -> tf.keras.Model:
+    """EfficientNetB0 feature extractor, outputs the 1280-d global average pooling.
+
+    `model_training.backbone_weights` null gives a randomly initialized
+    backbone, e.g. for offline benchmarks.
+    """
 
     fe = tf.keras.applications.EfficientNetB0(
-        include_top=False, weights="imagenet", input_shape=(224, 224, 3)
+        include_top=False, weights=config.model_training.get("backbone_weights", "imagenet"), input_shape=(224, 224, 3)
     )
 
     for layer in fe.layers:
@@ -15,7 +20,44 @@ def generate_model(config: DictConfig, top_model: Callable):
 
     gap = tf.keras.layers.GlobalAveragePooling2D()(fe.output)
 
-    top_model = top_model(gap)
+    return tf.keras.models.Model(inputs=fe.input, outputs=gap)
+
+
+def generate_top_model(
+    approach: str, n_neurons_middle_layer: int, dropout_rate: float
+) -> tf.keras.Model:
+    """MLP head on top of the backbone embedding, with the output layer of the approach.
+
+    The output layers are float32 under mixed precision policies.
+    """
+    input_layer = tf.keras.layers.Input(shape=(1280,))
+    in_to_dense = tf.keras.layers.Dropout(dropout_rate, name="Dropout")(input_layer)
+
+    if n_neurons_middle_layer:
+        activation_fn_middle_layer = 'relu'
+        in_to_dense = tf.keras.layers.Dense(
+            n_neurons_middle_layer,
+            activation=activation_fn_middle_layer,
+            name="mlp_middle",
+        )(in_to_dense)
+
+    if approach == "1":
+        mlp_output = tf.keras.layers.Dense(2, activation="tanh", name="mlp_output", dtype="float32")(in_to_dense)
+        return tf.keras.models.Model(inputs=input_layer, outputs=mlp_output)
+
+    angle1_sigmoid_output = tf.keras.layers.Dense(1, activation="sigmoid", name="angle1_output", dtype="float32")(in_to_dense)
+    angle2_sigmoid_output = tf.keras.layers.Dense(1, activation="sigmoid", name="angle2_output", dtype="float32")(in_to_dense)
+
+    angle_concatenated = tf.keras.layers.Concatenate(axis=1, name="concatenate_angles_2_vars", dtype="float32")([angle1_sigmoid_output, angle2_sigmoid_output])
+
+    return tf.keras.models.Model(inputs=input_layer, outputs=angle_concatenated)
+
+
+def generate_model(config: DictConfig, top_model: Callable):
+
+    backbone = generate_backbone(config)
+
+    top_model = top_model(backbone.output)
 
-    model = tf.keras.models.Model(inputs=fe.input, outputs=top_model)
+    model = tf.keras.models.Model(inputs=backbone.input, outputs=top_model)
     return model
@@ -0,0 +1,85 @@
+import contextlib
+from functools import lru_cache
+
+import tensorflow as tf
+
+PRECISIONS = ["float32", "mixed_bfloat16", "mixed_float16", "auto"]
+
+# Output layers of generate_top_model, always computed in float32
+FLOAT32_LAYER_NAMES = ["mlp_output", "angle1_output", "angle2_output", "concatenate_angles_2_vars"]
+
+
+@lru_cache(maxsize=None)
+def cpu_supports_bfloat16() -> bool:
+    """Whether the CPU has native bfloat16 instructions (AVX512-BF16 or AMX)"""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def resolve_precision(precision: str = "float32") -> str:
+    """Keras dtype policy name for `precision`.
+
+    `auto` picks mixed_float16 on GPU, mixed_bfloat16 on CPUs with native
+    bfloat16 support and float32 otherwise.
+    """
+    assert precision in PRECISIONS, f"precision must be one of {PRECISIONS}"
+    if precision != "auto":
+        return precision
+    if tf.config.list_physical_devices("GPU"):
+        return "mixed_float16"
+    if cpu_supports_bfloat16():
+        return "mixed_bfloat16"
+    return "float32"
+
+
+@contextlib.contextmanager
+def precision_policy(precision: str = "float32"):
+    """Global Keras dtype policy for the layers built inside the block"""
+    previous_policy = tf.keras.mixed_precision.global_policy()
+    tf.keras.mixed_precision.set_global_policy(resolve_precision(precision))
+    try:
+        yield
+    finally:
+        tf.keras.mixed_precision.set_global_policy(previous_policy)
+
+
+def _keeps_float32(layer_config, output_names) -> bool:
+    config = layer_config["config"]
+    if layer_config["class_name"] == "InputLayer":
+        return True
+    if config.get("name") in FLOAT32_LAYER_NAMES or config.get("name") in output_names:
+        return True
+    # Sigmoid/tanh heads of models saved before the output layers were named
+    return layer_config["class_name"] == "Dense" and config.get("activation") in ["sigmoid", "tanh"]
+
+
+def _set_layer_dtypes(layer_config, policy_name, output_names):
+    config = layer_config["config"]
+    if layer_config["class_name"] in ["Functional", "Model", "Sequential"]:
+        inner_output_names = {output[0] for output in config.get("output_layers", [])}
+        for inner_config in config["layers"]:
+            _set_layer_dtypes(inner_config, policy_name, output_names | inner_output_names)
+    elif not _keeps_float32(layer_config, output_names):
+        config["dtype"] = policy_name
+
+
+def cast_model_to_precision(model: tf.keras.Model, precision: str, custom_objects=None) -> tf.keras.Model:
+    """Rebuild a trained model with the dtype policy of `precision`, keeping its
+    float32 weights. The output layers stay in float32."""
+    policy_name = resolve_precision(precision)
+    if policy_name == "float32":
+        return model
+
+    model_config = {"class_name": model.__class__.__name__, "config": model.get_config()}
+    if model_config["class_name"] not in ["Functional", "Sequential"]:
+        model_config["class_name"] = "Functional"
+    _set_layer_dtypes(model_config, policy_name, set())
+
+    with tf.keras.utils.custom_object_scope(custom_objects or {}):
+        cast_model = tf.keras.models.Model.from_config(model_config["config"])
+    cast_model.set_weights(model.get_weights())
+    return cast_model
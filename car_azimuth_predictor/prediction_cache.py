@@ -0,0 +1,177 @@
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# Rough per-row overhead of SQLite (record header, index entry), used by the eviction
+ROW_OVERHEAD_BYTES = 64
+
+
+def hash_file(file_path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_bytes(data: bytes) -> str:
+    """Same digest as hash_file for a file holding `data`"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def model_fingerprint(model_path: str, approach: str) -> str:
+    """Hash of the model weights (file or SavedModel directory) and of the approach"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(approach.encode())
+    if os.path.isdir(model_path):
+        for root, dirs, files in sorted(os.walk(model_path)):
+            dirs.sort()
+            for file in sorted(files):
+                file_path = os.path.join(root, file)
+                digest.update(os.path.relpath(file_path, model_path).encode())
+                digest.update(hash_file(file_path).encode())
+    else:
+        digest.update(hash_file(model_path).encode())
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """On-disk cache of raw model outputs, keyed by image content and model.
+
+    Keys combine the hash of the image bytes with `model_fingerprint`, so a
+    renamed or duplicated image is a hit and a retrained model never reads
+    stale outputs. When the stored rows exceed `max_size_bytes`, the least
+    recently used ones are evicted. The total size is kept in a one-row
+    counter table, updated in the same transaction as the rows.
+    """
+
+    def __init__(self, cache_path: str, model_fingerprint: str, max_size_bytes: int = None):
+        self.model_fingerprint = model_fingerprint
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.connection = sqlite3.connect(cache_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            "key TEXT PRIMARY KEY, output BLOB NOT NULL, dtype TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS predictions_last_access ON predictions (last_access)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), size INTEGER NOT NULL)"
+        )
+        # Only scans the rows when the counter is created (new cache, or one written before the counter existed)
+        self.connection.execute(
+            "INSERT OR IGNORE INTO cache_size (id, size) SELECT 0, COALESCE(SUM(size), 0) FROM predictions"
+        )
+        self.connection.commit()
+
+    def key(self, image_path: str) -> str:
+        return f"{self.model_fingerprint}:{hash_file(image_path)}"
+
+    def content_key(self, data: bytes) -> str:
+        """Key of an image given by its bytes, equal to the key of a file holding them"""
+        return f"{self.model_fingerprint}:{hash_bytes(data)}"
+
+    def get_many(self, keys: Iterable[str], chunk_size: int = 500) -> Dict[str, np.ndarray]:
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for pos in range(0, len(keys), chunk_size):
+            chunk = keys[pos:pos + chunk_size]
+            rows = self.connection.execute(
+                f"SELECT key, output, dtype FROM predictions WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            for key, output, dtype in rows:
+                found[key] = np.frombuffer(output, dtype=dtype)
+
+        now = time.time()
+        self.connection.executemany(
+            "UPDATE predictions SET last_access = ? WHERE key = ?", [(now, key) for key in found]
+        )
+        self.connection.commit()
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def _stored_size(self, keys: List[str], chunk_size: int = 500) -> int:
+        """Total size of the rows of `keys` already in the cache"""
+        return sum(
+            self.connection.execute(
+                f"SELECT COALESCE(SUM(size), 0) FROM predictions WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchone()[0]
+            for chunk in (keys[pos:pos + chunk_size] for pos in range(0, len(keys), chunk_size))
+        )
+
+    def _add_size(self, delta: int):
+        self.connection.execute("UPDATE cache_size SET size = size + ? WHERE id = 0", (delta,))
+
+    def put_many(self, items: List[Tuple[str, np.ndarray]]):
+        now = time.time()
+        rows = {}
+        for key, output in items:
+            output = np.ascontiguousarray(output)
+            blob = output.tobytes()
+            rows[key] = (key, blob, output.dtype.str, len(key) + len(blob) + ROW_OVERHEAD_BYTES, now)
+
+        with self.connection:
+            # Replaced rows are measured and overwritten in one write transaction,
+            # so the counter stays exact with several processes sharing the cache
+            self.connection.execute("BEGIN IMMEDIATE")
+            replaced_size = self._stored_size(list(rows))
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO predictions (key, output, dtype, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                rows.values(),
+            )
+            self._add_size(sum(row[3] for row in rows.values()) - replaced_size)
+
+        if self.max_size_bytes is not None:
+            self.evict(self.max_size_bytes)
+
+    def size_bytes(self) -> int:
+        return self.connection.execute("SELECT size FROM cache_size WHERE id = 0").fetchone()[0]
+
+    def evict(self, max_size_bytes: int):
+        """Drop least recently used rows until the cache fits in `max_size_bytes`"""
+        if self.size_bytes() <= max_size_bytes:
+            return
+
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            excess = self.size_bytes() - max_size_bytes
+            to_delete, deleted_size = [], 0
+            for key, size in self.connection.execute(
+                "SELECT key, size FROM predictions ORDER BY last_access"
+            ):
+                if deleted_size >= excess:
+                    break
+                to_delete.append((key,))
+                deleted_size += size
+            self.connection.executemany("DELETE FROM predictions WHERE key = ?", to_delete)
+            self._add_size(-deleted_size)
+        self.evictions += len(to_delete)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size_bytes": self.size_bytes(),
+        }
+
+    def close(self):
+        self.connection.close()
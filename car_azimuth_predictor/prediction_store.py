@@ -0,0 +1,113 @@
+"""On-disk store of the predictions of one evaluation pass.
+
+The model runs once over a dataset and its raw outputs, the targets and the
+image ids are written as memory-mapped `.npy` files next to a
+`metadata.json`. Metrics, reports and visualizations are then computed from
+the store, without the model, so changing a threshold or a decoding only
+costs NumPy time.
+"""
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Sequence, Union
+
+import numpy as np
+from tqdm import tqdm
+
+from car_azimuth_predictor.utils.angle_codecs import CODECS, np_get_angle_from_double_sigmoids_old
+from car_azimuth_predictor.utils.numpy_metrics import np_absolute_angle_errors, np_angle_metrics
+
+DECODERS = {
+    **{name: codec.np_decode for name, codec in CODECS.items()},
+    "double_sigmoid_old": np_get_angle_from_double_sigmoids_old,
+}
+
+APPROACH_DECODINGS = {"1": "sin_cos", "2": "double_sigmoid"}
+
+
+def write_prediction_store(model, dataset, image_ids: Sequence[str], store_path: str, approach: str, gt_cols: Iterable[str]) -> dict:
+    """Run `model` once over `dataset` ((image, target) batches, in the order of
+    `image_ids`) and write the outputs, targets and ids to `store_path`"""
+    store_path = Path(store_path)
+    os.makedirs(store_path, exist_ok=True)
+    gt_cols = list(gt_cols)
+    n_rows = len(image_ids)
+
+    np.save(store_path / "image_ids.npy", np.asarray(image_ids, dtype=str))
+    arrays = {
+        name: np.lib.format.open_memmap(store_path / f"{name}.npy", mode="w+", dtype=np.float32, shape=(n_rows, len(gt_cols)))
+        for name in ["predictions", "targets"]
+    }
+
+    row = 0
+    start_time = time.perf_counter()
+    for x_batch, y_batch in tqdm(dataset, desc="predictions"):
+        y_pred_batch = np.asarray(model.predict_on_batch(x_batch))
+        arrays["predictions"][row:row + len(y_pred_batch)] = y_pred_batch
+        arrays["targets"][row:row + len(y_pred_batch)] = np.asarray(y_batch)
+        row += len(y_pred_batch)
+    elapsed_seconds = time.perf_counter() - start_time
+
+    if row != n_rows:
+        raise ValueError(f"The dataset yielded {row} rows for {n_rows} image ids")
+    for array in arrays.values():
+        array.flush()
+
+    metadata = {
+        "approach": approach,
+        "decoding": APPROACH_DECODINGS[approach],
+        "gt_cols": gt_cols,
+        "n_rows": n_rows,
+        "prediction_seconds": elapsed_seconds,
+    }
+    with open(store_path / "metadata.json", "w") as f:
+        json.dump(metadata, f, indent=2)
+
+    return metadata
+
+
+def load_prediction_store(store_path: str) -> dict:
+    """Metadata of the store with its memory-mapped `predictions`, `targets` and `image_ids`"""
+    store_path = Path(store_path)
+    with open(store_path / "metadata.json") as f:
+        store = json.load(f)
+    for name in ["predictions", "targets", "image_ids"]:
+        store[name] = np.load(store_path / f"{name}.npy", mmap_mode="r")
+    return store
+
+
+def get_decoder(store: dict, decoding: Union[str, Callable] = None) -> Callable:
+    decoding = store["decoding"] if decoding is None else decoding
+    if callable(decoding):
+        return decoding
+    if decoding not in DECODERS:
+        raise ValueError(f"decoding must be one of {list(DECODERS)}")
+    return DECODERS[decoding]
+
+
+def store_angles(store: dict, decoding: Union[str, Callable] = None):
+    """True and predicted azimuths (radians) of the store"""
+    decode = get_decoder(store, decoding)
+    return decode(np.asarray(store["targets"])), decode(np.asarray(store["predictions"]))
+
+
+def store_metrics(
+    store: dict,
+    decoding: Union[str, Callable] = None,
+    percentiles: Iterable[float] = (50, 90, 99),
+    acc_thresholds_degrees: Iterable[float] = (),
+) -> dict:
+    """Dataset-level angle metrics of the store, with the exact error percentiles
+    and the accuracy within each of `acc_thresholds_degrees`"""
+    y_true_angle, y_pred_angle = store_angles(store, decoding)
+    metrics = np_angle_metrics(y_true_angle, y_pred_angle)
+
+    abs_errors = np_absolute_angle_errors(y_true_angle, y_pred_angle)
+    percentiles = list(percentiles)
+    for percentile, value in zip(percentiles, np.percentile(abs_errors, percentiles) if percentiles else []):
+        metrics[f"p{percentile:g}_absolute_angle_error"] = float(value)
+    for threshold in acc_thresholds_degrees:
+        metrics[f"acc_{threshold:g}_degrees"] = float(np.mean(abs_errors < threshold))
+
+    return metrics
@@ -0,0 +1,71 @@
+import os
+import time
+from typing import Callable, Iterator, List
+
+import numpy as np
+import tensorflow as tf
+
+
+def representative_dataset_from(dataset: tf.data.Dataset, n_samples: int) -> Callable[[], Iterator[List[np.ndarray]]]:
+    """Calibration samples for post-training quantization, one image at a time"""
+
+    def representative_dataset():
+        for image in dataset.unbatch().map(lambda x, y: x).take(n_samples):
+            yield [tf.expand_dims(image, axis=0)]
+
+    return representative_dataset
+
+
+def convert_to_int8_tflite(model: tf.keras.Model, representative_dataset: Callable) -> bytes:
+    """Full integer quantization of weights and activations.
+
+    Input and output stay float32, so the quantized model is a drop-in
+    replacement: the same images go in and the same tanh/sigmoid encodings
+    come out.
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    return converter.convert()
+
+
+class TFLiteModel:
+    """Minimal Keras-like wrapper around the TFLite interpreter"""
+
+    def __init__(self, model_path: str, num_threads: int = None):
+        self.interpreter = tf.lite.Interpreter(
+            model_path=model_path, num_threads=num_threads or os.cpu_count()
+        )
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+        self._batch_size = None
+
+    def predict_on_batch(self, images) -> np.ndarray:
+        images = np.asarray(images, dtype=self.input_details["dtype"])
+        if images.shape[0] != self._batch_size:
+            self.interpreter.resize_tensor_input(self.input_details["index"], images.shape)
+            self.interpreter.allocate_tensors()
+            self._batch_size = images.shape[0]
+
+        self.interpreter.set_tensor(self.input_details["index"], images)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_details["index"]).copy()
+
+    def predict(self, x, verbose=0) -> np.ndarray:
+        if isinstance(x, tf.data.Dataset):
+            batches = (batch[0] if isinstance(batch, tuple) else batch for batch in x)
+            return np.concatenate([self.predict_on_batch(batch) for batch in batches])
+        return self.predict_on_batch(x)
+
+
+def measure_latency(predict_fn: Callable, images: np.ndarray, n_runs: int = 20) -> float:
+    """Median seconds per call after one warm-up call"""
+    predict_fn(images)
+    timings = []
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        predict_fn(images)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
@@ -0,0 +1,228 @@
+import io
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+
+class MicroBatcher:
+    """Groups concurrent requests into batches before calling the model.
+
+    A batch is flushed as soon as it holds `max_batch_size` items or the oldest
+    queued item has waited `max_wait_ms`, whichever comes first. `predict`
+    raises the error of the model call, or concurrent.futures.TimeoutError
+    when no result comes within `max_wait_ms` plus `inference_timeout_s`.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], np.ndarray],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        stats_window: int = 10000,
+        inference_timeout_s: float = 30.0,
+    ):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.inference_timeout = inference_timeout_s
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=stats_window)
+        self._batch_sizes = deque(maxlen=stats_window)
+        self._n_requests = 0
+        self._n_batches = 0
+
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, item: np.ndarray) -> Future:
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def predict(self, item: np.ndarray) -> np.ndarray:
+        return self.submit(item).result(timeout=self.max_wait + self.inference_timeout)
+
+    def close(self):
+        self._stopped.set()
+        self._queue.put(None)
+        self._worker.join()
+
+    def _collect_batch(self, first):
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect_batch(first)
+
+            try:
+                predictions = self.predict_fn(np.stack([item for item, _, _ in batch]))
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            finished = time.perf_counter()
+            for (_, future, submitted), prediction in zip(batch, predictions):
+                future.set_result(prediction)
+
+            with self._stats_lock:
+                self._n_requests += len(batch)
+                self._n_batches += 1
+                self._batch_sizes.append(len(batch))
+                self._latencies.extend(finished - submitted for _, _, submitted in batch)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            latencies_ms = np.array(self._latencies) * 1000
+            batch_sizes = np.array(self._batch_sizes)
+            n_requests, n_batches = self._n_requests, self._n_batches
+
+        if len(latencies_ms) == 0:
+            return {"requests": 0, "batches": 0}
+
+        return {
+            "requests": n_requests,
+            "batches": n_batches,
+            "latency_p50_ms": float(np.percentile(latencies_ms, 50)),
+            "latency_p99_ms": float(np.percentile(latencies_ms, 99)),
+            "latency_max_ms": float(latencies_ms.max()),
+            "mean_batch_size": float(batch_sizes.mean()),
+            "batch_fill": float(batch_sizes.mean() / self.max_batch_size),
+            "full_batches": float(np.mean(batch_sizes == self.max_batch_size)),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+def load_image_from_bytes(image_bytes: bytes, image_size: Tuple[int, int] = (224, 224)) -> np.ndarray:
+    """Same decoding as load_image_to_tensor in scripts/inference.py"""
+    import tensorflow as tf
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    image_tensor = tf.convert_to_tensor(np.array(image), dtype=tf.float32)
+    image_tensor = tf.image.resize(image_tensor, image_size)
+
+    return image_tensor.numpy()
+
+
+class PredictionServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 resets connections under concurrent load
+    request_queue_size = 1024
+
+
+def make_request_handler(batcher: MicroBatcher, azimuth_converter: Callable):
+    class PredictionRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, payload, status=200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == "/stats":
+                self._send_json(batcher.stats())
+            elif path == "/health":
+                self._send_json({"status": "ok"})
+            else:
+                self._send_json({"error": "not found"}, status=404)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != "/predict":
+                self._send_json({"error": "not found"}, status=404)
+                return
+
+            units = parse_qs(url.query).get("units", ["degrees"])[0]
+            if units not in ("degrees", "radians"):
+                self._send_json({"error": "unknown units"}, status=400)
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                image = load_image_from_bytes(self.rfile.read(length))
+            except Exception as e:
+                self._send_json({"error": f"cannot decode image: {e}"}, status=400)
+                return
+
+            try:
+                prediction = batcher.predict(image)
+            except Exception as e:
+                self._send_json({"error": f"prediction failed: {type(e).__name__}: {e}"}, status=500)
+                return
+            azimuth = float(azimuth_converter(np.expand_dims(prediction, axis=0))[0])
+            if units == "degrees":
+                azimuth = azimuth / np.pi * 180
+
+            self._send_json({"azimuth": azimuth, "units": units, "output": prediction.tolist()})
+
+        def log_message(self, format, *args):
+            pass
+
+    return PredictionRequestHandler
+
+
+def serve(
+    model,
+    approach: str,
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    max_batch_size: int = 32,
+    max_wait_ms: float = 5.0,
+    inference_timeout_s: float = 30.0,
+):
+    """Serve predictions over HTTP until interrupted"""
+    from car_azimuth_predictor.inference import get_azimuth_converter
+
+    azimuth_converter = get_azimuth_converter(approach)
+    # Trace the predict function before the first request arrives
+    model.predict_on_batch(np.zeros((1, 224, 224, 3), dtype=np.float32))
+
+    batcher = MicroBatcher(
+        lambda images: np.asarray(model.predict_on_batch(images)),
+        max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms,
+        inference_timeout_s=inference_timeout_s,
+    )
+    server = PredictionServer((host, port), make_request_handler(batcher, azimuth_converter))
+
+    print(f"Serving approach {approach} on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+from typing import Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from car_azimuth_predictor.utils.worker_tools import limit_worker_threads
+
+# Model loaded once in every worker process by _init_worker
+_worker_model = None
+_worker_batch_size = None
+_worker_threads = None
+_worker_image_source = None
+
+
+def _init_worker(
+    model_path: str,
+    batch_size: int,
+    threads_per_worker: int,
+    flip_tta_approach: str = None,
+    precision: str = "float32",
+    jit_compile: bool = False,
+    images_zip: str = None,
+):
+    global _worker_model, _worker_batch_size, _worker_threads, _worker_image_source
+
+    limit_worker_threads(threads_per_worker, inter_op_threads=1)
+
+    from car_azimuth_predictor.inference import load_inference_model
+
+    _worker_model = load_inference_model(model_path, flip_tta_approach, precision, jit_compile, num_threads=threads_per_worker)
+    _worker_batch_size = batch_size
+    _worker_threads = threads_per_worker
+    if images_zip is not None:
+        from car_azimuth_predictor.zip_image_source import ZipImageSource
+
+        # Every worker maps the archive with its own handle
+        _worker_image_source = ZipImageSource(images_zip)
+
+
+def _predict_chunk(image_paths: List[str]) -> np.ndarray:
+    import tensorflow as tf
+
+    from car_azimuth_predictor.inference import generate_inference_dataset, predict_dataset
+
+    dataset = generate_inference_dataset(image_paths, batch_size=_worker_batch_size, image_source=_worker_image_source)
+    options = tf.data.Options()
+    options.threading.private_threadpool_size = _worker_threads
+    dataset = dataset.with_options(options)
+
+    return predict_dataset(_worker_model, dataset)
+
+
+def predict_sharded(
+    image_paths: Sequence[str],
+    model_path: str,
+    num_workers: int,
+    threads_per_worker: int = None,
+    batch_size: int = 32,
+    chunk_size: int = None,
+    flip_tta_approach: str = None,
+    precision: str = "float32",
+    jit_compile: bool = False,
+    images_zip: str = None,
+) -> Iterator[Tuple[List[str], np.ndarray]]:
+    """Spread the images over `num_workers` processes, each loading its own model.
+
+    The file list is cut in small chunks that idle workers pull from a shared
+    queue, so a shard of large JPEGs never stalls the others. Chunks are
+    yielded back in file order, without keeping all the predictions in memory.
+    With `images_zip`, `image_paths` are members of that archive.
+    """
+    threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // num_workers)
+    chunk_size = chunk_size or batch_size * 4
+    chunks = [list(image_paths[pos:pos + chunk_size]) for pos in range(0, len(image_paths), chunk_size)]
+
+    # TensorFlow is not fork-safe
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(
+        processes=num_workers,
+        initializer=_init_worker,
+        initargs=(model_path, batch_size, threads_per_worker, flip_tta_approach, precision, jit_compile, images_zip),
+    ) as pool:
+        for chunk, predictions in zip(chunks, pool.imap(_predict_chunk, chunks)):
+            yield chunk, predictions
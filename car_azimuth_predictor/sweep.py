@@ -0,0 +1,205 @@
+import math
+import multiprocessing
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+from omegaconf import DictConfig, OmegaConf
+
+from car_azimuth_predictor.utils.worker_tools import limit_worker_threads
+
+
+def sample_trials(search_space: Mapping, n_trials: int, seed: int = 0) -> List[Dict]:
+    """Draw `n_trials` hyperparameter sets.
+
+    A list value is a set of choices, a mapping is a distribution
+    (`uniform`, `loguniform` or `int`) between `low` and `high`.
+    """
+    rng = np.random.default_rng(seed)
+    trials = []
+    for _ in range(n_trials):
+        hparams = {}
+        for name, space in search_space.items():
+            if isinstance(space, Mapping):
+                low, high = space["low"], space["high"]
+                distribution = space.get("distribution", "uniform")
+                if distribution == "uniform":
+                    value = float(rng.uniform(low, high))
+                elif distribution == "loguniform":
+                    value = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+                elif distribution == "int":
+                    value = int(rng.integers(low, high + 1))
+                else:
+                    raise ValueError(f"Unknown distribution {distribution} for {name}")
+            else:
+                value = space[rng.integers(len(space))]
+                if isinstance(value, np.generic):
+                    value = value.item()
+            hparams[name] = value
+        trials.append(hparams)
+    return trials
+
+
+def rung_budgets(min_epochs: int, max_epochs: int, reduction_factor: int) -> List[int]:
+    """Cumulative epoch budget of every rung, growing by `reduction_factor` up to `max_epochs`"""
+    budgets = [min_epochs]
+    while budgets[-1] < max_epochs:
+        budgets.append(min(budgets[-1] * reduction_factor, max_epochs))
+    return budgets
+
+
+def rung_patience(early_stopping_patience: int, rung_epochs: int) -> int:
+    """Early stopping patience for a rung of `rung_epochs` epochs: at most half of them, at least one"""
+    return max(1, min(early_stopping_patience, rung_epochs // 2))
+
+
+def select_survivors(scores: Mapping[int, float], reduction_factor: int, mode: str = "min") -> List[int]:
+    """Ids of the best 1 / `reduction_factor` trials (at least one); NaN scores rank last"""
+    assert mode in ["min", "max"], "mode must be min or max"
+    sign = 1 if mode == "min" else -1
+    ranked = sorted(
+        scores, key=lambda trial_id: (math.isnan(scores[trial_id]), sign * scores[trial_id])
+    )
+    return ranked[:max(1, len(ranked) // reduction_factor)]
+
+
+def _init_worker(threads_per_worker: int):
+    limit_worker_threads(threads_per_worker, inter_op_threads=2)
+
+
+def _run_trial(task: Dict) -> Dict:
+    import tensorflow as tf
+
+    from car_azimuth_predictor.train_model import train_approach_model
+
+    # Workers run many trials, drop the graph of the previous one
+    tf.keras.backend.clear_session()
+
+    start_time = time.perf_counter()
+    model, history, val_metrics = train_approach_model(
+        task["config"],
+        task["approach"],
+        epochs=task["epochs"],
+        initial_epoch=task["initial_epoch"],
+        checkpoint_path=task["checkpoint_path"],
+        early_stopping_patience=task["early_stopping_patience"],
+        embedding_cache_path=task["embedding_cache_path"],
+        image_cache_path=task["image_cache_path"],
+        verbose=0,
+        **task["hparams"],
+    )
+
+    logged = history.history.get(task["metric"], [])
+    if task["mode"] == "min":
+        score = float(np.min(logged)) if logged else float("nan")
+    else:
+        score = float(np.max(logged)) if logged else float("nan")
+
+    return {
+        "trial_id": task["trial_id"],
+        "rung": task["rung"],
+        "epochs": task["epochs"],
+        "epochs_run": len(history.epoch),
+        **task["hparams"],
+        "score": score,
+        **{f"val_{name}": value for name, value in val_metrics.items()},
+        "seconds": time.perf_counter() - start_time,
+    }
+
+
+def run_sweep(
+    config: DictConfig,
+    approach: str,
+    output_path: str,
+    num_workers: int = 1,
+    threads_per_worker: int = None,
+    embedding_cache_path: str = None,
+    sweep_config: DictConfig = None,
+    image_cache_path: str = None,
+) -> pd.DataFrame:
+    """Successive-halving search over `sweep_config.search_space` (defaults to `config.sweep`).
+
+    Every rung trains the surviving trials, resumed from their checkpoint
+    (weights and optimizer state), up to its epoch budget in `num_workers` processes with
+    `threads_per_worker` CPU threads each. The best 1 / reduction_factor
+    trials on the logged validation metric go to the next rung. The early
+    stopping patience is capped at half the epochs of the rung, so that it
+    can trigger within it. One row per
+    trial and rung is written to `output_path/trials.csv` after every rung.
+    """
+    sweep_config = sweep_config if sweep_config is not None else config.sweep
+    search_space = OmegaConf.to_container(sweep_config.search_space, resolve=True)
+    if image_cache_path is not None and embedding_cache_path is None:
+        # Built once here rather than concurrently by the first trials
+        from car_azimuth_predictor.image_shard_cache import build_image_shards
+        from car_azimuth_predictor.train_model import get_approach_targets
+        from car_azimuth_predictor.zip_image_source import image_source_from_config
+
+        build_image_shards(
+            Path(os.getcwd()) / config.dataset_generation.df_path,
+            get_approach_targets(approach)[0],
+            (config.dataset_generation.image_height, config.dataset_generation.image_width),
+            image_cache_path,
+            n_shards=config.dataset_generation.image_cache_n_shards,
+            shuffle_seed=config.dataset_generation.image_cache_shuffle_seed,
+            image_source=image_source_from_config(config),
+        )
+
+    trials = sample_trials(search_space, sweep_config.n_trials, sweep_config.seed)
+    budgets = rung_budgets(sweep_config.min_epochs, sweep_config.max_epochs, sweep_config.reduction_factor)
+    threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // num_workers)
+
+    output_path = Path(output_path)
+    os.makedirs(output_path, exist_ok=True)
+    table_path = output_path / "trials.csv"
+
+    rows = []
+    alive: Sequence[int] = list(range(len(trials)))
+    # TensorFlow is not fork-safe
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes=num_workers, initializer=_init_worker, initargs=(threads_per_worker,)) as pool:
+        for rung, budget in enumerate(budgets):
+            tasks = [
+                {
+                    "config": config,
+                    "approach": approach,
+                    "trial_id": trial_id,
+                    "rung": rung,
+                    "epochs": budget,
+                    "initial_epoch": budgets[rung - 1] if rung else 0,
+                    "hparams": trials[trial_id],
+                    "checkpoint_path": str(output_path / f"trial_{trial_id:03d}"),
+                    "embedding_cache_path": embedding_cache_path,
+                    "image_cache_path": image_cache_path,
+                    "early_stopping_patience": rung_patience(
+                        sweep_config.early_stopping_patience, budget - (budgets[rung - 1] if rung else 0)
+                    ),
+                    "metric": sweep_config.metric,
+                    "mode": sweep_config.mode,
+                }
+                for trial_id in alive
+            ]
+            rung_rows = list(pool.imap_unordered(_run_trial, tasks))
+
+            if rung < len(budgets) - 1:
+                survivors = set(select_survivors(
+                    {row["trial_id"]: row["score"] for row in rung_rows},
+                    sweep_config.reduction_factor,
+                    sweep_config.mode,
+                ))
+            else:
+                survivors = set()
+            for row in rung_rows:
+                row["status"] = "completed" if rung == len(budgets) - 1 else (
+                    "promoted" if row["trial_id"] in survivors else "pruned"
+                )
+            rows.extend(sorted(rung_rows, key=lambda row: row["trial_id"]))
+            alive = sorted(survivors)
+
+            pd.DataFrame(rows).to_csv(table_path, index=False)
+            print(f"Rung {rung} ({budget} epochs): {len(rung_rows)} trials, {len(alive)} promoted")
+
+    return pd.DataFrame(rows)
@@ -3,12 +3,67 @@ import os
 import tempfile
 import pickle
 from datetime import datetime
+from functools import partial
 from pathlib import Path
 from typing import Iterable
 
 import tensorflow as tf
 from omegaconf import DictConfig
 
+from car_azimuth_predictor.distributed import (
+    ThroughputLogger,
+    count_split_rows,
+    distributed_steps,
+    get_distribution_strategy,
+    is_chief,
+    remove_worker_path,
+    scaled_learning_rate,
+    writable_path,
+)
+from car_azimuth_predictor.utils.training_tools import (
+    AngleErrorPercentiles,
+    AngleMetrics,
+    horizontal_flip_pose_sin_cos_output,
+    # Approach 2
+    angle_double_output_loss,
+    horizontal_flip_pose_double_sigmoid,
+)
+
+
+def get_approach_targets(approach: str):
+    """Target columns of the annotations table and pose flip function of the approach"""
+    assert approach in ["1", "2"], "Approach must be 1 or 2"
+
+    if approach == "1":
+        pose_flip_fn = horizontal_flip_pose_sin_cos_output
+        gt_cols = ["azimuth_sin", "azimuth_cos"]
+    else:
+        pose_flip_fn = horizontal_flip_pose_double_sigmoid
+        gt_cols = ['azimuth_norm_abs', 'azimuth_radians_shifted_0.5_pi_norm_abs']
+
+    return gt_cols, pose_flip_fn
+
+
+def get_loss_and_metrics(approach: str):
+    assert approach in ["1", "2"], "Approach must be 1 or 2"
+
+    # AngleMetrics logs mean_absolute_angle_error, rmse, r2 and acc_pi_6 over the whole dataset,
+    # AngleErrorPercentiles p50/p90/p99_absolute_angle_error
+    if approach == "1":
+        metrics = [
+            AngleMetrics("sin_cos"),
+            AngleErrorPercentiles("sin_cos"),
+        ]
+        loss = tf.keras.losses.MeanSquaredError(reduction="auto", name="mean_squared_error")
+    else:
+        metrics = [
+            AngleMetrics("double_sigmoid"),
+            AngleErrorPercentiles("double_sigmoid"),
+        ]
+        loss = angle_double_output_loss
+
+    return loss, metrics
+
 
 def train_model(
     config: DictConfig,
@@ -23,10 +78,20 @@ def train_model(
     epochs: int = 100,
     early_stopping_patience: int = 10,
     verbose: int = 1,
+    initial_epoch: int = 0,
+    jit_compile: bool = False,
+    steps_per_epoch: int = None,
+    validation_steps: int = None,
+    callbacks: Iterable = (),
 ):
-    """Function to train the model"""
+    """Function to train the model
+
+    Under a multi-worker strategy, only the chief writes the model and the
+    history.
+    """
+    strategy = tf.distribute.get_strategy()
 
-    model.compile(optimizer=optimizer, loss=loss, metrics=metrics)
+    model.compile(optimizer=optimizer, loss=loss, metrics=metrics, jit_compile=jit_compile)
 
     with tempfile.TemporaryDirectory() as tmpdirname:
         model_checkpoint_path = os.path.join(
@@ -50,17 +115,185 @@ def train_model(
         train_history = model.fit(
             train_dataset,
             epochs=epochs,
+            initial_epoch=initial_epoch,
             use_multiprocessing=True,
-            callbacks=[checkpoint_callback, es_callback],
+            callbacks=[checkpoint_callback, es_callback, *callbacks],
             validation_data=validation_dataset,
+            steps_per_epoch=steps_per_epoch,
+            validation_steps=validation_steps,
             verbose=verbose,
         )
 
         if save_model_path is not None:
-            model.save(save_model_path)
+            worker_save_model_path = writable_path(strategy, save_model_path)
+            model.save(worker_save_model_path)
+            remove_worker_path(strategy, worker_save_model_path)
 
     if train_history_path is not None:
-        with open(train_history_path, "wb") as fp:
+        # Pickling the history saves its model, which every worker must take part in
+        worker_train_history_path = writable_path(strategy, train_history_path)
+        with open(worker_train_history_path, "wb") as fp:
             pickle.dump(train_history, fp)
+        remove_worker_path(strategy, worker_train_history_path)
 
     return train_history
+
+
+def train_approach_model(
+    config: DictConfig,
+    approach: str,
+    n_neurons_middle_layer: int = 100,
+    dropout_rate: float = 0.2,
+    learning_rate: float = 0.001,
+    batch_size: int = 32,
+    should_augment: bool = True,
+    epochs: int = 100,
+    early_stopping_patience: int = 10,
+    verbose: int = 2,
+    save_model_path: str = None,
+    train_history_path: str = None,
+    embedding_cache_path: str = None,
+    initial_epoch: int = 0,
+    init_weights_path: str = None,
+    checkpoint_path: str = None,
+    image_cache_path: str = None,
+    precision: str = "float32",
+    jit_compile: bool = False,
+    distributed: bool = False,
+    throughput_report_path: str = None,
+):
+    """Build the model of the approach with the given hyperparameters and train it.
+
+    With `embedding_cache_path` only the head is trained, on the cached
+    backbone embeddings. With `image_cache_path` the images are read from
+    pre-decoded shards. `init_weights_path` and `initial_epoch` resume a
+    previous run from its weights. `checkpoint_path` is a directory holding
+    the weights and the optimizer state: they are restored from it when it
+    exists and saved to it after training, so that successive calls continue
+    the same optimization. `precision` (see precision.PRECISIONS) sets the dtype
+    policy of the model, `jit_compile` compiles the train and evaluation
+    steps with XLA.
+
+    With `distributed`, the workers of TF_CONFIG train together with
+    MultiWorkerMirroredStrategy: `batch_size` is per worker, the global
+    batch size and the learning rate grow with the number of workers.
+    Returns the trained model, its history and the validation metrics.
+    """
+    from tensorflow.python.keras.utils.layer_utils import count_params
+
+    from car_azimuth_predictor.dataset_generation import generate_datasets
+    from car_azimuth_predictor.embedding_cache import load_embedding_datasets
+    from car_azimuth_predictor.model_generation import generate_model, generate_top_model
+    from car_azimuth_predictor.precision import precision_policy
+
+    strategy = get_distribution_strategy(distributed)
+    n_workers = strategy.num_replicas_in_sync
+    global_batch_size = batch_size * n_workers
+    if distributed and embedding_cache_path is not None:
+        raise ValueError("Distributed training is not supported on the embedding cache")
+    if distributed and checkpoint_path is not None:
+        raise ValueError("Distributed training does not support checkpoint_path")
+
+    gt_cols, pose_flip_fn = get_approach_targets(approach)
+    steps_per_epoch, validation_steps = None, None
+
+    if embedding_cache_path is not None:
+        # Head-only training on the precomputed backbone embeddings
+        train_dataset, validation_dataset = load_embedding_datasets(
+            embedding_cache_path, gt_cols=gt_cols, batch_size=batch_size
+        )
+    elif distributed:
+        def dataset_fn(split, input_context):
+            datasets = generate_datasets(
+                config,
+                gt_cols=gt_cols,
+                pose_flip_fn=pose_flip_fn,
+                batch_size=input_context.get_per_replica_batch_size(global_batch_size),
+                augment=should_augment,
+                image_cache_path=image_cache_path,
+                input_context=input_context,
+            )
+            # Train is repeated, so that shards of uneven sizes give every worker the same
+            # number of steps; val is read once (see distributed_steps)
+            return datasets[0].repeat() if split == 0 else datasets[1]
+
+        train_dataset = strategy.distribute_datasets_from_function(partial(dataset_fn, 0))
+        validation_dataset = strategy.distribute_datasets_from_function(partial(dataset_fn, 1))
+        n_rows = count_split_rows(config)
+        steps_per_epoch, validation_steps = distributed_steps(n_rows["train"], n_rows["val"], batch_size, n_workers)
+    else:
+        train_dataset, validation_dataset = generate_datasets(
+            config,
+            gt_cols=gt_cols,
+            pose_flip_fn=pose_flip_fn,
+            batch_size=batch_size,
+            augment=should_augment,
+            image_cache_path=image_cache_path,
+        )
+
+    with strategy.scope():
+        # The metrics hold variables, so they must be created in the scope of the model
+        loss, metrics = get_loss_and_metrics(approach)
+        with precision_policy(precision):
+            bottom = generate_top_model(approach, n_neurons_middle_layer, dropout_rate)
+            model = bottom if embedding_cache_path is not None else generate_model(config, top_model=bottom)
+
+        if init_weights_path is not None:
+            model.load_weights(init_weights_path)
+
+        print("Number of trainable weights:", count_params(model.trainable_weights))
+
+        optimizer = tf.keras.optimizers.Adamax(learning_rate=scaled_learning_rate(learning_rate, n_workers))
+
+        checkpoint_manager = None
+        if checkpoint_path is not None:
+            checkpoint = tf.train.Checkpoint(model=model, optimizer=optimizer)
+            checkpoint_manager = tf.train.CheckpointManager(checkpoint, checkpoint_path, max_to_keep=1)
+            if checkpoint_manager.latest_checkpoint is not None:
+                # The optimizer slots are restored when the first step creates them
+                checkpoint.restore(checkpoint_manager.latest_checkpoint)
+
+        callbacks = []
+        if throughput_report_path is not None:
+            # On every worker, so that they all run the same callbacks
+            callbacks.append(
+                ThroughputLogger(
+                    throughput_report_path if is_chief(strategy) else None,
+                    n_workers,
+                    global_batch_size,
+                    steps_per_epoch or count_split_rows(config)["train"] // global_batch_size,
+                )
+            )
+
+        train_history = train_model(
+            config,
+            model=model,
+            train_dataset=train_dataset,
+            validation_dataset=validation_dataset,
+            optimizer=optimizer,
+            loss=loss,
+            metrics=metrics,
+            verbose=verbose,
+            save_model_path=save_model_path if embedding_cache_path is None else None,
+            train_history_path=train_history_path,
+            epochs=epochs,
+            early_stopping_patience=early_stopping_patience,
+            initial_epoch=initial_epoch,
+            jit_compile=jit_compile,
+            steps_per_epoch=steps_per_epoch,
+            validation_steps=validation_steps,
+            callbacks=callbacks,
+        )
+        if checkpoint_manager is not None:
+            checkpoint_manager.save()
+
+        if embedding_cache_path is not None and save_model_path is not None:
+            # Put the trained head back on the backbone, so the saved model takes images
+            with precision_policy(precision):
+                full_model = generate_model(config, top_model=bottom)
+            full_model.compile(loss=loss, metrics=metrics)
+            full_model.save(save_model_path)
+
+        val_metrics = model.evaluate(validation_dataset, verbose=verbose, steps=validation_steps, return_dict=True)
+
+    return model, train_history, val_metrics
@@ -0,0 +1,239 @@
+"""Encoders, decoders and horizontal flips of the angle representations.
+
+Every encoding has matching NumPy (`np_*`) and TensorFlow (`tf_*`)
+functions, gathered in `CODECS`. The NumPy functions keep float32 inputs in
+float32 and write into `out=` when given, so hot loops can reuse buffers.
+
+This module must not import TensorFlow at import time, so that feature
+generation, visualization and post-processing stay cheap to import: the
+`tf_*` functions import it on call.
+"""
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+
+def _float_dtype(array: np.ndarray) -> np.dtype:
+    return array.dtype if np.issubdtype(array.dtype, np.floating) else np.dtype(np.float32)
+
+
+def _angles_out(y: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    return np.empty(y.shape[:-1], dtype=_float_dtype(y)) if out is None else out
+
+
+def _pairs_out(angle_radians: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    return np.empty(angle_radians.shape + (2,), dtype=_float_dtype(angle_radians)) if out is None else out
+
+
+# Per quadrant index (rear + 2 * left): sign of |β| in α2, offset of α2 (in units of π) and
+# scale of the azimuth. α2 is π/2 - |β| front right, π/2 + |β| rear right, |β| - π/2 front left
+# and 3π/2 - |β| rear left, the azimuth (|α| + α2) / 2, negated on the left
+_QUADRANT_BETA_SIGNS = np.array([-1, 1, 1, -1])
+_QUADRANT_OFFSETS = np.array([0.5, 0.5, -0.5, 1.5])
+_QUADRANT_SCALES = np.array([1, 1, -1, -1]) * np.pi / 2
+
+
+def np_get_angle_from_double_sigmoids(y_sigmoids: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """Azimuths in [-π, π] of normalized |α| (front/rear) and |β| (left/right) outputs,
+    same result as tf_get_angle_from_double_sigmoids"""
+    y_sigmoids = np.asarray(y_sigmoids)
+    assert len(y_sigmoids.shape) > 1, f"shape is {y_sigmoids.shape}"
+    dtype = _float_dtype(y_sigmoids)
+    alfa, beta = y_sigmoids[..., 0], y_sigmoids[..., 1]
+
+    quadrants = np.greater_equal(beta, 0.5).view(np.uint8) * np.uint8(2)
+    quadrants += np.greater_equal(alfa, 0.5).view(np.uint8)
+
+    out = _angles_out(y_sigmoids, out)
+    np.multiply(beta, np.take(_QUADRANT_BETA_SIGNS.astype(dtype), quadrants), out=out)
+    out += alfa
+    out += np.take(_QUADRANT_OFFSETS.astype(dtype), quadrants)
+    out *= np.take(_QUADRANT_SCALES.astype(dtype), quadrants)
+    return out
+
+
+def np_get_angle_from_double_sigmoids_old(y_sigmoids: np.ndarray) -> np.ndarray:
+    """Legacy decoding of the double sigmoid outputs: π·|α|, negated when |β| >= 0.5 (left side).
+
+    Exact on clean encodings, but only the side is taken from |β|, so unlike
+    np_get_angle_from_double_sigmoids it does not average the two estimates
+    of noisy outputs. Kept for the "double_sigmoid_old" decoder and the
+    `*_old` metrics.
+    """
+    y_pred_abs_angle = y_sigmoids[:, 0] * np.pi
+    sign_cond = (y_sigmoids[:, 1] < 0.5) * 2 - 1
+    return sign_cond * y_pred_abs_angle
+
+
+def np_get_sigmoids_from_angle(angle_radians: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """Inverse of np_get_angle_from_double_sigmoids: normalized |α| and |β| of each angle (any turn)"""
+    angle_radians = np.asarray(angle_radians)
+    out = _pairs_out(angle_radians, out)
+    # |α| = |wrap(φ)| and |β| = |wrap(φ - π/2)|, with wrap(x) = x + π - 2π * floor((x + π) / 2π) - π,
+    # computed in a contiguous scratch array (np.mod is several times slower than floor)
+    scratch = np.empty(angle_radians.shape, dtype=out.dtype)
+    for column, offset in [(0, np.pi), (1, np.pi / 2)]:
+        np.add(angle_radians, offset, out=scratch)
+        scratch *= 1 / (2 * np.pi)
+        np.floor(scratch, out=scratch)
+        scratch *= -2 * np.pi
+        scratch += angle_radians
+        scratch += offset - np.pi
+        np.abs(scratch, out=scratch)
+        np.multiply(scratch, 1 / np.pi, out=out[..., column])
+    return out
+
+
+def np_get_sin_cos_from_angle(angle_radians: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    angle_radians = np.asarray(angle_radians)
+    out = _pairs_out(angle_radians, out)
+    np.sin(angle_radians, out=out[..., 0])
+    np.cos(angle_radians, out=out[..., 1])
+    return out
+
+
+def np_get_angle_from_sin_cos(y_sincos: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    y_sincos = np.asarray(y_sincos)
+    return np.arctan2(y_sincos[..., 0], y_sincos[..., 1], out=_angles_out(y_sincos, out))
+
+
+def np_shift_05_pi(orig_radians: np.ndarray) -> np.ndarray:
+    shifted_radians = orig_radians - 0.5 * np.pi
+    shifted_radians -= (shifted_radians >= np.pi) * 2 * np.pi
+    shifted_radians += (shifted_radians < -np.pi) * 2 * np.pi
+    return shifted_radians
+
+
+def horizontal_flip_pose_sin_cos_output(pose):
+    return [-pose[0], pose[1]]
+
+
+def horizontal_flip_pose_double_sigmoid(pose):
+    return [pose[0], 1 - pose[1]]
+
+
+def np_horizontal_flip_sin_cos_output(y_sincos: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """Batch version of horizontal_flip_pose_sin_cos_output; `out` may be `y_sincos`"""
+    y_sincos = np.asarray(y_sincos)
+    out = np.empty_like(y_sincos) if out is None else out
+    np.negative(y_sincos[..., 0], out=out[..., 0])
+    out[..., 1] = y_sincos[..., 1]
+    return out
+
+
+def np_horizontal_flip_double_sigmoid(y_sigmoids: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """Batch version of horizontal_flip_pose_double_sigmoid; `out` may be `y_sigmoids`"""
+    y_sigmoids = np.asarray(y_sigmoids)
+    out = np.empty_like(y_sigmoids) if out is None else out
+    out[..., 0] = y_sigmoids[..., 0]
+    np.subtract(1, y_sigmoids[..., 1], out=out[..., 1])
+    return out
+
+
+def np_circular_mean(*angles_radians: np.ndarray) -> np.ndarray:
+    """Element-wise mean direction of several angle arrays"""
+    return np.arctan2(
+        np.sum([np.sin(angles) for angles in angles_radians], axis=0),
+        np.sum([np.cos(angles) for angles in angles_radians], axis=0),
+    )
+
+
+def tf_get_angle_from_double_sigmoids(y_output):
+    """Azimuths in [-π, π] of normalized |α| and |β| outputs, in the float dtype of `y_output`"""
+    import tensorflow as tf
+
+    y_output = tf.convert_to_tensor(y_output)
+    dtype = y_output.dtype
+    y_pred_abs_angle = y_output * np.pi
+
+    # First we need to get the quadrant from 2 angles of the y_output,
+    # both are positive numbers from 0 to PI, but the second one's zero is aligned to PI/2
+    alfa_less_90 = y_pred_abs_angle[:, 0] < np.pi / 2
+    beta_less_90 = y_pred_abs_angle[:, 1] < np.pi / 2
+    quad1_cond = alfa_less_90 & beta_less_90
+    quad2_cond = ~alfa_less_90 & beta_less_90
+    quad3_cond = ~alfa_less_90 & ~beta_less_90
+    quad4_cond = alfa_less_90 & ~beta_less_90
+
+    # Then knowing the correct quadrant we define alfa2 from the beta angle which is aligned to original alfa
+    alfa2_from_beta = 0
+    alfa2_from_beta += tf.cast(quad1_cond, dtype) * (
+        np.pi / 2 - y_pred_abs_angle[:, 1]
+    )
+    alfa2_from_beta += tf.cast(quad2_cond, dtype) * (
+        np.pi / 2 + y_pred_abs_angle[:, 1]
+    )
+    alfa2_from_beta += tf.cast(quad3_cond, dtype) * (
+        3 * np.pi / 2 - y_pred_abs_angle[:, 1]
+    )
+    alfa2_from_beta += tf.cast(quad4_cond, dtype) * (
+        -np.pi / 2 + y_pred_abs_angle[:, 1]
+    )
+
+    # Knowing two angles and the quadrant of the target we revover the real position of the azimuth
+    mean_alfa_angle = (y_pred_abs_angle[:, 0] + alfa2_from_beta) / 2
+    mean_alfa_angle *= -1 * (tf.cast(quad3_cond | quad4_cond, dtype) * 2 - 1)
+    return mean_alfa_angle
+
+
+def tf_get_sigmoids_from_angle(angle_radians):
+    import tensorflow as tf
+
+    alfa = tf.math.abs(tf.math.floormod(angle_radians + np.pi, 2 * np.pi) - np.pi) / np.pi
+    beta = tf.math.abs(tf.math.floormod(angle_radians + np.pi / 2, 2 * np.pi) - np.pi) / np.pi
+    return tf.stack([alfa, beta], axis=-1)
+
+
+def tf_get_sin_cos_from_angle(angle_radians):
+    import tensorflow as tf
+
+    return tf.stack([tf.math.sin(angle_radians), tf.math.cos(angle_radians)], axis=-1)
+
+
+def tf_get_angle_from_sin_cos(y_sincos):
+    import tensorflow as tf
+
+    return tf.math.atan2(y_sincos[..., 0], y_sincos[..., 1])
+
+
+def tf_horizontal_flip_sin_cos_output(y_sincos):
+    import tensorflow as tf
+
+    return tf.stack([-y_sincos[..., 0], y_sincos[..., 1]], axis=-1)
+
+
+def tf_horizontal_flip_double_sigmoid(y_sigmoids):
+    import tensorflow as tf
+
+    return tf.stack([y_sigmoids[..., 0], 1 - y_sigmoids[..., 1]], axis=-1)
+
+
+class AngleCodec(NamedTuple):
+    """Matching encode (radians -> outputs), decode and horizontal flip functions of an encoding"""
+
+    np_encode: Callable
+    np_decode: Callable
+    np_flip: Callable
+    tf_encode: Callable
+    tf_decode: Callable
+    tf_flip: Callable
+
+
+CODECS = {
+    "sin_cos": AngleCodec(
+        np_get_sin_cos_from_angle,
+        np_get_angle_from_sin_cos,
+        np_horizontal_flip_sin_cos_output,
+        tf_get_sin_cos_from_angle,
+        tf_get_angle_from_sin_cos,
+        tf_horizontal_flip_sin_cos_output,
+    ),
+    "double_sigmoid": AngleCodec(
+        np_get_sigmoids_from_angle,
+        np_get_angle_from_double_sigmoids,
+        np_horizontal_flip_double_sigmoid,
+        tf_get_sigmoids_from_angle,
+        tf_get_angle_from_double_sigmoids,
+        tf_horizontal_flip_double_sigmoid,
+    ),
+}
@@ -0,0 +1,32 @@
+"""NumPy counterparts of the angle metrics in training_tools, for offline reports"""
+import numpy as np
+
+
+def np_align_pred_angle(y_true_angle: np.ndarray, y_pred_angle: np.ndarray) -> np.ndarray:
+    y_pred_angle = y_pred_angle + (y_true_angle - y_pred_angle > np.pi) * 2 * np.pi
+    y_pred_angle -= (y_true_angle - y_pred_angle < -np.pi) * 2 * np.pi
+    return y_pred_angle
+
+
+def np_absolute_angle_errors(y_true_angle: np.ndarray, y_pred_angle: np.ndarray) -> np.ndarray:
+    """Absolute angular errors in degrees, taking the wrap-around at ±π into account"""
+    y_pred_angle = np_align_pred_angle(y_true_angle, y_pred_angle)
+    return np.abs(y_true_angle - y_pred_angle) / np.pi * 180
+
+
+def np_angle_metrics(y_true_angle: np.ndarray, y_pred_angle: np.ndarray) -> dict:
+    """Dataset-level metrics, same definitions as the tf_* metrics of training_tools"""
+    y_true_angle = np.asarray(y_true_angle, dtype=np.float64)
+    y_pred_angle = np_align_pred_angle(y_true_angle, np.asarray(y_pred_angle, dtype=np.float64))
+    errors = y_true_angle - y_pred_angle
+    abs_errors_degrees = np.abs(errors) / np.pi * 180
+
+    return {
+        "mean_absolute_angle_error": float(abs_errors_degrees.mean()),
+        "median_absolute_angle_error": float(np.median(abs_errors_degrees)),
+        "rmse": float(np.sqrt(np.mean(errors ** 2)) / np.pi * 180),
+        "r2": float(
+            1 - np.sum(errors ** 2) / np.sum((y_true_angle - y_true_angle.mean()) ** 2)
+        ),
+        "acc_pi_6": float(np.mean(np.abs(errors) < np.pi / 6)),
+    }
@@ -1,15 +1,26 @@
 import random
+from functools import lru_cache
 from typing import Callable
 
-import albumentations as A
 import numpy as np
 import tensorflow as tf
-import tensorflow_probability as tfp
-from albumentations.augmentations import functional as F
-from tensorflow.keras.applications.efficientnet_v2 import (
-    preprocess_input as preprocess_input_effnet,
+
+# The codecs live in angle_codecs, re-exported here for backward compatibility
+from car_azimuth_predictor.utils.angle_codecs import (  # noqa: F401
+    CODECS,
+    horizontal_flip_pose_double_sigmoid,
+    horizontal_flip_pose_sin_cos_output,
+    np_get_angle_from_double_sigmoids,
+    np_get_angle_from_double_sigmoids_old,
+    np_get_angle_from_sin_cos,
+    np_get_sigmoids_from_angle,
+    np_shift_05_pi,
+    tf_get_angle_from_double_sigmoids,
 )
 
+# tensorflow_probability, albumentations and the EfficientNet preprocessing are
+# imported on first use: they add seconds to the import of this module.
+
 
 def tf_align_pred_angle(y_true_angle: tf.Tensor, y_pred_angle: tf.Tensor) -> tf.Tensor:
     positive_cond = tf.cast(y_true_angle - y_pred_angle > np.pi, tf.float32)
@@ -41,6 +52,8 @@ def tf_mean_absolute_angle_error_sin_cos_output(
 def tf_median_absolute_angle_error(
     y_true_angle: tf.Tensor, y_pred_angle: tf.Tensor
 ) -> tf.Tensor:
+    import tensorflow_probability as tfp
+
     y_pred_angle = tf_align_pred_angle(y_true_angle, y_pred_angle)
 
     return (
@@ -108,102 +121,13 @@ def tf_r2_angle_score_sin_cos_output(y_true: tf.Tensor, y_pred: tf.Tensor) -> tf
     return tf_r2_angle_score(y_true_angle, y_pred_angle)
 
 
-def tf_get_angle_from_double_sigmoids(y_output: tf.Tensor) -> tf.Tensor:
-    y_pred_abs_angle = y_output * np.pi
-
-    # First we need to get the quadrant from 2 angles of the y_output,
-    # both are positive numbers from 0 to PI, but the second one's zero is aligned to PI/2
-    alfa_less_90 = y_pred_abs_angle[:, 0] < np.pi / 2
-    beta_less_90 = y_pred_abs_angle[:, 1] < np.pi / 2
-    quad1_cond = alfa_less_90 & beta_less_90
-    quad2_cond = ~alfa_less_90 & beta_less_90
-    quad3_cond = ~alfa_less_90 & ~beta_less_90
-    quad4_cond = alfa_less_90 & ~beta_less_90
-
-    # Then knowing the correct quadrant we define alfa2 from the beta angle which is aligned to original alfa
-    alfa2_from_beta = 0
-    alfa2_from_beta += tf.cast(quad1_cond, tf.float32) * (
-        np.pi / 2 - y_pred_abs_angle[:, 1]
-    )
-    alfa2_from_beta += tf.cast(quad2_cond, tf.float32) * (
-        np.pi / 2 + y_pred_abs_angle[:, 1]
-    )
-    alfa2_from_beta += tf.cast(quad3_cond, tf.float32) * (
-        3 * np.pi / 2 - y_pred_abs_angle[:, 1]
-    )
-    alfa2_from_beta += tf.cast(quad4_cond, tf.float32) * (
-        -np.pi / 2 + y_pred_abs_angle[:, 1]
-    )
-
-    # Knowing two angles and the quadrant of the target we revover the real position of the azimuth
-    mean_alfa_angle = (y_pred_abs_angle[:, 0] + alfa2_from_beta) / 2
-    mean_alfa_angle *= -1 * (tf.cast(quad3_cond | quad4_cond, tf.float32) * 2 - 1)
-    return mean_alfa_angle
-
-
-def np_get_angle_from_double_sigmoids(y_sigmoids: np.ndarray) -> np.ndarray:
-    """
-    Numpy implementation of tf_get_angle_from_double_sigmoids
-
-    Parameters
-    ----------
-    y_sigmoids
-
-    Returns
-    -------
-
-    """
-    assert len(y_sigmoids.shape) > 1, f"shape is {y_sigmoids.shape}"
-    # print(y_sigmoids)
-    y_pred_abs_angle = y_sigmoids * np.pi
-
-    alfa_less_90 = y_pred_abs_angle[:, 0] < np.pi / 2
-    beta_less_90 = y_pred_abs_angle[:, 1] < np.pi / 2
-    quad1_cond = alfa_less_90 * beta_less_90
-    quad2_cond = (1 - alfa_less_90) * beta_less_90
-    quad3_cond = (1 - alfa_less_90) * (1 - beta_less_90)
-    quad4_cond = alfa_less_90 * (1 - beta_less_90)
-
-    alfa2_from_beta = 0
-    alfa2_from_beta += quad1_cond * (np.pi / 2 - y_pred_abs_angle[:, 1])
-    alfa2_from_beta += quad2_cond * (np.pi / 2 + y_pred_abs_angle[:, 1])
-    alfa2_from_beta += quad3_cond * (3 * np.pi / 2 - y_pred_abs_angle[:, 1])
-    alfa2_from_beta += quad4_cond * (-np.pi / 2 + y_pred_abs_angle[:, 1])
-
-    # TODO: reallign ?
-    mean_alfa_angle = (y_pred_abs_angle[:, 0] + alfa2_from_beta) / 2
-    mean_alfa_angle *= -1 * ((quad3_cond + quad4_cond) * 2 - 1)
-
-    return mean_alfa_angle
-
-
 def tf_get_angle_from_double_sigmoids_old(y_output: tf.Tensor) -> tf.Tensor:
+    y_output = tf.convert_to_tensor(y_output)
     y_pred_abs_angle = y_output[:, 0] * np.pi
-    sign_cond = tf.cast(y_output[:, 1] < 0.5, tf.float32) * 2 - 1
+    sign_cond = tf.cast(y_output[:, 1] < 0.5, y_output.dtype) * 2 - 1
     return sign_cond * y_pred_abs_angle
 
 
-def np_get_angle_from_double_sigmoids_old(y_sigmoids: np.ndarray) -> np.ndarray:
-    y_pred_abs_angle = y_sigmoids[:, 0] * np.pi
-    sign_cond = (y_sigmoids[:, 1] < 0.5) * 2 - 1
-    return sign_cond * y_pred_abs_angle  # TODO: not tested, but should be correct
-
-
-def np_get_sigmoids_from_angle(angle_radians: np.ndarray) -> np.ndarray:
-    cond = angle_radians > np.pi
-    first_sigm = angle_radians - cond * 2 * np.pi
-
-    shifted_radians = angle_radians - np.pi / 2
-    cond = shifted_radians > np.pi
-    second_sigm = shifted_radians - cond * 2 * np.pi
-
-    return np.stack(first_sigm, second_sigm)  # TODO: not tested even once
-
-
-def np_get_angle_from_sin_cos(y_sincos: np.ndarray) -> np.ndarray:
-    return np.arctan2(y_sincos[:, 0], y_sincos[:, 1])
-
-
 def tf_mean_absolute_angle_error_double_sigmoid(
     y_true: tf.Tensor, y_pred: tf.Tensor
 ) -> tf.Tensor:
@@ -284,26 +208,145 @@ def tf_rmse_angle_score_double_sigmoid_old(
     )
 
 
-def np_shift_05_pi(orig_radians: np.ndarray) -> np.ndarray:
-    shifted_radians = orig_radians - 0.5 * np.pi
-    shifted_radians -= (shifted_radians >= np.pi) * 2 * np.pi
-    shifted_radians += (shifted_radians < -np.pi) * 2 * np.pi
-    return shifted_radians
+ANGLE_DECODERS = {name: codec.tf_decode for name, codec in CODECS.items()}
 
 
-transforms = A.Compose(
-    [
-        A.Rotate(limit=10, p=0.5),
-        A.OpticalDistortion(distort_limit=(0, 0.2), p=0.7),
-        A.RandomCrop(height=180, width=180, p=0.5),
-        A.RandomBrightnessContrast(brightness_limit=0.15, contrast_limit=0.15, p=0.5),
-        A.Resize(*(224, 224), always_apply=True),
-    ]
-)
+class AngleMetrics(tf.keras.metrics.Metric):
+    """Dataset-level MAE, RMSE (degrees), R2 and acc_pi_6 of an angle encoding.
+
+    The angles of a batch are decoded once, and sums of the errors, squared
+    errors, hits and of the true angles are accumulated over the batches, so
+    the results are exact over the whole dataset rather than batch averages.
+    """
+
+    def __init__(self, encoding: str = "sin_cos", name: str = "angle_metrics", **kwargs):
+        super().__init__(name=name, **kwargs)
+        assert encoding in ANGLE_DECODERS, f"encoding must be one of {list(ANGLE_DECODERS)}"
+        self.encoding = encoding
+        # float64 sums: R2 takes the difference of two large sums over the dataset
+        self.statistics = {
+            statistic: self.add_weight(name=statistic, initializer="zeros", dtype=tf.float64)
+            for statistic in ["count", "sum_abs_error", "sum_squared_error", "hits", "sum_true", "sum_squared_true"]
+        }
+
+    def update_state(self, y_true, y_pred, sample_weight=None):
+        decode = ANGLE_DECODERS[self.encoding]
+        y_true_angle = decode(tf.cast(y_true, tf.float32))
+        y_pred_angle = tf_align_pred_angle(y_true_angle, decode(tf.cast(y_pred, tf.float32)))
+
+        abs_error = tf.cast(tf.math.abs(y_true_angle - y_pred_angle), tf.float64)
+        y_true_angle = tf.cast(y_true_angle, tf.float64)
+        weights = tf.ones_like(abs_error) if sample_weight is None else tf.reshape(tf.cast(sample_weight, tf.float64), [-1])
+        updates = {
+            "count": weights,
+            "sum_abs_error": weights * abs_error,
+            "sum_squared_error": weights * tf.math.square(abs_error),
+            "hits": weights * tf.cast(abs_error < np.pi / 6, tf.float64),
+            "sum_true": weights * y_true_angle,
+            "sum_squared_true": weights * tf.math.square(y_true_angle),
+        }
+        for statistic, values in updates.items():
+            self.statistics[statistic].assign_add(tf.reduce_sum(values))
+
+    def result(self):
+        count = self.statistics["count"]
+        total_sum_of_squares = self.statistics["sum_squared_true"] - tf.math.divide_no_nan(
+            tf.math.square(self.statistics["sum_true"]), count
+        )
+        results = {
+            "mean_absolute_angle_error": tf.math.divide_no_nan(self.statistics["sum_abs_error"], count) / np.pi * 180,
+            "rmse": tf.math.sqrt(tf.math.divide_no_nan(self.statistics["sum_squared_error"], count)) / np.pi * 180,
+            "r2": 1 - tf.math.divide_no_nan(self.statistics["sum_squared_error"], total_sum_of_squares),
+            "acc_pi_6": tf.math.divide_no_nan(self.statistics["hits"], count),
+        }
+        return {name: tf.cast(value, tf.float32) for name, value in results.items()}
+
+    def reset_state(self):
+        for variable in self.statistics.values():
+            variable.assign(tf.zeros_like(variable))
+
+    def get_config(self):
+        return {**super().get_config(), "encoding": self.encoding}
+
+
+class AngleErrorPercentiles(tf.keras.metrics.Metric):
+    """Streaming percentiles (degrees) of the absolute angle error of an angle encoding.
+
+    The errors are counted in a fixed histogram of `n_bins` bins over
+    [0°, 180°], so the memory does not grow with the dataset and histograms
+    of batches and workers merge by summing. A percentile is interpolated
+    linearly inside the bin holding its rank: it is within one bin width
+    (180 / n_bins degrees, 0.05° by default) of the exact percentile.
+    """
+
+    def __init__(self, encoding: str = "sin_cos", percentiles=(50, 90, 99), n_bins: int = 3600, name: str = "angle_error_percentiles", **kwargs):
+        super().__init__(name=name, **kwargs)
+        assert encoding in ANGLE_DECODERS, f"encoding must be one of {list(ANGLE_DECODERS)}"
+        self.encoding = encoding
+        self.percentiles = list(percentiles)
+        self.n_bins = n_bins
+        self.histogram = self.add_weight(name="histogram", shape=(n_bins,), initializer="zeros", dtype=tf.float64)
+
+    def update_state(self, y_true, y_pred, sample_weight=None):
+        decode = ANGLE_DECODERS[self.encoding]
+        y_true_angle = decode(tf.cast(y_true, tf.float32))
+        y_pred_angle = tf_align_pred_angle(y_true_angle, decode(tf.cast(y_pred, tf.float32)))
+
+        abs_error = tf.math.abs(y_true_angle - y_pred_angle)
+        bins = tf.clip_by_value(tf.cast(abs_error / np.pi * self.n_bins, tf.int32), 0, self.n_bins - 1)
+        weights = tf.ones_like(abs_error, tf.float64) if sample_weight is None else tf.reshape(tf.cast(sample_weight, tf.float64), [-1])
+        self.histogram.assign_add(tf.math.unsorted_segment_sum(weights, bins, self.n_bins))
+
+    def result(self):
+        cumulative_counts = tf.math.cumsum(self.histogram)
+        bin_width = 180 / self.n_bins
+        results = {}
+        for percentile in self.percentiles:
+            rank = cumulative_counts[-1] * percentile / 100
+            # First bin whose cumulative count reaches the rank
+            bin_index = tf.minimum(tf.reduce_sum(tf.cast(cumulative_counts < rank, tf.int32)), self.n_bins - 1)
+            count_before = cumulative_counts[bin_index] - self.histogram[bin_index]
+            fraction = tf.math.divide_no_nan(rank - count_before, self.histogram[bin_index])
+            value = (tf.cast(bin_index, tf.float64) + fraction) * bin_width
+            results[f"p{percentile:g}_absolute_angle_error"] = tf.cast(value, tf.float32)
+        return results
+
+    def reset_state(self):
+        self.histogram.assign(tf.zeros_like(self.histogram))
+
+    def get_config(self):
+        return {**super().get_config(), "encoding": self.encoding, "percentiles": self.percentiles, "n_bins": self.n_bins}
+
+
+@lru_cache(maxsize=None)
+def get_transforms():
+    import albumentations as A
+
+    return A.Compose(
+        [
+            A.Rotate(limit=10, p=0.5),
+            A.OpticalDistortion(distort_limit=(0, 0.2), p=0.7),
+            A.RandomCrop(height=180, width=180, p=0.5),
+            A.RandomBrightnessContrast(brightness_limit=0.15, contrast_limit=0.15, p=0.5),
+            A.Resize(*(224, 224), always_apply=True),
+        ]
+    )
 
 
-def prepare_input(file_path, y_true, image_size):
-    img = tf.io.read_file(file_path)
+def __getattr__(name):
+    # `transforms` used to be built at import time
+    if name == "transforms":
+        return get_transforms()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def prepare_input(file_path, y_true, image_size, image_source=None):
+    """Decoded and resized image of `file_path`, read from `image_source`
+    (a zip_image_source.ZipImageSource) when given"""
+    if image_source is not None:
+        img = image_source.read_file(file_path)
+    else:
+        img = tf.io.read_file(file_path)
 
     img = tf.image.decode_jpeg(img, channels=3)
     img = tf.image.resize(img, image_size)
@@ -316,33 +359,31 @@ class CustomHorizontalFlip:
         self.pose_flip_fn = pose_flip_fn
 
     def __call__(self, img, pose, p):
+        from albumentations.augmentations import functional as F
+
         if random.random() < p:
             if img.ndim == 3 and img.shape[2] > 1 and img.dtype == np.uint8:
                 # Opencv is faster than numpy only in case of
                 # non-gray scale 8bits images
                 return F.hflip_cv2(img)
             flipped_image = F.hflip(img)
-            flipped_pose = self.pose_flip_fn(pose)
+            flipped_pose = np.asarray(self.pose_flip_fn(pose), dtype=pose.dtype)
             return flipped_image, flipped_pose
         return img, pose
 
 
-def horizontal_flip_pose_sin_cos_output(pose):
-    return [-pose[0], pose[1]]
-
-
-def horizontal_flip_pose_double_sigmoid(pose):
-    return [pose[0], 1 - pose[1]]
-
-
 def preprocess_image(img, y_true):
+    from tensorflow.keras.applications.efficientnet_v2 import (
+        preprocess_input as preprocess_input_effnet,
+    )
+
     img = preprocess_input_effnet(img)
     return img, y_true
 
 
 def apply_transform(image):
     data = {"image": image}
-    aug_data = transforms(**data)
+    aug_data = get_transforms()(**data)
     aug_img = aug_data["image"]
     return image, aug_img
 
@@ -351,7 +392,7 @@ def augment_image(img, y_true, custom_horizontal_flip: Callable):
     aug_img, aug_y = tf.numpy_function(
         func=custom_horizontal_flip,
         inp=[img, y_true, 0.5],
-        Tout=[tf.float32, tf.double],
+        Tout=[tf.float32, y_true.dtype],
     )
     aug_img = tf.cast(aug_img, tf.uint8)
     img, aug_img = tf.numpy_function(
@@ -362,6 +403,8 @@ def augment_image(img, y_true, custom_horizontal_flip: Callable):
 
 
 def angle_double_output_loss(y_true, y_pred):
-    angle_loss = tf.keras.metrics.binary_crossentropy(y_true[:, 0], y_pred[:, 0])
-    angle2_loss = tf.keras.metrics.binary_crossentropy(y_true[:, 1], y_pred[:, 1])
+    # Per sample, reduced by Keras, so that an empty batch (a worker without
+    # validation rows left) adds nothing instead of a NaN mean
+    angle_loss = tf.keras.metrics.binary_crossentropy(y_true[:, :1], y_pred[:, :1])
+    angle2_loss = tf.keras.metrics.binary_crossentropy(y_true[:, 1:], y_pred[:, 1:])
     return angle_loss + angle2_loss
@@ -1,44 +1,59 @@
 import math
+import multiprocessing
 import os
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from typing import Iterable, Optional, Tuple, Union
+
 import numpy as np
-from PIL import Image, ImageDraw
+from PIL import Image, ImageDraw, ImageFont
 
+SCHEME_PATH = os.path.realpath(os.path.join(os.path.dirname(__file__), '../../static_files', "vehicle_scheme.jpg"))
 
-def plot_scheme(angle_pred, angle_true=None):
-    image_path = os.path.realpath(os.path.join(os.path.dirname(__file__), '../../static_files', "vehicle_scheme.jpg"))
-    with Image.open(image_path) as img:
-        w, h = img.size
 
-        img1 = ImageDraw.Draw(img)
+@lru_cache(maxsize=None)
+def load_scheme_template() -> Image.Image:
+    """Vehicle scheme read from disk once per process, callers draw on a copy"""
+    with Image.open(SCHEME_PATH) as img:
+        img.load()
+        return img.copy()
+
 
-        angle_pred *= -1
-        coords_pred = [
+def plot_scheme(angle_pred, angle_true=None):
+    img = load_scheme_template().copy()
+    w, h = img.size
+
+    img1 = ImageDraw.Draw(img)
+
+    angle_pred *= -1
+    coords_pred = [
+        w // 2,
+        h // 2,
+        w // 2 + math.cos(angle_pred / 180 * math.pi) * max(w, h),
+        h // 2 + math.sin(angle_pred / 180 * math.pi) * max(w, h),
+    ]
+    img1.line(coords_pred, fill="red", width=2)
+
+    if angle_true is not None:
+        angle_true *= -1
+        coords_true = [
             w // 2,
             h // 2,
-            w // 2 + math.cos(angle_pred / 180 * math.pi) * max(w, h),
-            h // 2 + math.sin(angle_pred / 180 * math.pi) * max(w, h),
+            w // 2 + math.cos(angle_true / 180 * math.pi) * max(w, h),
+            h // 2 + math.sin(angle_true / 180 * math.pi) * max(w, h),
         ]
-        img1.line(coords_pred, fill="red", width=2)
-
-        if angle_true is not None:
-            angle_true *= -1
-            coords_true = [
-                w // 2,
-                h // 2,
-                w // 2 + math.cos(angle_true / 180 * math.pi) * max(w, h),
-                h // 2 + math.sin(angle_true / 180 * math.pi) * max(w, h),
-            ]
 
-            img1.line(coords_true, fill=(0, 200, 0), width=2)
+        img1.line(coords_true, fill=(0, 200, 0), width=2)
 
-        return img
+    return img
 
 
 # plot_scheme(-170, -0).show()
 
 
-def plot_image_from_tensor(image_tensor, y_pred_angle, y_true_angle=None, resize_to=(480, 480)):
+def compose_prediction_image(image_tensor, y_pred_angle, y_true_angle=None, resize_to=(480, 480)) -> Image.Image:
+    """Image thumbnail with the vehicle scheme and the predicted/GT arrows in the top right corner"""
     if not isinstance(image_tensor, np.ndarray):
         image_tensor = image_tensor.numpy()
     data = image_tensor.astype(int)
@@ -58,11 +73,23 @@ def plot_image_from_tensor(image_tensor, y_pred_angle, y_true_angle=None, resize
         (orig_image.size[0] - scheme.size[0], 0, orig_image.size[0], scheme.size[1]),
     )
 
-    plt.imshow(orig_image)
+    return orig_image
+
+
+def prediction_title(y_pred_angle, y_true_angle=None) -> str:
     title = f"Predicted: {round(y_pred_angle, 2)}"
     if y_true_angle is not None:
         title += f", GT: {round(y_true_angle, 2)}"
-    plt.title(title)
+    return title
+
+
+def plot_image_from_tensor(image_tensor, y_pred_angle, y_true_angle=None, resize_to=(480, 480)):
+    import matplotlib.pyplot as plt
+
+    orig_image = compose_prediction_image(image_tensor, y_pred_angle, y_true_angle, resize_to)
+
+    plt.imshow(orig_image)
+    plt.title(prediction_title(y_pred_angle, y_true_angle))
     plt.axis("off")
 
 
@@ -71,3 +98,64 @@ def plot_image_from_path(image_path, y_pred, y_true=None):
     data = np.array(data)
 
     return plot_image_from_tensor(data, y_pred, y_true)
+
+
+@lru_cache(maxsize=None)
+def _title_font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 only ships the fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def render_prediction(image, y_pred_angle, y_true_angle=None, resize_to=(480, 480), title_height=28) -> Image.Image:
+    """PIL-only equivalent of plot_image_from_tensor: the composed image under a title band"""
+    if isinstance(image, str):
+        with Image.open(image) as img:
+            image = np.array(img.convert("RGB"))
+    composed = compose_prediction_image(image, y_pred_angle, y_true_angle, resize_to)
+
+    canvas = Image.new("RGB", (composed.size[0], composed.size[1] + title_height), "white")
+    canvas.paste(composed, (0, title_height))
+
+    draw = ImageDraw.Draw(canvas)
+    font = _title_font(title_height // 2)
+    title = prediction_title(y_pred_angle, y_true_angle)
+    left, top, right, bottom = draw.textbbox((0, 0), title, font=font)
+    draw.text(
+        ((canvas.size[0] - (right - left)) // 2, (title_height - (bottom - top)) // 2 - top),
+        title,
+        fill="black",
+        font=font,
+    )
+
+    return canvas
+
+
+def render_prediction_to_file(item: Tuple[Union[str, np.ndarray], float, Optional[float], str]) -> str:
+    image, y_pred_angle, y_true_angle, save_path = item
+    render_prediction(image, y_pred_angle, y_true_angle).save(save_path)
+    return save_path
+
+
+def render_predictions(items: Iterable[Tuple[Union[str, np.ndarray], float, Optional[float], str]], num_workers: int = None, chunksize: int = 8):
+    """Render (image or image path, predicted angle, GT angle or None, save path) items with a process pool"""
+    num_workers = num_workers or os.cpu_count() or 1
+    items = iter(items)
+    if num_workers == 1:
+        for item in items:
+            render_prediction_to_file(item)
+        return
+
+    # Spawned like sharded_inference and sweep: callers usually have TensorFlow
+    # loaded, and forking its thread pools is unsafe
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        # Executor.map submits everything at once, so feed it bounded windows
+        # to keep the images waiting for a worker out of memory
+        while True:
+            window = list(islice(items, num_workers * chunksize * 4))
+            if not window:
+                break
+            for _ in executor.map(render_prediction_to_file, window, chunksize=chunksize):
+                pass
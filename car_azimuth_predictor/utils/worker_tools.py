@@ -0,0 +1,17 @@
+import os
+
+
+def limit_worker_threads(intra_op_threads: int, inter_op_threads: int):
+    """Limit the CPU threads of TensorFlow (and OpenMP) in a worker process.
+
+    Must be called before TensorFlow creates its thread pools, i.e. before
+    the first TensorFlow operation of the process. This module does not
+    import TensorFlow, so the environment is set before it loads.
+    """
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    os.environ["OMP_NUM_THREADS"] = str(intra_op_threads)
+
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
@@ -1,12 +1,105 @@
-from typing import List
-from zipfile import ZipFile
+import multiprocessing
+import os
+import shutil
+import zlib
+from typing import List, Tuple
+from zipfile import ZipFile, ZipInfo
 
+# Archive opened once in every worker process by _init_worker
+_worker_zip = None
+_worker_target_path = None
 
-def unzip(file_path: str, target_path: str, members: List[str]):
+
+def _crc32(file_path: str, chunk_size: int = 1 << 20) -> int:
+    crc = 0
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _member_path(target_path: str, name: str) -> str:
+    # Same sanitizing as ZipFile.extract: no absolute paths, no ".." parts
+    parts = [part for part in name.split("/") if part not in ("", ".", "..")]
+    return os.path.join(target_path, *parts)
+
+
+def is_extracted(info: ZipInfo, target_path: str) -> bool:
+    """Whether `info` is already on disk under `target_path`, with the same size and CRC"""
+    path = _member_path(target_path, info.filename)
+    if info.is_dir():
+        return os.path.isdir(path)
+    # The size is checked first, so a partly written file is never hashed
+    return os.path.isfile(path) and os.path.getsize(path) == info.file_size and _crc32(path) == info.CRC
+
+
+def _init_worker(file_path: str, target_path: str):
+    global _worker_zip, _worker_target_path
+    _worker_zip = ZipFile(file_path)
+    _worker_target_path = target_path
+
+
+def _extract_member(info: ZipInfo, target_path: str):
+    # The directories already exist (made by unzip before starting the
+    # workers); files are written under a temporary name and renamed once
+    # complete, so an interrupted extraction never leaves a partial file
+    path = _member_path(target_path, info.filename)
+    if info.is_dir():
+        return
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        with _worker_zip.open(info) as source, open(tmp_path, "wb") as target:
+            shutil.copyfileobj(source, target, 1 << 20)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _extract_chunk(names: List[str]) -> Tuple[int, int]:
+    extracted = 0
+    for name in names:
+        info = _worker_zip.getinfo(name)
+        if not is_extracted(info, _worker_target_path):
+            _extract_member(info, _worker_target_path)
+            extracted += 1
+    return extracted, len(names) - extracted
+
+
+def unzip(file_path: str, target_path: str, members: List[str], num_workers: int = None, chunk_size: int = 64) -> dict:
+    """Extract the entries of the zip starting with one of `members` into `target_path`.
+
+    Entries already on disk with the same size and CRC are skipped, so an
+    interrupted extraction resumes where it stopped. The entries are spread
+    over `num_workers` processes (default: CPU count), each with its own
+    handle on the archive. Returns the number of extracted and skipped entries.
+    """
     # https://stackoverflow.com/a/1760715
     # it seems like the python standard library zipfile performs well
     # https://stackoverflow.com/a/72903814/5733813
+    prefixes = tuple(members)
     with ZipFile(file_path) as z:
-        for file in z.namelist():
-            if any([x for x in members if file.startswith(x)]):
-                z.extract(file, target_path)
+        names = [name for name in z.namelist() if name.startswith(prefixes)]
+
+    # Made here rather than by the workers, which would race on shared parents
+    directories = {
+        _member_path(target_path, name) if name.endswith("/") else os.path.dirname(_member_path(target_path, name))
+        for name in names
+    }
+    for directory in sorted(directories):
+        os.makedirs(directory, exist_ok=True)
+
+    chunks = [names[pos:pos + chunk_size] for pos in range(0, len(names), chunk_size)]
+    num_workers = min(num_workers or os.cpu_count() or 1, max(1, len(chunks)))
+    if num_workers > 1:
+        with multiprocessing.Pool(processes=num_workers, initializer=_init_worker, initargs=(file_path, target_path)) as pool:
+            counts = list(pool.imap_unordered(_extract_chunk, chunks))
+    else:
+        _init_worker(file_path, target_path)
+        try:
+            counts = [_extract_chunk(chunk) for chunk in chunks]
+        finally:
+            _worker_zip.close()
+
+    return {"extracted": sum(count[0] for count in counts), "skipped": sum(count[1] for count in counts)}
@@ -0,0 +1,143 @@
+import os
+from typing import Iterable, Iterator, Tuple
+
+import numpy as np
+
+
+def iter_video_frames(video_path: str) -> Iterator[np.ndarray]:
+    """Decode RGB frames one at a time from a video file or a directory of frames"""
+    if os.path.isdir(video_path):
+        from PIL import Image
+
+        for frame_file in sorted(os.listdir(video_path)):
+            with Image.open(os.path.join(video_path, frame_file)) as img:
+                yield np.array(img.convert("RGB"))
+        return
+
+    import cv2
+
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video {video_path}")
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    finally:
+        capture.release()
+
+
+def wrap_angle(angle_radians):
+    """Wrap to [-π, π)"""
+    return (angle_radians + np.pi) % (2 * np.pi) - np.pi
+
+
+def circular_interpolate(start_angle: float, end_angle: float, t) -> np.ndarray:
+    """Interpolate along the shortest arc, so -170° -> 170° passes through 180°"""
+    return wrap_angle(start_angle + np.asarray(t) * wrap_angle(end_angle - start_angle))
+
+
+class CircularExponentialSmoother:
+    """Exponential moving average of the unit vector of the angle.
+
+    Averaging sin/cos instead of the angle itself avoids the jump at ±π.
+    `alpha=1` disables the smoothing.
+    """
+
+    def __init__(self, alpha: float):
+        assert 0 < alpha <= 1, "alpha must be in (0, 1]"
+        self.alpha = alpha
+        self.state = None
+
+    def __call__(self, angle_radians: float) -> float:
+        vector = np.array([np.sin(angle_radians), np.cos(angle_radians)])
+        if self.state is None:
+            self.state = vector
+        else:
+            self.state = self.alpha * vector + (1 - self.alpha) * self.state
+        return float(np.arctan2(self.state[0], self.state[1]))
+
+
+def select_keyframes(
+    frames: Iterable[np.ndarray], keyframe_interval: int, change_threshold: float = None
+) -> Iterator[Tuple[int, np.ndarray, bool]]:
+    """Mark every `keyframe_interval`-th frame, and frames that changed more than
+    `change_threshold` (mean absolute difference of a grayscale thumbnail, in
+    [0, 1]) since the last keyframe, as keyframes"""
+    last_key_thumbnail = None
+    since_last_key = 0
+    for index, frame in enumerate(frames):
+        thumbnail = frame[::8, ::8].mean(axis=2) / 255
+        is_keyframe = (
+            last_key_thumbnail is None
+            or since_last_key >= keyframe_interval
+            or (
+                change_threshold is not None
+                and thumbnail.shape == last_key_thumbnail.shape
+                and np.mean(np.abs(thumbnail - last_key_thumbnail)) > change_threshold
+            )
+        )
+        if is_keyframe:
+            last_key_thumbnail = thumbnail
+            since_last_key = 0
+        since_last_key += 1
+        yield index, frame, is_keyframe
+
+
+def predict_video_azimuths(
+    predict_fn,
+    azimuth_converter,
+    frames: Iterable[np.ndarray],
+    keyframe_interval: int = 5,
+    change_threshold: float = None,
+    batch_size: int = 16,
+    smoothing: float = 0.5,
+    image_size=(224, 224),
+) -> Iterator[Tuple[int, float, bool]]:
+    """Yield (frame index, azimuth in radians, is keyframe) for every frame, in order.
+
+    The model only runs on keyframes, in batches. Frames in between get the
+    circular interpolation of the surrounding keyframes, frames after the last
+    keyframe hold its value. Every azimuth then goes through a
+    CircularExponentialSmoother with `alpha=smoothing` (1 disables it).
+    """
+    import tensorflow as tf
+
+    smoother = CircularExponentialSmoother(smoothing)
+    pending = []  # (index, is_keyframe) since the last flush, in order
+    key_images = []
+    gap = []  # non-keyframes waiting for the next keyframe
+    last_key = None  # (index, azimuth)
+
+    def flush():
+        nonlocal pending, key_images, gap, last_key
+        if key_images:
+            outputs = np.asarray(predict_fn(np.stack(key_images)))
+            key_azimuths = iter(azimuth_converter(outputs).tolist())
+        for index, is_keyframe in pending:
+            if not is_keyframe:
+                gap.append(index)
+                continue
+            azimuth = next(key_azimuths)
+            if gap:
+                t = (np.array(gap) - last_key[0]) / (index - last_key[0])
+                for gap_index, gap_azimuth in zip(gap, circular_interpolate(last_key[1], azimuth, t)):
+                    yield gap_index, smoother(gap_azimuth), False
+                gap = []
+            yield index, smoother(azimuth), True
+            last_key = (index, azimuth)
+        pending, key_images = [], []
+
+    for index, frame, is_keyframe in select_keyframes(frames, keyframe_interval, change_threshold):
+        pending.append((index, is_keyframe))
+        if is_keyframe:
+            image = tf.image.resize(tf.convert_to_tensor(frame, dtype=tf.float32), image_size)
+            key_images.append(image.numpy())
+            if len(key_images) == batch_size:
+                yield from flush()
+
+    yield from flush()
+    for gap_index in gap:
+        yield gap_index, smoother(last_key[1]), False
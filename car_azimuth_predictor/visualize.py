@@ -1,38 +1,38 @@
-import matplotlib
-import matplotlib.pyplot as plt
 import numpy as np
 import os
-from car_azimuth_predictor.utils.training_tools import np_get_angle_from_double_sigmoids
-from car_azimuth_predictor.utils.visualization_tools import plot_image_from_tensor
+from PIL import Image
 
+from car_azimuth_predictor.prediction_store import store_angles
+from car_azimuth_predictor.utils.angle_codecs import np_get_angle_from_double_sigmoids
+from car_azimuth_predictor.utils.visualization_tools import (
+    plot_image_from_tensor,
+    render_predictions,
+)
 
-def visualize_single_predictions(model, test_dataset, save_path=None):
-    matplotlib.use('Agg')
-    img_counter = 0
-    for i, (x_batch, y_true_batch) in enumerate(test_dataset):
-        y_pred_batch = model.predict(x_batch)
-        for j, x, y_true, y_pred in zip(
-            range(len(x_batch)), x_batch, y_true_batch, y_pred_batch
-        ):
-            y_true_degrees = (
-                np_get_angle_from_double_sigmoids(np.expand_dims(y_true, axis=0))
-                / np.pi
-                * 180
-            )
-            y_pred_degrees = (
-                np_get_angle_from_double_sigmoids(np.expand_dims(y_pred, axis=0))
-                / np.pi
-                * 180
-            )
 
-            plot_image_from_tensor(x, float(y_pred_degrees[0]), y_true_degrees[0])
+def visualize_single_predictions(store, save_path=None, num_workers=None, image_source=None, decoding=None):
+    """Render every prediction of a prediction_store, read from the image paths
+    (or from `image_source`, e.g. a zip_image_source.ZipImageSource)"""
+    y_true_angle, y_pred_angle = store_angles(store, decoding)
+    y_true_degrees = y_true_angle / np.pi * 180
+    y_pred_degrees = y_pred_angle / np.pi * 180
+    os.makedirs(save_path, exist_ok=True)
+
+    def items():
+        for img_counter, (image_id, y_pred, y_true) in enumerate(zip(store["image_ids"], y_pred_degrees, y_true_degrees)):
+            image = str(image_id)
+            if image_source is not None:
+                with Image.open(image_source.open(image)) as img:
+                    image = np.array(img.convert("RGB"))
             filepath = os.path.join(save_path, f"prediction_{img_counter:03d}.png")
-            plt.tight_layout()
-            plt.savefig(filepath)
-            img_counter += 1
+            yield image, float(y_pred), float(y_true), filepath
+
+    render_predictions(items(), num_workers=num_workers)
 
 
 def visualize_grid_predictions(model, test_dataset, save_path=None):
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(24, 24))
     y_true_all = []
     y_pred_all = []
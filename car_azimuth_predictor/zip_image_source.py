@@ -0,0 +1,148 @@
+import io
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Dict, List, Tuple
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+import numpy as np
+
+# Fixed part of a local file header, followed by the file name and the extra field
+LOCAL_HEADER_SIZE = 30
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+
+class ZipImageSource:
+    """Serves the images of a zip archive without extracting them.
+
+    The archive is indexed once: the data offset, size, compression and CRC
+    of every member. Reads slice a read-only memory map of the archive;
+    stored members are copied as is, deflated ones are inflated. Every thread
+    (e.g. the parallel calls of a tf.data map) maps the archive with its own
+    file handle, and a pickled source reopens it in the new process. close()
+    (or leaving a `with` block) unmaps the handles of all the threads; a
+    later read maps the archive again.
+
+    With `extracted_root`, image paths are given as if the archive had been
+    extracted there (the paths of the annotation table); otherwise they are
+    the member names.
+    """
+
+    def __init__(self, zip_path: str, extracted_root: str = None):
+        self.zip_path = str(zip_path)
+        self.extracted_root = None if extracted_root is None else str(extracted_root)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._archives = []
+        self.index = self._build_index()
+
+    def _build_index(self) -> Dict[str, Tuple[int, int, int, int]]:
+        archive = self._mmap()
+        index = {}
+        with ZipFile(self.zip_path) as z:
+            for info in z.infolist():
+                if info.is_dir():
+                    continue
+                # The central directory does not give the length of the local extra field
+                offset = info.header_offset
+                if archive[offset:offset + 4] != LOCAL_HEADER_SIGNATURE:
+                    raise ValueError(f"Bad local header for {info.filename} in {self.zip_path}")
+                name_length, extra_length = struct.unpack_from("<HH", archive, offset + 26)
+                data_offset = offset + LOCAL_HEADER_SIZE + name_length + extra_length
+                index[info.filename] = (data_offset, info.compress_size, info.compress_type, info.CRC)
+        return index
+
+    def _mmap(self) -> mmap.mmap:
+        archive = getattr(self._local, "archive", None)
+        if archive is None:
+            with open(self.zip_path, "rb") as f:
+                archive = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._local.archive = archive
+            with self._lock:
+                self._archives.append(archive)
+        return archive
+
+    def close(self):
+        with self._lock:
+            archives, self._archives = self._archives, []
+            self._local = threading.local()
+        for archive in archives:
+            archive.close()
+
+    def __enter__(self) -> "ZipImageSource":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        # Sources of datasets and worker processes are not closed explicitly
+        if hasattr(self, "_archives"):
+            self.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ["_local", "_lock", "_archives"]:
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._archives = []
+
+    def member_name(self, image_path: str) -> str:
+        if self.extracted_root is None:
+            return image_path
+        return os.path.relpath(image_path, self.extracted_root).replace(os.sep, "/")
+
+    def list_images(self, prefix: str = "") -> List[str]:
+        """Image paths of the members directly under the `prefix` directory, sorted"""
+        prefix = prefix.rstrip("/") + "/" if prefix else ""
+        return sorted(
+            name for name in self.index if name.startswith(prefix) and "/" not in name[len(prefix):]
+        )
+
+    def signature(self, image_path: str) -> str:
+        """Size and CRC of the member, which change with its content"""
+        _, size, _, crc = self.index[self.member_name(image_path)]
+        return f"{size}:{crc}"
+
+    def read(self, image_path: str) -> bytes:
+        offset, size, compress_type, _ = self.index[self.member_name(image_path)]
+        data = self._mmap()[offset:offset + size]
+        if compress_type == ZIP_STORED:
+            return data
+        if compress_type == ZIP_DEFLATED:
+            return zlib.decompress(data, -zlib.MAX_WBITS)
+        raise ValueError(f"Unsupported compression {compress_type} for {image_path} in {self.zip_path}")
+
+    def open(self, image_path: str) -> io.BytesIO:
+        return io.BytesIO(self.read(image_path))
+
+    def read_file(self, image_path):
+        """Graph op with the contents of `image_path`, in place of tf.io.read_file"""
+        import tensorflow as tf
+
+        def read(path: np.ndarray) -> bytes:
+            return self.read(path.decode())
+
+        # Reads a file: stateful, so TensorFlow never folds or dedups the op
+        contents = tf.numpy_function(read, [image_path], tf.string, stateful=True)
+        contents.set_shape(())
+        return contents
+
+
+def image_source_from_config(config) -> "ZipImageSource":
+    """Source of `dataset_generation.images_zip_path`, if set, for the paths of the annotation table"""
+    zip_path = config.dataset_generation.get("images_zip_path")
+    if zip_path is None:
+        return None
+    root_path = os.getcwd()
+    return ZipImageSource(
+        os.path.join(root_path, zip_path),
+        extracted_root=os.path.join(root_path, config.data_gathering.local_dataset_path),
+    )
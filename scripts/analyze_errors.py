@@ -0,0 +1,44 @@
+import argparse
+import os
+import time
+
+from car_azimuth_predictor.error_analysis import analyze_errors
+from car_azimuth_predictor.prediction_store import DECODERS, load_prediction_store
+
+
+def main(store_path: str, annotations_path: str, output_path: str = None, azimuth_bin_degrees=15, elevation_bin_degrees=10, n_distance_bins=10, decoding=None):
+    store = load_prediction_store(store_path)
+
+    start_time = time.perf_counter()
+    report = analyze_errors(store, annotations_path, azimuth_bin_degrees, elevation_bin_degrees, n_distance_bins, decoding)
+    print(f"Analyzed {store['n_rows']} predictions in {time.perf_counter() - start_time:.3f}s")
+
+    for name, table in report.items():
+        print(f"\n{name}\n{table.round(2).to_string()}")
+        if output_path is not None:
+            os.makedirs(output_path, exist_ok=True)
+            table.to_csv(os.path.join(output_path, f"{name}.csv"), index=name == "quadrant_confusion")
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Angle errors of a prediction store per azimuth, elevation and distance bin and per split')
+    parser.add_argument('--store_path', type=str, help='Directory of the prediction store', default='data/predictions/val')
+    parser.add_argument('--annotations_path', type=str, help='Annotation table', default='data/raw/PASCAL3D+_release1.1/annotations_angles.arrow')
+    parser.add_argument('--output_path', type=str, help='Directory of the CSV reports', default=None)
+    parser.add_argument('--azimuth_bin_degrees', type=float, default=15)
+    parser.add_argument('--elevation_bin_degrees', type=float, default=10)
+    parser.add_argument('--n_distance_bins', type=int, help='Number of equal-count distance bins', default=10)
+    parser.add_argument('--decoding', type=str, choices=list(DECODERS), help='Decoding of the outputs (default: the one of the approach)', default=None)
+    args = parser.parse_args()
+
+    main(
+        args.store_path,
+        args.annotations_path,
+        args.output_path,
+        args.azimuth_bin_degrees,
+        args.elevation_bin_degrees,
+        args.n_distance_bins,
+        args.decoding,
+    )
@@ -0,0 +1,54 @@
+import argparse
+import json
+
+import numpy as np
+
+from car_azimuth_predictor.benchmarks import ns_per_sample
+from car_azimuth_predictor.utils.angle_codecs import CODECS
+
+
+def main(sizes=(1_000, 10_000, 100_000, 1_000_000, 10_000_000), tensorflow=False, output_path=None):
+    rng = np.random.default_rng(0)
+    results = []
+    for n_samples in sizes:
+        angles = rng.uniform(-np.pi, np.pi, size=n_samples).astype(np.float32)
+        out_pairs, out_angles = np.empty((n_samples, 2), np.float32), np.empty(n_samples, np.float32)
+        for encoding, codec in CODECS.items():
+            encoded = codec.np_encode(angles)
+            calls = {
+                "np_encode": lambda: codec.np_encode(angles),
+                "np_encode_out": lambda: codec.np_encode(angles, out=out_pairs),
+                "np_decode": lambda: codec.np_decode(encoded),
+                "np_decode_out": lambda: codec.np_decode(encoded, out=out_angles),
+                "np_flip": lambda: codec.np_flip(encoded),
+                "np_flip_out": lambda: codec.np_flip(encoded, out=out_pairs),
+            }
+            if tensorflow:
+                import tensorflow as tf
+
+                tf_angles, tf_encoded = tf.constant(angles), tf.constant(encoded)
+                for name, fn, argument in [("tf_encode", codec.tf_encode, tf_angles), ("tf_decode", codec.tf_decode, tf_encoded), ("tf_flip", codec.tf_flip, tf_encoded)]:
+                    graph_fn = tf.function(fn)
+                    # .numpy() waits for the result
+                    calls[name] = lambda graph_fn=graph_fn, argument=argument: graph_fn(argument).numpy()
+
+            for name, call in calls.items():
+                result = {"encoding": encoding, "function": name, "n_samples": n_samples, "ns_per_sample": ns_per_sample(call, n_samples)}
+                results.append(result)
+                print(f"{encoding:<15} {name:<14} {n_samples:>9}: {result['ns_per_sample']:8.2f} ns/sample")
+
+    if output_path is not None:
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Nanoseconds per sample of the angle encoders, decoders and flips')
+    parser.add_argument('--sizes', type=int, nargs='+', help='Numbers of samples', default=[1_000, 10_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--tensorflow', action='store_true', help='Also time the TF codecs (in tf.function)')
+    parser.add_argument('--output_path', type=str, help='Path to the JSON results', default=None)
+    args = parser.parse_args()
+
+    main(args.sizes, args.tensorflow, args.output_path)
@@ -0,0 +1,80 @@
+import argparse
+import json
+import os
+from functools import partial
+from pathlib import Path
+
+import tensorflow as tf
+
+from car_azimuth_predictor.annotation_store import read_annotations
+from car_azimuth_predictor.batch_augmentation import augment_batch_compiled, batch_augmentation_seeds
+from car_azimuth_predictor.benchmarks import time_epochs
+from car_azimuth_predictor.config import load_config
+from car_azimuth_predictor.train_model import get_approach_targets
+from car_azimuth_predictor.utils.training_tools import CustomHorizontalFlip, augment_image, prepare_input
+
+
+def main(approach: str, current_config=None, batch_size=32, n_epochs=3, n_repeats=1, output_path=None):
+    gt_cols, pose_flip_fn = get_approach_targets(approach)
+    df_train = read_annotations(Path(os.getcwd()) / current_config.dataset_generation.df_path, ["image_path", *gt_cols], split="train")
+    image_size = (current_config.dataset_generation.image_height, current_config.dataset_generation.image_width)
+
+    # Decoded once and kept in memory, so only the augmentation is timed
+    decoded = (
+        tf.data.Dataset.from_tensor_slices((df_train["image_path"], df_train[gt_cols]))
+        .map(partial(prepare_input, image_size=image_size), num_parallel_calls=tf.data.AUTOTUNE)
+        .cache()
+    )
+    for _ in decoded:
+        pass
+    decoded = decoded.repeat(n_repeats)
+
+    per_image = (
+        decoded.map(
+            partial(augment_image, custom_horizontal_flip=CustomHorizontalFlip(pose_flip_fn)),
+            num_parallel_calls=tf.data.AUTOTUNE,
+        )
+        .batch(batch_size, drop_remainder=True)
+        .prefetch(tf.data.AUTOTUNE)
+    )
+    batched = (
+        tf.data.Dataset.zip((decoded.batch(batch_size, drop_remainder=True), batch_augmentation_seeds(0)))
+        .map(
+            lambda batch, seed: augment_batch_compiled(*batch, seed=seed, pose_flip_fn=pose_flip_fn),
+            num_parallel_calls=tf.data.AUTOTUNE,
+        )
+        .prefetch(tf.data.AUTOTUNE)
+    )
+
+    results = {}
+    for name, dataset in [("albumentations", per_image), ("batch", batched)]:
+        n_images, timings = time_epochs(dataset, n_epochs)
+        results[name] = {
+            "images_per_epoch": n_images,
+            "epoch_seconds": timings,
+            "images_per_second": n_images / min(timings),
+        }
+        print(f"{name:<15} {n_images / min(timings):8.0f} images/sec")
+
+    results["speedup"] = results["batch"]["images_per_second"] / results["albumentations"]["images_per_second"]
+    print(f"Speedup: {results['speedup']:.2f}x")
+
+    if output_path is not None:
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare the throughput of the per-image albumentations and of the batch augmentation')
+    parser.add_argument("--approach", type=str, help="Approach to use (1 = Sin & Cos, 2 = Directional discriminators)", choices=["1", "2"], default="2")
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--n_epochs', type=int, help='Epochs timed per path', default=3)
+    parser.add_argument('--n_repeats', type=int, help='Repeat the train split within an epoch', default=1)
+    parser.add_argument('--output_path', type=str, help='Path to the JSON results', default=None)
+    args = parser.parse_args()
+
+    current_config = load_config()
+
+    main(args.approach, current_config, args.batch_size, args.n_epochs, args.n_repeats, args.output_path)
@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT_PATH = os.path.realpath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Modules that must stay importable without TensorFlow
+LIGHT_MODULES = [
+    "car_azimuth_predictor.utils.angle_codecs",
+    "car_azimuth_predictor.feature_generation",
+    "car_azimuth_predictor.utils.visualization_tools",
+    "car_azimuth_predictor.visualize",
+    "car_azimuth_predictor.serving",
+]
+
+HEAVY_MODULES = [
+    "car_azimuth_predictor.utils.training_tools",
+    "car_azimuth_predictor.dataset_generation",
+    "car_azimuth_predictor.model_generation",
+    "car_azimuth_predictor.inference",
+]
+
+SCRIPTS = [
+    "scripts/inference.py",
+    "scripts/serve.py",
+    "scripts/train_model.py",
+    "scripts/validate_model.py",
+]
+
+HEAVY_DEPENDENCIES = ["tensorflow", "tensorflow_probability", "albumentations", "matplotlib.pyplot"]
+
+
+def _environment():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT_PATH, env.get("PYTHONPATH")]))
+    env.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+    return env
+
+
+def time_module_import(module: str, repeats: int) -> dict:
+    """Cold-start import time of a module, each repeat in a fresh interpreter"""
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"loaded = [m for m in {HEAVY_DEPENDENCIES!r} if m in sys.modules]\n"
+        "print(json.dumps({'seconds': elapsed, 'heavy_dependencies': loaded}))\n"
+    )
+    timings, loaded = [], []
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=ROOT_PATH,
+            env=_environment(),
+        )
+        measurement = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(measurement["seconds"])
+        loaded = measurement["heavy_dependencies"]
+
+    return {
+        "entry_point": module,
+        "median_seconds": statistics.median(timings),
+        "min_seconds": min(timings),
+        "heavy_dependencies": loaded,
+    }
+
+
+def time_script_startup(script: str, repeats: int) -> dict:
+    """Wall time of `python <script> --help`, i.e. interpreter start plus imports"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, script, "--help"],
+            capture_output=True,
+            check=True,
+            cwd=ROOT_PATH,
+            env=_environment(),
+        )
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "entry_point": script,
+        "median_seconds": statistics.median(timings),
+        "min_seconds": min(timings),
+    }
+
+
+def main(repeats=3, output_path=None):
+    results = [time_module_import(module, repeats) for module in LIGHT_MODULES + HEAVY_MODULES]
+    results += [time_script_startup(script, repeats) for script in SCRIPTS]
+
+    for result in results:
+        line = f"{result['entry_point']:<50} {result['median_seconds']:7.3f}s"
+        if result.get("heavy_dependencies"):
+            line += f"  loads: {', '.join(result['heavy_dependencies'])}"
+        print(line)
+
+    if output_path is not None:
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure cold-start import time of each entry point')
+    parser.add_argument('--repeats', type=int, help='Fresh interpreters per entry point', default=3)
+    parser.add_argument('--output_path', type=str, help='Path to the JSON results', default=None)
+    args = parser.parse_args()
+    main(args.repeats, args.output_path)
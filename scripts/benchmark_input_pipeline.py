@@ -0,0 +1,95 @@
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+from car_azimuth_predictor.benchmarks import time_epochs
+from car_azimuth_predictor.config import load_config
+from car_azimuth_predictor.dataset_generation import generate_datasets
+from car_azimuth_predictor.image_shard_cache import build_image_shards
+from car_azimuth_predictor.train_model import get_approach_targets
+from car_azimuth_predictor.zip_image_source import image_source_from_config
+
+
+def time_training_epochs(config, approach, train_dataset, validation_dataset, n_epochs):
+    import tensorflow as tf
+
+    from car_azimuth_predictor.model_generation import generate_model, generate_top_model
+    from car_azimuth_predictor.train_model import get_loss_and_metrics
+
+    loss, metrics = get_loss_and_metrics(approach)
+    model = generate_model(config, top_model=generate_top_model(approach, 100, 0.2))
+    model.compile(optimizer=tf.keras.optimizers.Adamax(learning_rate=0.001), loss=loss, metrics=metrics)
+
+    class EpochTimer(tf.keras.callbacks.Callback):
+        def on_epoch_begin(self, epoch, logs=None):
+            self.start_time = time.perf_counter()
+
+        def on_epoch_end(self, epoch, logs=None):
+            timings.append(time.perf_counter() - self.start_time)
+
+    timings = []
+    model.fit(train_dataset, validation_data=validation_dataset, epochs=n_epochs, callbacks=[EpochTimer()], verbose=0)
+    return timings
+
+
+def main(approach: str, image_cache_path: str, current_config=None, batch_size=32, n_epochs=3, augment=False, train=False, output_path=None):
+    gt_cols, pose_flip_fn = get_approach_targets(approach)
+
+    start_time = time.perf_counter()
+    build_image_shards(
+        Path(os.getcwd()) / current_config.dataset_generation.df_path,
+        gt_cols,
+        (current_config.dataset_generation.image_height, current_config.dataset_generation.image_width),
+        image_cache_path,
+        n_shards=current_config.dataset_generation.image_cache_n_shards,
+        shuffle_seed=current_config.dataset_generation.image_cache_shuffle_seed,
+        image_source=image_source_from_config(current_config),
+    )
+    results = {"build_or_validate_seconds": time.perf_counter() - start_time}
+
+    for mode, cache_path in [("jpeg", None), ("shards", image_cache_path)]:
+        train_dataset, validation_dataset = generate_datasets(
+            current_config, gt_cols=gt_cols, pose_flip_fn=pose_flip_fn, batch_size=batch_size, augment=augment, image_cache_path=cache_path
+        )
+        n_images, timings = time_epochs(train_dataset, n_epochs)
+        results[mode] = {
+            "images_per_epoch": n_images,
+            "input_epoch_seconds": timings,
+            # The first epoch includes tf.data warmup
+            "input_images_per_second": n_images / min(timings),
+        }
+        if train:
+            results[mode]["training_epoch_seconds"] = time_training_epochs(
+                current_config, approach, train_dataset, validation_dataset, n_epochs
+            )
+        print(f"{mode:<7} input: {min(timings):.2f}s/epoch ({n_images / min(timings):.0f} images/sec)", end="")
+        if train:
+            print(f", training: {min(results[mode]['training_epoch_seconds']):.2f}s/epoch", end="")
+        print()
+
+    results["input_speedup"] = min(results["jpeg"]["input_epoch_seconds"]) / min(results["shards"]["input_epoch_seconds"])
+    print(f"Input pipeline speedup: {results['input_speedup']:.2f}x")
+
+    if output_path is not None:
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare epoch time of the JPEG and the decoded shards input pipelines')
+    parser.add_argument("--approach", type=str, help="Approach to use (1 = Sin & Cos, 2 = Directional discriminators)", choices=["1", "2"], default="2")
+    parser.add_argument('--image_cache_path', type=str, help='Directory of the decoded shards, built if missing or stale', required=True)
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--n_epochs', type=int, help='Epochs timed per pipeline', default=3)
+    parser.add_argument('--augment', action='store_true', help='Include the augmentations in both pipelines')
+    parser.add_argument('--train', action='store_true', help='Also time full training epochs of the model')
+    parser.add_argument('--output_path', type=str, help='Path to the JSON results', default=None)
+    args = parser.parse_args()
+
+    current_config = load_config()
+
+    main(args.approach, args.image_cache_path, current_config, args.batch_size, args.n_epochs, args.augment, args.train, args.output_path)
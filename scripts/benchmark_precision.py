@@ -0,0 +1,138 @@
+import argparse
+import json
+import sys
+import time
+from pprint import pprint
+
+import numpy as np
+import tensorflow as tf
+
+from car_azimuth_predictor.config import load_config
+from car_azimuth_predictor.dataset_generation import generate_datasets
+from car_azimuth_predictor.inference import get_azimuth_converter, get_custom_objects, load_inference_model
+from car_azimuth_predictor.precision import cast_model_to_precision, resolve_precision
+from car_azimuth_predictor.train_model import get_approach_targets, get_loss_and_metrics
+from car_azimuth_predictor.utils.numpy_metrics import np_angle_metrics
+
+MODES = {
+    "float32": ("float32", False),
+    "float32_xla": ("float32", True),
+    "mixed": ("auto", False),
+    "mixed_xla": ("auto", True),
+}
+
+
+def benchmark_inference(model_path, precision, jit_compile, images, targets, azimuth_converter, batch_size):
+    model = load_inference_model(model_path, precision=precision, jit_compile=jit_compile)
+    # Warmup, includes the XLA compilation
+    model.predict_on_batch(images[:batch_size])
+
+    start_time = time.perf_counter()
+    predictions = np.concatenate(
+        [
+            np.asarray(model.predict_on_batch(images[pos:pos + batch_size]), dtype=np.float32)
+            for pos in range(0, len(images) - len(images) % batch_size or len(images), batch_size)
+        ]
+    )
+    elapsed = time.perf_counter() - start_time
+
+    return {
+        "inference_images_per_sec": len(predictions) / elapsed,
+        **np_angle_metrics(azimuth_converter(targets[:len(predictions)]), azimuth_converter(predictions)),
+    }
+
+
+def benchmark_training(model_path, approach, precision, jit_compile, train_dataset, n_steps):
+    model = tf.keras.models.load_model(model_path, custom_objects=get_custom_objects())
+    model = cast_model_to_precision(model, precision, get_custom_objects())
+    loss, metrics = get_loss_and_metrics(approach)
+    model.compile(optimizer=tf.keras.optimizers.Adamax(learning_rate=0.001), loss=loss, metrics=metrics, jit_compile=jit_compile)
+
+    step_times = []
+
+    class StepTimer(tf.keras.callbacks.Callback):
+        def on_train_batch_end(self, batch, logs=None):
+            step_times.append(time.perf_counter())
+
+    # The first step traces and compiles, it is left out
+    model.fit(train_dataset.repeat(), steps_per_epoch=n_steps + 1, epochs=1, callbacks=[StepTimer()], verbose=0)
+    steps_per_sec = n_steps / (step_times[-1] - step_times[0])
+
+    return {"train_steps_per_sec": steps_per_sec}
+
+
+def main(approach, model_path: str, current_config=None, modes=tuple(MODES), batch_size=32, n_evaluation_samples=512, n_train_steps=20, mae_tolerance=0.5, report_path=None):
+    gt_cols, pose_flip_fn = get_approach_targets(approach)
+    azimuth_converter = get_azimuth_converter(approach)
+
+    train_dataset, validation_dataset = generate_datasets(
+        current_config, gt_cols=gt_cols, pose_flip_fn=pose_flip_fn, batch_size=batch_size, augment=False
+    )
+    images, targets = [], []
+    for x_batch, y_batch in validation_dataset.unbatch().batch(256).take(-(-n_evaluation_samples // 256)):
+        images.append(x_batch.numpy())
+        targets.append(y_batch.numpy())
+    images, targets = np.concatenate(images)[:n_evaluation_samples], np.concatenate(targets)[:n_evaluation_samples]
+    train_dataset = train_dataset.take(n_train_steps + 1).cache()
+
+    report = {"batch_size": batch_size, "n_evaluation_samples": len(images), "modes": {}}
+    for mode in modes:
+        precision, jit_compile = MODES[mode]
+        report["modes"][mode] = {
+            "policy": resolve_precision(precision),
+            "jit_compile": jit_compile,
+            **benchmark_inference(model_path, precision, jit_compile, images, targets, azimuth_converter, batch_size),
+            **benchmark_training(model_path, approach, precision, jit_compile, train_dataset, n_train_steps),
+        }
+        report["modes"][mode]["train_images_per_sec"] = report["modes"][mode]["train_steps_per_sec"] * batch_size
+        print(
+            f"{mode:<12} inference: {report['modes'][mode]['inference_images_per_sec']:7.1f} images/sec, "
+            f"training: {report['modes'][mode]['train_steps_per_sec']:6.2f} steps/sec, "
+            f"MAE: {report['modes'][mode]['mean_absolute_angle_error']:.3f}°"
+        )
+
+    # Accuracy check against the float32 predictions of the same weights
+    baseline_mae = report["modes"]["float32"]["mean_absolute_angle_error"] if "float32" in report["modes"] else None
+    report["mae_tolerance"] = mae_tolerance
+    report["mae_regressions"] = [
+        mode
+        for mode, results in report["modes"].items()
+        if baseline_mae is not None and results["mean_absolute_angle_error"] - baseline_mae > mae_tolerance
+    ]
+
+    if report_path is not None:
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare the speed and accuracy of the float32, mixed precision and XLA modes')
+    parser.add_argument("--approach", type=str, help="Approach to use (1 = Sin & Cos, 2 = Directional discriminators)", choices=["1", "2"], required=True)
+    parser.add_argument("--model_path", type=str, help="Path to the trained Keras model", required=True)
+    parser.add_argument("--modes", type=str, nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--n_evaluation_samples", type=int, help="Validation images used for the inference speed and the MAE", default=512)
+    parser.add_argument("--n_train_steps", type=int, help="Timed training steps per mode", default=20)
+    parser.add_argument("--mae_tolerance", type=float, help="Maximum increase of the MAE (degrees) over float32", default=0.5)
+    parser.add_argument("--report_path", type=str, help="Path to the JSON report", default=None)
+    args = parser.parse_args()
+
+    current_config = load_config()
+
+    report = main(
+        approach=args.approach,
+        model_path=args.model_path,
+        current_config=current_config,
+        modes=args.modes,
+        batch_size=args.batch_size,
+        n_evaluation_samples=args.n_evaluation_samples,
+        n_train_steps=args.n_train_steps,
+        mae_tolerance=args.mae_tolerance,
+        report_path=args.report_path,
+    )
+    pprint(report)
+    if report["mae_regressions"]:
+        print(f"MAE regressed by more than {args.mae_tolerance}° in: {', '.join(report['mae_regressions'])}")
+        sys.exit(1)
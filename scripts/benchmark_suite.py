@@ -0,0 +1,72 @@
+import argparse
+import json
+import tempfile
+
+from car_azimuth_predictor.benchmarks import BENCHMARKS, compare_results, run_benchmarks, save_report
+from car_azimuth_predictor.config import load_config
+
+
+def main(
+    current_config,
+    approach="2",
+    benchmarks=BENCHMARKS,
+    n_images=256,
+    batch_size=32,
+    n_epochs=3,
+    batch_sizes=(1, 8, 32, 128),
+    n_repeats=10,
+    work_path=None,
+    output_path=None,
+    baseline_path=None,
+    tolerance=0.1,
+):
+    with tempfile.TemporaryDirectory() as temporary_path:
+        report = run_benchmarks(
+            current_config,
+            work_path or temporary_path,
+            approach=approach,
+            benchmarks=benchmarks,
+            n_images=n_images,
+            batch_size=batch_size,
+            n_epochs=n_epochs,
+            batch_sizes=batch_sizes,
+            n_repeats=n_repeats,
+        )
+    print(json.dumps(report["results"], indent=2))
+
+    if output_path is not None:
+        save_report(report, output_path)
+
+    if baseline_path is not None:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        comparison = compare_results(report, baseline, tolerance)
+        print(f"Compared with {baseline_path} (commit {baseline['environment'].get('commit')}):")
+        print(comparison.to_string(index=False, float_format=lambda value: f"{value:.4g}"))
+        n_regressions = int(comparison["regression"].sum())
+        print(f"{n_regressions} regression(s) beyond {tolerance:.0%}")
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Throughput and latency of the data pipeline, the model and inference, on a synthetic dataset (no download)')
+    parser.add_argument("--approach", type=str, help="Approach to use (1 = Sin & Cos, 2 = Directional discriminators)", choices=["1", "2"], default="2")
+    parser.add_argument('--benchmarks', type=str, nargs='+', help='Benchmarks to run (default: all)', choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument('--n_images', type=int, help='Size of the synthetic dataset', default=256)
+    parser.add_argument('--batch_size', type=int, help='Batch size of the pipelines and of inference', default=32)
+    parser.add_argument('--n_epochs', type=int, help='Epochs timed per pipeline', default=3)
+    parser.add_argument('--batch_sizes', type=int, nargs='+', help='Batch sizes of the forward latency', default=[1, 8, 32, 128])
+    parser.add_argument('--n_repeats', type=int, help='Timed forward passes per batch size', default=10)
+    parser.add_argument('--work_path', type=str, help='Directory of the synthetic dataset and model (default: a temporary one)', default=None)
+    parser.add_argument('--output_path', type=str, help='Path to the JSON results', default=None)
+    parser.add_argument('--baseline_path', type=str, help='JSON results of an earlier run to compare with', default=None)
+    parser.add_argument('--tolerance', type=float, help='Relative change reported as a regression', default=0.1)
+    args = parser.parse_args()
+
+    current_config = load_config()
+
+    main(
+        current_config, args.approach, args.benchmarks, args.n_images, args.batch_size, args.n_epochs,
+        args.batch_sizes, args.n_repeats, args.work_path, args.output_path, args.baseline_path, args.tolerance,
+    )
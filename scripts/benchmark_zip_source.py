@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import tensorflow as tf
+
+from car_azimuth_predictor.inference import generate_inference_dataset
+from car_azimuth_predictor.utils.zip_tools import unzip
+from car_azimuth_predictor.zip_image_source import ZipImageSource
+
+
+def time_epochs(dataset, n_epochs):
+    timings = []
+    for _ in range(n_epochs):
+        start_time = time.perf_counter()
+        n_items = sum(int(tf.shape(batch)[0]) for batch in dataset)
+        timings.append(time.perf_counter() - start_time)
+    return n_items, timings
+
+
+def read_dataset(image_paths, batch_size, image_source=None):
+    """Raw bytes only, to time the reads without the JPEG decoding"""
+    read_file = image_source.read_file if image_source is not None else tf.io.read_file
+    return (
+        tf.data.Dataset.from_tensor_slices(list(image_paths))
+        .map(read_file, num_parallel_calls=tf.data.AUTOTUNE)
+        .batch(batch_size)
+        .prefetch(tf.data.AUTOTUNE)
+    )
+
+
+def main(images_zip: str, prefix: str, extracted_path: str = None, batch_size=32, n_epochs=3, output_path=None):
+    source = ZipImageSource(images_zip)
+    members = source.list_images(prefix)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if extracted_path is None:
+            extracted_path = tmpdir
+            unzip(images_zip, tmpdir, [prefix.rstrip("/") + "/"])
+        file_paths = [os.path.join(extracted_path, member) for member in members]
+
+        results = {"n_images": len(members)}
+        for stage, make_dataset in [("read", read_dataset), ("decode", generate_inference_dataset)]:
+            for mode, image_paths, image_source in [("files", file_paths, None), ("zip", members, source)]:
+                n_images, timings = time_epochs(make_dataset(image_paths, batch_size, image_source=image_source), n_epochs)
+                results[f"{mode}_{stage}"] = {
+                    "epoch_seconds": timings,
+                    # The first epoch includes tf.data warmup and cold reads
+                    "images_per_second": n_images / min(timings),
+                }
+                print(f"{mode:<5} {stage:<6}: {n_images / min(timings):8.0f} images/sec")
+            # Above 1 when the archive is faster
+            results[f"{stage}_zip_to_files_ratio"] = results[f"zip_{stage}"]["images_per_second"] / results[f"files_{stage}"]["images_per_second"]
+    source.close()
+
+    if output_path is not None:
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare the throughput of images read from the zip archive and from extracted files')
+    parser.add_argument('--images_zip', type=str, help='Dataset zip archive', default='data/PASCAL3D+_release1.1.zip')
+    parser.add_argument('--prefix', type=str, help='Directory of the images inside the archive', default='PASCAL3D+_release1.1/Images/car_imagenet')
+    parser.add_argument('--extracted_path', type=str, help='Where the archive is already extracted (default: extract to a temporary directory)', default=None)
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--n_epochs', type=int, help='Epochs timed per mode', default=3)
+    parser.add_argument('--output_path', type=str, help='Path to the JSON results', default=None)
+    args = parser.parse_args()
+
+    main(args.images_zip, args.prefix, args.extracted_path, args.batch_size, args.n_epochs, args.output_path)
@@ -0,0 +1,33 @@
+import argparse
+import json
+import time
+from pprint import pprint
+
+from car_azimuth_predictor.prediction_store import DECODERS, load_prediction_store, store_metrics
+
+
+def main(store_path: str, decoding: str = None, percentiles=(50, 90, 99), acc_thresholds_degrees=(), output_path: str = None):
+    store = load_prediction_store(store_path)
+
+    start_time = time.perf_counter()
+    metrics = store_metrics(store, decoding, percentiles, acc_thresholds_degrees)
+    metrics["n_rows"] = store["n_rows"]
+    metrics["seconds"] = time.perf_counter() - start_time
+
+    if output_path is not None:
+        with open(output_path, "w") as f:
+            json.dump(metrics, f, indent=2)
+
+    return metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Angle metrics of a prediction store written by scripts/validate_model.py, without the model')
+    parser.add_argument('--store_path', type=str, help='Directory of the prediction store', default='data/predictions/val')
+    parser.add_argument('--decoding', type=str, choices=list(DECODERS), help='Decoding of the outputs (default: the one of the approach)', default=None)
+    parser.add_argument('--percentiles', type=float, nargs='*', help='Percentiles of the absolute angle error', default=[50, 90, 99])
+    parser.add_argument('--acc_thresholds', type=float, nargs='*', help='Report the accuracy within these errors, in degrees', default=[])
+    parser.add_argument('--output_path', type=str, help='Path to the JSON report', default=None)
+    args = parser.parse_args()
+
+    pprint(main(args.store_path, args.decoding, args.percentiles, args.acc_thresholds, args.output_path))
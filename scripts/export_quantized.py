@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+from pprint import pprint
+
+import numpy as np
+
+from car_azimuth_predictor.config import load_config
+from car_azimuth_predictor.dataset_generation import generate_datasets
+from car_azimuth_predictor.inference import get_azimuth_converter, load_inference_model
+from car_azimuth_predictor.quantization import (
+    TFLiteModel,
+    convert_to_int8_tflite,
+    measure_latency,
+    representative_dataset_from,
+)
+from car_azimuth_predictor.utils.angle_codecs import (
+    horizontal_flip_pose_double_sigmoid,
+    horizontal_flip_pose_sin_cos_output,
+)
+from car_azimuth_predictor.utils.numpy_metrics import np_angle_metrics
+
+
+def collect_validation_samples(validation_dataset, n_samples, n_skipped=0):
+    images, targets = [], []
+    for x_batch, y_batch in validation_dataset.unbatch().skip(n_skipped).batch(256).take(
+        -(-n_samples // 256)
+    ):
+        images.append(x_batch.numpy())
+        targets.append(y_batch.numpy())
+    if not images:
+        raise ValueError(f"No validation images left after the first {n_skipped}")
+    return np.concatenate(images)[:n_samples], np.concatenate(targets)[:n_samples]
+
+
+def model_size_mb(model_path: str) -> float:
+    """Size of a model file, or of all the files of a SavedModel directory"""
+    if not os.path.isdir(model_path):
+        return os.path.getsize(model_path) / 2 ** 20
+    return sum(
+        os.path.getsize(os.path.join(dir_path, file_name))
+        for dir_path, _, file_names in os.walk(model_path)
+        for file_name in file_names
+    ) / 2 ** 20
+
+
+def benchmark_model(model, images, targets, azimuth_converter, batch_size):
+    predictions = np.concatenate(
+        [
+            model.predict_on_batch(images[pos:pos + batch_size])
+            for pos in range(0, len(images), batch_size)
+        ]
+    )
+    batch_latency = measure_latency(model.predict_on_batch, images[:batch_size])
+
+    return {
+        "single_image_latency_ms": measure_latency(model.predict_on_batch, images[:1]) * 1000,
+        "batch_throughput_images_per_sec": min(batch_size, len(images)) / batch_latency,
+        **np_angle_metrics(azimuth_converter(targets), azimuth_converter(predictions)),
+    }
+
+
+def main(
+    approach,
+    model_path: str,
+    output_path: str,
+    report_path: str = None,
+    current_config=None,
+    n_calibration_samples=200,
+    n_evaluation_samples=1000,
+    batch_size=32,
+):
+    assert approach in ["1", "2"], "Approach must be 1 or 2"
+
+    if approach == "1":
+        pose_flip_fn = horizontal_flip_pose_sin_cos_output
+        gt_cols = ["azimuth_sin", "azimuth_cos"]
+    else:
+        pose_flip_fn = horizontal_flip_pose_double_sigmoid
+        gt_cols = ['azimuth_norm_abs', 'azimuth_radians_shifted_0.5_pi_norm_abs']
+    azimuth_converter = get_azimuth_converter(approach)
+
+    _, validation_dataset = generate_datasets(
+        current_config,
+        gt_cols=gt_cols,
+        pose_flip_fn=pose_flip_fn,
+        batch_size=batch_size,
+        augment=False,
+    )
+
+    model = load_inference_model(model_path)
+
+    # Calibrate on the head of the (unshuffled) validation split
+    tflite_model = convert_to_int8_tflite(
+        model, representative_dataset_from(validation_dataset, n_calibration_samples)
+    )
+    with open(output_path, "wb") as f:
+        f.write(tflite_model)
+    print(f"Saved the int8 model to {output_path}")
+
+    quantized_model = TFLiteModel(output_path)
+    # Evaluate on the rows after the calibration ones, so that no calibration image is scored
+    images, targets = collect_validation_samples(validation_dataset, n_evaluation_samples, n_skipped=n_calibration_samples)
+
+    report = {
+        "n_calibration_samples": n_calibration_samples,
+        "n_evaluation_samples": len(images),
+        "float": {
+            "model_size_mb": model_size_mb(model_path),
+            **benchmark_model(model, images, targets, azimuth_converter, batch_size),
+        },
+        "int8": {
+            "model_size_mb": model_size_mb(output_path),
+            **benchmark_model(quantized_model, images, targets, azimuth_converter, batch_size),
+        },
+    }
+
+    if report_path is not None:
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export an int8 quantized TFLite model and compare it with the float one')
+    parser.add_argument("--approach", type=str, help="Approach to use (1 = Sin & Cos, 2 = Directional discriminators)", choices=["1", "2"], required=True)
+    parser.add_argument("--model_path", type=str, help="Path to the trained Keras model", required=True)
+    parser.add_argument("--output_path", type=str, help="Path to the quantized .tflite model", required=True)
+    parser.add_argument("--report_path", type=str, help="Path to the JSON report", default=None)
+    parser.add_argument("--n_calibration_samples", type=int, help="Validation images used for calibration", default=200)
+    parser.add_argument("--n_evaluation_samples", type=int, help="Validation images used for the report, after the calibration ones", default=1000)
+    parser.add_argument("--batch_size", type=int, help="Batch size of the throughput measure", default=32)
+
+    args = parser.parse_args()
+
+    current_config = load_config()
+
+    report = main(
+        approach=args.approach,
+        model_path=args.model_path,
+        output_path=args.output_path,
+        report_path=args.report_path,
+        current_config=current_config,
+        n_calibration_samples=args.n_calibration_samples,
+        n_evaluation_samples=args.n_evaluation_samples,
+        batch_size=args.batch_size,
+    )
+    pprint(report)
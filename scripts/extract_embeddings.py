@@ -0,0 +1,34 @@
+import argparse
+
+from car_azimuth_predictor.config import load_config
+from car_azimuth_predictor.embedding_cache import extract_embeddings
+from car_azimuth_predictor.model_generation import generate_backbone
+from car_azimuth_predictor.train_model import get_approach_targets
+
+
+def main(approach: str, output_path: str, current_config=None, batch_size=64, n_augmented_variants=0):
+    gt_cols, pose_flip_fn = get_approach_targets(approach)
+    backbone = generate_backbone(current_config)
+
+    extract_embeddings(
+        current_config,
+        backbone,
+        gt_cols=gt_cols,
+        pose_flip_fn=pose_flip_fn,
+        output_path=output_path,
+        batch_size=batch_size,
+        n_augmented_variants=n_augmented_variants,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Store the backbone embeddings of the train/val images for head-only training')
+    parser.add_argument("--approach", type=str, help="Approach to use (1 = Sin & Cos, 2 = Directional discriminators)", choices=["1", "2"], required=True)
+    parser.add_argument("--output_path", type=str, help="Directory of the embedding cache", required=True)
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--n_augmented_variants", type=int, default=0, help="Number of augmented copies of the train split to store")
+    args = parser.parse_args()
+
+    current_config = load_config()
+
+    main(args.approach, args.output_path, current_config, args.batch_size, args.n_augmented_variants)
@@ -1,32 +1,24 @@
 import argparse
-from keras.models import load_model
 import os
 from PIL import Image
 import tensorflow as tf
 import numpy as np
 import json
-
-from car_azimuth_predictor.utils.visualization_tools import plot_image_from_path
-
-import tensorflow_hub as hub
-from car_azimuth_predictor.utils.training_tools import (
-    horizontal_flip_pose_sin_cos_output,
-    tf_acc_pi_6_sin_cos_output,
-    tf_mean_absolute_angle_error_sin_cos_output,
-    tf_median_absolute_angle_error_sin_cos_output,
-    tf_r2_angle_score_sin_cos_output,
-    tf_rmse_angle_sin_cos_output,
-    # Approach 2
-    angle_double_output_loss,
-    horizontal_flip_pose_double_sigmoid,
-    tf_mean_absolute_angle_error_double_sigmoid,
-    tf_median_absolute_angle_error_double_sigmoid,
-    tf_r2_angle_score_double_sigmoid,
-    tf_rmse_angle_score_double_sigmoid,
-    tf_acc_pi_6_double_sigmoid,
-    np_get_angle_from_double_sigmoids,
-    np_get_angle_from_sin_cos,
+import time
+
+from car_azimuth_predictor.inference import (
+    convert_azimuths,
+    generate_inference_dataset,
+    get_azimuth_converter,
+    load_inference_model,
+    predict_dataset,
+    report_throughput,
 )
+from car_azimuth_predictor.precision import PRECISIONS
+from car_azimuth_predictor.prediction_cache import PredictionCache, model_fingerprint
+from car_azimuth_predictor.sharded_inference import predict_sharded
+from car_azimuth_predictor.utils.visualization_tools import render_predictions
+from car_azimuth_predictor.zip_image_source import ZipImageSource
 
 
 def load_image_to_tensor(image_path: str) -> tf.Tensor:
@@ -46,61 +38,133 @@ def chunker(seq, size):
     return (seq[pos:pos + size] for pos in range(0, len(seq), size))
 
 
-def main(model_path, images_path, approach: str, batch_size=32, output_path=None, visualizations_path=None, units='degrees'):
-    if approach == "1":
-        azimuth_converter = np_get_angle_from_sin_cos
-    elif approach == "2":
-        azimuth_converter = np_get_angle_from_double_sigmoids
+def predict_in_process(model_path, image_paths, batch_size, pipeline, flip_tta_approach=None, precision="float32", jit_compile=False, image_source=None):
+    model = load_inference_model(model_path, flip_tta_approach, precision, jit_compile)
+
+    if pipeline == "tf_data":
+        dataset = generate_inference_dataset(image_paths, batch_size=batch_size, image_source=image_source)
+        return predict_dataset(model, dataset)
+    elif pipeline == "serial":
+        all_predictions = []
+        for image_path in chunker(image_paths, batch_size):
+            images = [load_image_to_tensor(image_source.open(image) if image_source else image) for image in image_path]
+            images = tf.stack(images, axis=0)
+            predictions = model.predict(images)
+            all_predictions.extend(predictions)
+        return np.array(all_predictions)
+    else:
+        raise ValueError("Unknown pipeline")
+
+
+def iter_model_outputs(model_path, image_paths, batch_size, pipeline, num_workers, threads_per_worker, flip_tta_approach=None, precision="float32", jit_compile=False, image_source=None):
+    """Raw model outputs for every image, in order"""
+    if len(image_paths) == 0:
+        return
+    if num_workers > 1:
+        sharded_predictions = predict_sharded(
+            image_paths,
+            model_path,
+            num_workers=num_workers,
+            threads_per_worker=threads_per_worker,
+            batch_size=batch_size,
+            flip_tta_approach=flip_tta_approach,
+            precision=precision,
+            jit_compile=jit_compile,
+            images_zip=image_source.zip_path if image_source else None,
+        )
+        for _, predictions in sharded_predictions:
+            yield from predictions
+    else:
+        yield from predict_in_process(model_path, image_paths, batch_size, pipeline, flip_tta_approach, precision, jit_compile, image_source)
+
+
+def main(model_path, images_path, approach: str, batch_size=32, output_path=None, visualizations_path=None, units='degrees', pipeline='tf_data', num_workers=1, threads_per_worker=None, cache_path=None, cache_max_size_mb=None, write_block_size=1024, visualization_workers=None, flip_tta=False, precision='float32', jit_compile=False, images_zip=None):
+    get_azimuth_converter(approach)
+    if pipeline == "serial" and num_workers > 1:
+        # The sharded workers always decode with the tf.data pipeline
+        raise ValueError("--pipeline serial runs in a single process, use --num_workers 1")
+    flip_tta_approach = approach if flip_tta else None
+
+    # With a zip, images_path is a directory of the archive and nothing is extracted
+    image_source = ZipImageSource(images_zip) if images_zip is not None else None
+    if image_source is not None:
+        image_paths = image_source.list_images(images_path)
+        files = [os.path.basename(image_path) for image_path in image_paths]
     else:
-        raise ValueError("Unknown approach")
-
-    model = load_model(model_path, custom_objects={
-        "KerasLayer": hub.KerasLayer,
-        "angle_double_output_loss": angle_double_output_loss,
-        "tf_mean_absolute_angle_error_double_sigmoid": tf_mean_absolute_angle_error_double_sigmoid,
-        "tf_rmse_angle_score_double_sigmoid": tf_rmse_angle_score_double_sigmoid,
-        "tf_r2_angle_score_double_sigmoid": tf_r2_angle_score_double_sigmoid,
-        "tf_median_absolute_angle_error_double_sigmoid": tf_median_absolute_angle_error_double_sigmoid,
-        "tf_acc_pi_6_double_sigmoid": tf_acc_pi_6_double_sigmoid,
-        "horizontal_flip_pose_double_sigmoid": horizontal_flip_pose_double_sigmoid,
-        "tf_mean_absolute_angle_error_sin_cos_output": tf_mean_absolute_angle_error_sin_cos_output,
-        "tf_rmse_angle_sin_cos_output": tf_rmse_angle_sin_cos_output,
-        "tf_r2_angle_score_sin_cos_output": tf_r2_angle_score_sin_cos_output,
-        "tf_median_absolute_angle_error_sin_cos_output": tf_median_absolute_angle_error_sin_cos_output,
-        "tf_acc_pi_6_sin_cos_output": tf_acc_pi_6_sin_cos_output,
-        "horizontal_flip_pose_sin_cos_output": horizontal_flip_pose_sin_cos_output,
-    })
-
-    all_predictions = []
-    files = sorted(os.listdir(images_path))
-    for image_path in chunker(files, batch_size):
-        images = [load_image_to_tensor(os.path.join(images_path, image)) for image in image_path]
-        images = tf.stack(images, axis=0)
-        predictions = model.predict(images)
-        all_predictions.extend(predictions)
-
-    azimuths = azimuth_converter(np.array(all_predictions))
-    if units == 'degrees':
-        azimuths = azimuths / np.pi * 180
-    elif units != 'radians':
-        raise ValueError("Unknown units")
-
-    azimuths = azimuths.astype(float).tolist()
-
-    output = []
-    for i, (image_path, azimuth) in enumerate(zip(files, azimuths)):
-        output.append({"image": image_path, "azimuth": azimuth})
+        files = sorted(os.listdir(images_path))
+        image_paths = [os.path.join(images_path, image) for image in files]
+    start_time = time.perf_counter()
+
+    # Look every file up in the cache first, the model only runs on the misses
+    cache, keys, cached_outputs = None, [None] * len(files), {}
+    if cache_path is not None:
+        cache = PredictionCache(
+            cache_path,
+            model_fingerprint(model_path, approach + (":flip_tta" if flip_tta else "") + (f":{precision}" if precision != "float32" else "")),
+            max_size_bytes=cache_max_size_mb * 2 ** 20 if cache_max_size_mb else None,
+        )
+        if image_source is not None:
+            keys = [cache.content_key(image_source.read(image_path)) for image_path in image_paths]
+        else:
+            keys = [cache.key(image_path) for image_path in image_paths]
+        cached_outputs = cache.get_many(keys)
+        # Duplicated images are computed once
+        missing_paths = {}
+        for image_path, key in zip(image_paths, keys):
+            if key not in cached_outputs:
+                missing_paths.setdefault(key, image_path)
+        missing_paths = list(missing_paths.values())
+    else:
+        missing_paths = image_paths
+    model_outputs = iter_model_outputs(model_path, missing_paths, batch_size, pipeline, num_workers, threads_per_worker, flip_tta_approach, precision, jit_compile, image_source)
+
+    # Stream the outputs to the JSON file, in file order
+    azimuths = []
     with open(output_path, "w") as f:
-        json.dump(output, f)
+        f.write("[")
+        for pos in range(0, len(files), write_block_size):
+            block_keys = keys[pos:pos + write_block_size]
+            block_outputs, new_outputs = [], []
+            for key in block_keys:
+                if key in cached_outputs:
+                    block_outputs.append(cached_outputs[key])
+                else:
+                    block_outputs.append(next(model_outputs))
+                    if key is not None:
+                        cached_outputs[key] = block_outputs[-1]
+                        new_outputs.append((key, block_outputs[-1]))
+            if cache is not None and new_outputs:
+                cache.put_many(new_outputs)
+
+            block_azimuths = convert_azimuths(np.array(block_outputs), approach, units)
+            for image_path, azimuth in zip(files[pos:pos + write_block_size], block_azimuths.astype(float).tolist()):
+                if azimuths:
+                    f.write(", ")
+                json.dump({"image": image_path, "azimuth": azimuth}, f)
+                azimuths.append(azimuth)
+        f.write("]")
+
+    report_throughput(len(files), time.perf_counter() - start_time)
+    if cache is not None:
+        print(f"Prediction cache: {cache.stats()}")
+        cache.close()
 
     if visualizations_path is not None:
-        import matplotlib.pyplot as plt
         os.makedirs(visualizations_path, exist_ok=True)
-        for i, (image_path, azimuth) in enumerate(zip(files, azimuths)):
-            plot_image_from_path(os.path.join(images_path, image_path), azimuth, None)
-            save_path = os.path.join(visualizations_path, os.path.basename(image_path))
-            plt.tight_layout()
-            plt.savefig(save_path)
+        render_predictions(
+            (
+                (
+                    np.array(Image.open(image_source.open(image_path)).convert("RGB")) if image_source else image_path,
+                    azimuth,
+                    None,
+                    os.path.join(visualizations_path, os.path.basename(image_path)),
+                )
+                for image_path, azimuth in zip(image_paths, azimuths)
+            ),
+            num_workers=visualization_workers,
+        )
+    if image_source is not None:
+        image_source.close()
 
     return azimuths
 
@@ -114,5 +178,15 @@ if __name__ == "__main__":
     parser.add_argument('--visualizations_path', type=str, help='Path to the visualizations', default=None)
     parser.add_argument('--batch_size', type=int, help='Batch size', default=16)
     parser.add_argument('--units', type=str, help='Use radians or degrees', default='degrees', choices=['radians', 'degrees'])
+    parser.add_argument('--pipeline', type=str, help='Input pipeline: parallel tf.data (default) or serial PIL loading', default='tf_data', choices=['tf_data', 'serial'])
+    parser.add_argument('--num_workers', type=int, help='Worker processes, each loading its own model (sharded mode when > 1)', default=1)
+    parser.add_argument('--threads_per_worker', type=int, help='CPU threads of each worker (default: cores / workers)', default=None)
+    parser.add_argument('--cache_path', type=str, help='SQLite prediction cache, keyed by image content and model', default=None)
+    parser.add_argument('--cache_max_size_mb', type=float, help='Evict least recently used predictions above this size', default=None)
+    parser.add_argument('--visualization_workers', type=int, help='Processes rendering the visualizations (default: all cores)', default=None)
+    parser.add_argument('--flip_tta', action='store_true', help='Fuse the predictions of each image and of its mirrored copy')
+    parser.add_argument('--precision', type=str, help='Dtype policy of the model (auto: bfloat16 on CPUs that support it)', default='float32', choices=PRECISIONS)
+    parser.add_argument('--jit_compile', action='store_true', help='Compile the model with XLA')
+    parser.add_argument('--images_zip', type=str, help='Read the images from this zip, --images_path being a directory inside it', default=None)
     args = parser.parse_args()
-    main(args.model_path, args.images_path, args.approach, args.batch_size, args.output_path, args.visualizations_path)
+    main(args.model_path, args.images_path, args.approach, args.batch_size, args.output_path, args.visualizations_path, args.units, args.pipeline, args.num_workers, args.threads_per_worker, args.cache_path, args.cache_max_size_mb, visualization_workers=args.visualization_workers, flip_tta=args.flip_tta, precision=args.precision, jit_compile=args.jit_compile, images_zip=args.images_zip)
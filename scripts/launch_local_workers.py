@@ -0,0 +1,71 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from car_azimuth_predictor.distributed import free_local_ports, make_tf_config
+
+TRAIN_SCRIPT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "train_model.py")
+
+
+def launch_workers(n_workers, train_args, throughput_report_path, threads_per_worker=None):
+    """Run scripts/train_model.py in `n_workers` local processes forming one cluster over localhost"""
+    threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // n_workers)
+    worker_hosts = [f"localhost:{port}" for port in free_local_ports(n_workers)]
+
+    processes = []
+    for worker_index in range(n_workers):
+        env = dict(
+            os.environ,
+            TF_CONFIG=make_tf_config(worker_hosts, worker_index),
+            TF_NUM_INTRAOP_THREADS=str(threads_per_worker),
+            TF_NUM_INTEROP_THREADS="2",
+            OMP_NUM_THREADS=str(threads_per_worker),
+        )
+        command = [sys.executable, TRAIN_SCRIPT, "--distributed", "--throughput_report_path", throughput_report_path, *train_args]
+        processes.append(subprocess.Popen(command, env=env))
+
+    return_codes = [process.wait() for process in processes]
+    if any(return_codes):
+        raise RuntimeError(f"Workers failed with return codes {return_codes}")
+
+    with open(throughput_report_path) as f:
+        return json.load(f)
+
+
+def main(worker_counts, train_args, report_path=None, threads_per_worker=None):
+    runs = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n_workers in worker_counts:
+            print(f"Training with {n_workers} worker(s)")
+            runs.append(launch_workers(n_workers, train_args, os.path.join(tmpdir, f"throughput_{n_workers}.json"), threads_per_worker))
+
+    # Scaling efficiency: throughput gain over the smallest run, divided by the worker gain
+    base = runs[0]
+    for run in runs:
+        run["speedup"] = run["images_per_sec"] / base["images_per_sec"]
+        run["scaling_efficiency"] = run["speedup"] / (run["n_workers"] / base["n_workers"])
+        print(
+            f"{run['n_workers']} worker(s): {run['images_per_sec']:.1f} images/sec, "
+            f"speedup {run['speedup']:.2f}x, efficiency {run['scaling_efficiency']:.0%}"
+        )
+
+    if report_path is not None:
+        with open(report_path, "w") as f:
+            json.dump(runs, f, indent=2)
+
+    return runs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Train with several local workers over localhost and report the scaling efficiency. '
+                    'Unknown arguments are passed to scripts/train_model.py'
+    )
+    parser.add_argument('--worker_counts', type=int, nargs='+', help='Number of workers of every run', default=[1, 2, 4])
+    parser.add_argument('--threads_per_worker', type=int, help='CPU threads of every worker (default: CPU count / workers)', default=None)
+    parser.add_argument('--report_path', type=str, help='Path to the JSON scaling report', default=None)
+    args, train_args = parser.parse_known_args()
+    main(args.worker_counts, train_args, args.report_path, args.threads_per_worker)
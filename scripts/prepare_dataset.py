@@ -13,13 +13,24 @@ def main():
         default="data/PASCAL3D+_release1.1.zip",
         help="Path to the PASACL3D+ dataset zip file (version 1.1)",
     )
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        default=None,
+        help="Processes extracting the archive and parsing the annotation files (default: CPU count)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only parse the annotation files added or changed since the previous run",
+    )
     args = parser.parse_args()
 
     current_config = load_config()
 
-    # collect_data(current_config)
+    # collect_data(current_config, num_workers=args.num_workers)
     # split_dataset(current_config)
-    generate_features(current_config)
+    generate_features(current_config, num_workers=args.num_workers, incremental=args.incremental)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,33 @@
+import argparse
+
+from car_azimuth_predictor.inference import get_azimuth_converter, load_inference_model
+from car_azimuth_predictor.serving import serve
+
+
+def main(model_path, approach: str, host="127.0.0.1", port=8080, max_batch_size=32, max_wait_ms=5.0, flip_tta=False, inference_timeout_s=30.0):
+    get_azimuth_converter(approach)
+    model = load_inference_model(model_path, approach if flip_tta else None)
+
+    serve(
+        model,
+        approach,
+        host=host,
+        port=port,
+        max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms,
+        inference_timeout_s=inference_timeout_s,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve model predictions over HTTP')
+    parser.add_argument('--model_path', type=str, help='Path to the model', required=True)
+    parser.add_argument("--approach", type=str, help="Approach to use (1 = Sin & Cos, 2 = Directional discriminators)", choices=["1", "2"], required=True)
+    parser.add_argument('--host', type=str, help='Host to bind', default='127.0.0.1')
+    parser.add_argument('--port', type=int, help='Port to bind', default=8080)
+    parser.add_argument('--max_batch_size', type=int, help='Maximum number of images per model call', default=32)
+    parser.add_argument('--max_wait_ms', type=float, help='Maximum time a request waits for its batch to fill', default=5.0)
+    parser.add_argument('--flip_tta', action='store_true', help='Fuse the predictions of each image and of its mirrored copy')
+    parser.add_argument('--inference_timeout_s', type=float, help='Time after which a request waiting for its batch fails with a 500', default=30.0)
+    args = parser.parse_args()
+    main(args.model_path, args.approach, args.host, args.port, args.max_batch_size, args.max_wait_ms, args.flip_tta, args.inference_timeout_s)
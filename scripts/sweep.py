@@ -0,0 +1,41 @@
+import argparse
+
+from car_azimuth_predictor.config import load_config
+from car_azimuth_predictor.sweep import run_sweep
+
+
+def main(approach: str, output_path: str, current_config=None, num_workers=1, threads_per_worker=None, embedding_cache_path=None, image_cache_path=None):
+    trials = run_sweep(
+        current_config,
+        approach,
+        output_path,
+        num_workers=num_workers,
+        threads_per_worker=threads_per_worker,
+        embedding_cache_path=embedding_cache_path,
+        image_cache_path=image_cache_path,
+    )
+
+    completed = trials[trials["status"] == "completed"]
+    best = completed.sort_values("score", ascending=current_config.sweep.mode == "min").iloc[0]
+    print(f"Best trial: {best['trial_id']} ({current_config.sweep.metric} = {best['score']:.5f})")
+    print(best.to_string())
+
+    return trials
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Hyperparameter sweep with successive halving, configured in config/sweep')
+    parser.add_argument("--approach", type=str, help="Approach to use (1 = Sin & Cos, 2 = Directional discriminators)", choices=["1", "2"], required=True)
+    parser.add_argument("--output_path", type=str, help="Directory of the trials table and trial weights", required=True)
+    parser.add_argument("--num_workers", type=int, help="Number of trials trained in parallel", default=1)
+    parser.add_argument("--threads_per_worker", type=int, help="CPU threads of every worker (default: CPU count / num_workers)", default=None)
+    parser.add_argument("--embedding_cache_path", type=str, default=None, help="Train only the heads on the embeddings written by scripts/extract_embeddings.py")
+    parser.add_argument("--image_cache_path", type=str, default=None, help="Read the images from decoded shards in this directory, built on first use")
+    parser.add_argument("--n_trials", type=int, default=None, help="Override sweep.n_trials")
+    args = parser.parse_args()
+
+    current_config = load_config()
+    if args.n_trials is not None:
+        current_config.sweep.n_trials = args.n_trials
+
+    main(args.approach, args.output_path, current_config, args.num_workers, args.threads_per_worker, args.embedding_cache_path, args.image_cache_path)
@@ -1,27 +1,8 @@
 import argparse
-import tensorflow as tf
-from tensorflow.python.keras.utils.layer_utils import count_params
 
-from car_azimuth_predictor.train_model import train_model
 from car_azimuth_predictor.config import load_config
-from car_azimuth_predictor.dataset_generation import generate_datasets
-from car_azimuth_predictor.utils.training_tools import (
-    horizontal_flip_pose_sin_cos_output,
-    tf_acc_pi_6_sin_cos_output,
-    tf_mean_absolute_angle_error_sin_cos_output,
-    tf_median_absolute_angle_error_sin_cos_output,
-    tf_r2_angle_score_sin_cos_output,
-    tf_rmse_angle_sin_cos_output,
-    # Approach 2
-    angle_double_output_loss,
-    horizontal_flip_pose_double_sigmoid,
-    tf_mean_absolute_angle_error_double_sigmoid,
-    tf_median_absolute_angle_error_double_sigmoid,
-    tf_r2_angle_score_double_sigmoid,
-    tf_rmse_angle_score_double_sigmoid,
-    tf_acc_pi_6_double_sigmoid,
-)
-from car_azimuth_predictor.model_generation import generate_model
+from car_azimuth_predictor.precision import PRECISIONS
+from car_azimuth_predictor.train_model import train_approach_model
 
 
 def main(
@@ -32,101 +13,42 @@ def main(
     verbose=2,
     epochs=100,
     early_stopping_patience=10,
+    embedding_cache_path=None,
+    n_neurons_middle_layer=100,
+    dropout_rate=0.2,
+    learning_rate=0.001,
+    batch_size=32,
+    should_augment=True,
+    image_cache_path=None,
+    precision="float32",
+    jit_compile=False,
+    distributed=False,
+    throughput_report_path=None,
 ):
     assert approach in ["1", "2"], "Approach must be 1 or 2"
 
-    n_neurons_middle_layer = 100
-    dropout_rate = 0.2
-    learning_rate = 0.001
-    batch_size = 32
-    should_augment = True
-
-    if approach == "1":
-        pose_flip_fn = horizontal_flip_pose_sin_cos_output
-        gt_cols = ["azimuth_sin", "azimuth_cos"]
-    else:
-        pose_flip_fn = horizontal_flip_pose_double_sigmoid
-        gt_cols = ['azimuth_norm_abs', 'azimuth_radians_shifted_0.5_pi_norm_abs']
-
-    train_dataset, validation_dataset = generate_datasets(
+    _, _, val_metrics = train_approach_model(
         current_config,
-        gt_cols=gt_cols,
-        pose_flip_fn=pose_flip_fn,
+        approach,
+        n_neurons_middle_layer=n_neurons_middle_layer,
+        dropout_rate=dropout_rate,
+        learning_rate=learning_rate,
         batch_size=batch_size,
-        augment=should_augment,
-    )
-
-    input_layer = tf.keras.layers.Input(shape=(1280,))
-    in_to_dense = tf.keras.layers.Dropout(dropout_rate, name="Dropout")(input_layer)
-
-    if n_neurons_middle_layer:
-        activation_fn_middle_layer = 'relu'
-        in_to_dense = tf.keras.layers.Dense(
-            n_neurons_middle_layer,
-            activation=activation_fn_middle_layer,
-            name="mlp_middle",
-        )(in_to_dense)
-
-    if approach == "1":
-        mlp_output = tf.keras.layers.Dense(2, activation="tanh", name="mlp_output")(in_to_dense)
-        bottom = tf.keras.models.Model(inputs=input_layer, outputs=mlp_output)
-
-        # Metrics definition
-        metrics = [
-            tf_mean_absolute_angle_error_sin_cos_output,
-            tf_rmse_angle_sin_cos_output,
-            tf_r2_angle_score_sin_cos_output,
-            tf_median_absolute_angle_error_sin_cos_output,
-            tf_acc_pi_6_sin_cos_output,
-        ]
-
-        # Loss
-        loss = tf.keras.losses.MeanSquaredError(reduction="auto", name="mean_squared_error")
-    else:
-        angle1_sigmoid_output = tf.keras.layers.Dense(1, activation="sigmoid", name="angle1_output")(in_to_dense)
-        angle2_sigmoid_output = tf.keras.layers.Dense(1, activation="sigmoid", name="angle2_output")(in_to_dense)
-
-        angle_concatenated = tf.keras.layers.Concatenate(axis=1, name="concatenate_angles_2_vars")([angle1_sigmoid_output, angle2_sigmoid_output])
-
-        bottom = tf.keras.models.Model(inputs=input_layer, outputs=angle_concatenated)
-
-        # Metrics definition
-        metrics = [
-            tf_mean_absolute_angle_error_double_sigmoid,
-            tf_median_absolute_angle_error_double_sigmoid,
-            tf_r2_angle_score_double_sigmoid,
-            tf_rmse_angle_score_double_sigmoid,
-            tf_acc_pi_6_double_sigmoid,
-        ]
-
-        # Loss
-        loss = angle_double_output_loss
-
-    model = generate_model(current_config, top_model=bottom)
-
-    print("Number of trainable weights:", count_params(model.trainable_weights))
-    # model.summary()
-
-    optimizer = tf.keras.optimizers.Adamax(learning_rate=learning_rate)
-
-    train_history = train_model(
-        current_config,
-        model=model,
-        train_dataset=train_dataset,
-        validation_dataset=validation_dataset,
-        optimizer=optimizer,
-        loss=loss,
-        metrics=metrics,
+        should_augment=should_augment,
+        epochs=epochs,
+        early_stopping_patience=early_stopping_patience,
         verbose=verbose,
         save_model_path=save_model_path,
         train_history_path=train_history_path,
-        epochs=epochs,
-        early_stopping_patience=early_stopping_patience,
+        embedding_cache_path=embedding_cache_path,
+        image_cache_path=image_cache_path,
+        precision=precision,
+        jit_compile=jit_compile,
+        distributed=distributed,
+        throughput_report_path=throughput_report_path,
     )
 
-    metrics = model.evaluate(validation_dataset, verbose=1)
-
-    return metrics[0]  # val_loss
+    return val_metrics
 
 
 if __name__ == "__main__":
@@ -139,9 +61,15 @@ if __name__ == "__main__":
     parser.add_argument("--epochs", type=int, default=100)
     parser.add_argument("--early_stopping_patience", type=int, default=10)
     parser.add_argument("--verbose", type=int, default=1, choices=[0, 1, 2])
-    parser.add_argument("--should_augment", type=bool, default=True)
+    parser.add_argument("--should_augment", type=lambda x: x.lower() in ("1", "true", "yes"), default=True)
     parser.add_argument("--save_model_path", type=str, help="Path to save the model")
     parser.add_argument("--train_history_path", type=str, help="Path to save the training history")
+    parser.add_argument("--image_cache_path", type=str, default=None, help="Read the images from decoded shards in this directory, built on first use")
+    parser.add_argument("--precision", type=str, default="float32", choices=PRECISIONS, help="Dtype policy of the model (auto: bfloat16 on CPUs that support it)")
+    parser.add_argument("--jit_compile", action="store_true", help="Compile the train and evaluation steps with XLA")
+    parser.add_argument("--distributed", action="store_true", help="Train with the workers of TF_CONFIG (see scripts/launch_local_workers.py); --batch_size is per worker")
+    parser.add_argument("--throughput_report_path", type=str, default=None, help="Write the training images/sec to this JSON file")
+    parser.add_argument("--embedding_cache_path", type=str, default=None, help="Train only the head on the embeddings written by scripts/extract_embeddings.py")
 
     args = parser.parse_args()
 
@@ -155,4 +83,15 @@ if __name__ == "__main__":
         verbose=args.verbose,
         epochs=args.epochs,
         early_stopping_patience=args.early_stopping_patience,
+        embedding_cache_path=args.embedding_cache_path,
+        n_neurons_middle_layer=args.n_neurons_middle_layer,
+        dropout_rate=args.dropout_rate,
+        learning_rate=args.learning_rate,
+        batch_size=args.batch_size,
+        should_augment=args.should_augment,
+        image_cache_path=args.image_cache_path,
+        precision=args.precision,
+        jit_compile=args.jit_compile,
+        distributed=args.distributed,
+        throughput_report_path=args.throughput_report_path,
     )
@@ -1,38 +1,27 @@
 import argparse
+import os
 from pprint import pprint
+
+import numpy as np
+import tensorflow as tf
 from keras.models import load_model
 
+from car_azimuth_predictor.annotation_store import read_annotations
 from car_azimuth_predictor.config import load_config
 from car_azimuth_predictor.dataset_generation import generate_datasets
+from car_azimuth_predictor.evaluate_model import compare_flip_tta
+from car_azimuth_predictor.inference import get_custom_objects
+from car_azimuth_predictor.precision import PRECISIONS, cast_model_to_precision
+from car_azimuth_predictor.prediction_store import load_prediction_store, store_metrics, write_prediction_store
+from car_azimuth_predictor.train_model import get_approach_targets, get_loss_and_metrics
 from car_azimuth_predictor.visualize import visualize_single_predictions
-import tensorflow_hub as hub
-from car_azimuth_predictor.utils.training_tools import (
-    horizontal_flip_pose_sin_cos_output,
-    tf_acc_pi_6_sin_cos_output,
-    tf_mean_absolute_angle_error_sin_cos_output,
-    tf_median_absolute_angle_error_sin_cos_output,
-    tf_r2_angle_score_sin_cos_output,
-    tf_rmse_angle_sin_cos_output,
-    # Approach 2
-    angle_double_output_loss,
-    horizontal_flip_pose_double_sigmoid,
-    tf_mean_absolute_angle_error_double_sigmoid,
-    tf_median_absolute_angle_error_double_sigmoid,
-    tf_r2_angle_score_double_sigmoid,
-    tf_rmse_angle_score_double_sigmoid,
-    tf_acc_pi_6_double_sigmoid,
-)
-
-
-def main(approach, model_path: str, current_config=None, visualizations_path: str = None):
-    assert approach in ["1", "2"], "Approach must be 1 or 2"
-
-    if approach == "1":
-        pose_flip_fn = horizontal_flip_pose_sin_cos_output
-        gt_cols = ["azimuth_sin", "azimuth_cos"]
-    else:
-        pose_flip_fn = horizontal_flip_pose_double_sigmoid
-        gt_cols = ['azimuth_norm_abs', 'azimuth_radians_shifted_0.5_pi_norm_abs']
+from car_azimuth_predictor.zip_image_source import image_source_from_config
+
+
+def main(approach, model_path: str, current_config=None, visualizations_path: str = None, flip_tta=False, precision="float32", jit_compile=False, store_path="data/predictions/val"):
+    """Run the model once over the validation split into the prediction store at
+    `store_path`, then compute the metrics and visualizations from the store"""
+    gt_cols, pose_flip_fn = get_approach_targets(approach)
 
     train_dataset, validation_dataset = generate_datasets(
         current_config,
@@ -41,38 +30,31 @@ def main(approach, model_path: str, current_config=None, visualizations_path: st
         batch_size=32,
         augment=False,
     )
+    # Same rows, in the same order, as the validation dataset
+    image_ids = read_annotations(
+        os.path.join(os.getcwd(), current_config.dataset_generation.df_path), ["image_path"], split="val"
+    )["image_path"]
 
-    model = load_model(model_path, custom_objects={
-        "KerasLayer": hub.KerasLayer,
-        "angle_double_output_loss": angle_double_output_loss,
-        "tf_mean_absolute_angle_error_double_sigmoid": tf_mean_absolute_angle_error_double_sigmoid,
-        "tf_rmse_angle_score_double_sigmoid": tf_rmse_angle_score_double_sigmoid,
-        "tf_r2_angle_score_double_sigmoid": tf_r2_angle_score_double_sigmoid,
-        "tf_median_absolute_angle_error_double_sigmoid": tf_median_absolute_angle_error_double_sigmoid,
-        "tf_acc_pi_6_double_sigmoid": tf_acc_pi_6_double_sigmoid,
-        "horizontal_flip_pose_double_sigmoid": horizontal_flip_pose_double_sigmoid,
-        "tf_mean_absolute_angle_error_sin_cos_output": tf_mean_absolute_angle_error_sin_cos_output,
-        "tf_rmse_angle_sin_cos_output": tf_rmse_angle_sin_cos_output,
-        "tf_r2_angle_score_sin_cos_output": tf_r2_angle_score_sin_cos_output,
-        "tf_median_absolute_angle_error_sin_cos_output": tf_median_absolute_angle_error_sin_cos_output,
-        "tf_acc_pi_6_sin_cos_output": tf_acc_pi_6_sin_cos_output,
-        "horizontal_flip_pose_sin_cos_output": horizontal_flip_pose_sin_cos_output,
-    })
-
-    metric_values = model.evaluate(validation_dataset, verbose=1)
-    metric_names = [
-        'loss',
-        'mean_absolute_angle_error',
-        'median_absolute_angle_error',
-        'r2',
-        'rmse',
-        'acc_pi_6',
-    ]
+    model = load_model(model_path, custom_objects=get_custom_objects())
+    model = cast_model_to_precision(model, precision, custom_objects=get_custom_objects())
+    loss, _ = get_loss_and_metrics(approach)
+    model.compile(loss=loss, jit_compile=jit_compile)
+
+    write_prediction_store(model, validation_dataset, image_ids, store_path, approach, gt_cols)
+    store = load_prediction_store(store_path)
+
+    results = {
+        "loss": float(tf.reduce_mean(loss(np.asarray(store["targets"]), np.asarray(store["predictions"])))),
+        **store_metrics(store),
+    }
 
     if visualizations_path is not None:
-        visualize_single_predictions(model, validation_dataset, save_path=visualizations_path)
+        visualize_single_predictions(store, save_path=visualizations_path, image_source=image_source_from_config(current_config))
+
+    if flip_tta:
+        results["flip_tta"] = compare_flip_tta(model, validation_dataset, approach)
 
-    return dict(zip(metric_names, metric_values))
+    return results
 
 
 if __name__ == "__main__":
@@ -80,6 +62,10 @@ if __name__ == "__main__":
     parser.add_argument("--approach", type=str, help="Approach to use (1 = Sin & Cos, 2 = Directional discriminators)", choices=["1", "2"])
     parser.add_argument("--model_path", type=str, help="Path to the model to validate")
     parser.add_argument("--visualizations_path", type=str, default=None, help="Path to save visualizations")
+    parser.add_argument("--flip_tta", action="store_true", help="Also report the accuracy gain and throughput cost of the flip test-time augmentation")
+    parser.add_argument("--precision", type=str, default="float32", choices=PRECISIONS, help="Dtype policy of the model (auto: bfloat16 on CPUs that support it)")
+    parser.add_argument("--jit_compile", action="store_true", help="Compile the evaluation step with XLA")
+    parser.add_argument("--store_path", type=str, default="data/predictions/val", help="Directory of the prediction store (see scripts/evaluate_predictions.py)")
 
     args = parser.parse_args()
 
@@ -89,6 +75,10 @@ if __name__ == "__main__":
         approach=args.approach,
         model_path=args.model_path,
         current_config=current_config,
-        visualizations_path=args.visualizations_path
+        visualizations_path=args.visualizations_path,
+        flip_tta=args.flip_tta,
+        precision=args.precision,
+        jit_compile=args.jit_compile,
+        store_path=args.store_path,
     )
     pprint(metrics)
@@ -0,0 +1,58 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from car_azimuth_predictor.inference import get_azimuth_converter, load_inference_model
+from car_azimuth_predictor.video_inference import iter_video_frames, predict_video_azimuths
+
+
+def main(model_path, video_path, approach: str, output_path, keyframe_interval=5, change_threshold=None, smoothing=0.5, batch_size=16, units='degrees'):
+    azimuth_converter = get_azimuth_converter(approach)
+    if units not in ('degrees', 'radians'):
+        raise ValueError("Unknown units")
+    model = load_inference_model(model_path)
+
+    n_frames, n_keyframes = 0, 0
+    start_time = time.perf_counter()
+    # One JSON object per line, written as soon as the frame azimuth is known
+    with open(output_path, "w") as f:
+        frame_azimuths = predict_video_azimuths(
+            model.predict_on_batch,
+            azimuth_converter,
+            iter_video_frames(video_path),
+            keyframe_interval=keyframe_interval,
+            change_threshold=change_threshold,
+            batch_size=batch_size,
+            smoothing=smoothing,
+        )
+        for frame_index, azimuth, is_keyframe in frame_azimuths:
+            if units == 'degrees':
+                azimuth = azimuth / np.pi * 180
+            f.write(json.dumps({"frame": frame_index, "azimuth": azimuth, "keyframe": is_keyframe}) + "\n")
+            n_frames += 1
+            n_keyframes += is_keyframe
+
+    elapsed = time.perf_counter() - start_time
+    print(
+        f"Processed {n_frames} frames ({n_keyframes} through the model) in {elapsed:.2f}s "
+        f"({n_frames / elapsed:.1f} frames/sec)"
+    )
+
+    return n_frames / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Predict the azimuth of every frame of a video')
+    parser.add_argument('--model_path', type=str, help='Path to the model', required=True)
+    parser.add_argument("--approach", type=str, help="Approach to use (1 = Sin & Cos, 2 = Directional discriminators)", choices=["1", "2"], required=True)
+    parser.add_argument('--video_path', type=str, help='Path to the video file, or to a directory of frames', required=True)
+    parser.add_argument('--output_path', type=str, help='Path to the output JSON lines file', required=True)
+    parser.add_argument('--keyframe_interval', type=int, help='Run the model at least every k-th frame', default=5)
+    parser.add_argument('--change_threshold', type=float, help='Also run the model when the frame changed more than this (0-1) since the last keyframe', default=None)
+    parser.add_argument('--smoothing', type=float, help='Weight of the new frame in the circular moving average (1 = no smoothing)', default=0.5)
+    parser.add_argument('--batch_size', type=int, help='Keyframes per model call', default=16)
+    parser.add_argument('--units', type=str, help='Use radians or degrees', default='degrees', choices=['radians', 'degrees'])
+    args = parser.parse_args()
+    main(args.model_path, args.video_path, args.approach, args.output_path, args.keyframe_interval, args.change_threshold, args.smoothing, args.batch_size, args.units)
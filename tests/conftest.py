@@ -0,0 +1,13 @@
+import pytest
+
+from car_azimuth_predictor.benchmarks import make_synthetic_dataset
+
+
+@pytest.fixture
+def synthetic_dataset(tmp_path):
+    """Writes a synthetic dataset of random JPEGs and annotations under tmp_path/data, small images by default"""
+
+    def make(n_images: int, image_size=(16, 16)) -> dict:
+        return make_synthetic_dataset(str(tmp_path / "data"), n_images=n_images, image_size=image_size)
+
+    return make
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from car_azimuth_predictor.annotation_store import compute_angle_columns
+from car_azimuth_predictor.utils.angle_codecs import CODECS
+
+
+def angle_differences(a, b):
+    return np.abs((np.asarray(a, dtype=np.float64) - b + np.pi) % (2 * np.pi) - np.pi)
+
+
+@pytest.mark.parametrize("encoding", list(CODECS))
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_codec_round_trips(encoding, dtype):
+    codec = CODECS[encoding]
+    rng = np.random.default_rng(0)
+    angles = rng.uniform(-np.pi, np.pi, size=10000).astype(dtype)
+
+    encoded = codec.np_encode(angles)
+    assert encoded.dtype == dtype and encoded.shape == (10000, 2)
+    atol = 1e-5 if dtype == np.float32 else 1e-10
+    assert angle_differences(codec.np_decode(encoded), angles).max() < atol
+    # Any turn of the same direction encodes the same
+    np.testing.assert_allclose(codec.np_encode(angles + 4 * np.pi), encoded, atol=1e-4)
+    # A horizontal flip mirrors the azimuth
+    assert angle_differences(codec.np_decode(codec.np_flip(encoded)), -angles).max() < 1e-4
+
+    # Buffers are filled in place
+    out_pairs, out_angles = np.empty((10000, 2), dtype), np.empty(10000, dtype)
+    assert codec.np_encode(angles, out=out_pairs) is out_pairs
+    assert codec.np_decode(out_pairs, out=out_angles) is out_angles
+    assert codec.np_flip(out_pairs, out=out_pairs) is out_pairs
+    np.testing.assert_array_equal(out_pairs, codec.np_flip(encoded))
+
+    # The TF codec matches the NumPy one
+    np.testing.assert_allclose(codec.tf_encode(angles.astype(np.float32)), encoded, atol=1e-5)
+    np.testing.assert_allclose(codec.tf_flip(encoded.astype(np.float32)), codec.np_flip(encoded), atol=1e-6)
+    outputs = rng.uniform(0, 1, size=(10000, 2)).astype(np.float32)
+    if encoding == "sin_cos":
+        outputs = outputs * 2 - 1
+    assert angle_differences(codec.tf_decode(outputs).numpy(), codec.np_decode(outputs)).max() < 1e-5
+
+
+def test_double_sigmoid_encoding_matches_the_annotation_columns():
+    azimuth = np.linspace(0, 360, 721, dtype=np.float32)[:-1]
+    columns = compute_angle_columns(azimuth)
+    encoded = CODECS["double_sigmoid"].np_encode(columns["azimuth_radians"])
+    np.testing.assert_allclose(encoded[:, 0], columns["azimuth_norm_abs"], atol=1e-6)
+    np.testing.assert_allclose(encoded[:, 1], columns["azimuth_radians_shifted_0.5_pi_norm_abs"], atol=1e-6)
+
+
+def test_legacy_double_sigmoid_decoding_keeps_the_side():
+    from car_azimuth_predictor.utils.angle_codecs import np_get_angle_from_double_sigmoids_old
+    from car_azimuth_predictor.utils.training_tools import tf_get_angle_from_double_sigmoids_old
+
+    angles = np.linspace(-np.pi, np.pi, 361)[1:-1]
+    encoded = CODECS["double_sigmoid"].np_encode(angles)
+    decoded = np_get_angle_from_double_sigmoids_old(encoded)
+    np.testing.assert_allclose(decoded, angles, atol=1e-10)
+    np.testing.assert_allclose(tf_get_angle_from_double_sigmoids_old(encoded.astype(np.float32)), decoded, atol=1e-5)
+
+
+@pytest.mark.parametrize("dtype", [np.float16, np.float32, np.float64])
+def test_tf_double_sigmoid_decoding_keeps_the_input_dtype(dtype):
+    from car_azimuth_predictor.utils.training_tools import tf_get_angle_from_double_sigmoids_old
+
+    angles = np.linspace(-np.pi, np.pi, 361)[1:-1]
+    encoded = CODECS["double_sigmoid"].np_encode(angles).astype(dtype)
+    atol = 1e-2 if dtype == np.float16 else 1e-5
+    for decode in [CODECS["double_sigmoid"].tf_decode, tf_get_angle_from_double_sigmoids_old]:
+        decoded = decode(encoded)
+        assert decoded.dtype == dtype
+        assert angle_differences(decoded.numpy(), angles).max() < atol
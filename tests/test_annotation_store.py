@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from car_azimuth_predictor.annotation_store import (
+    compute_angle_columns,
+    count_annotations,
+    read_annotations,
+    write_annotations,
+)
+from car_azimuth_predictor.utils.angle_codecs import np_shift_05_pi
+
+
+def test_angle_columns_match_the_row_wise_definitions():
+    azimuth = np.array([0.0, 45.0, 90.0, 179.9, 180.0, 270.0, 359.5])
+    columns = compute_angle_columns(azimuth)
+
+    radians = azimuth / 180 * np.pi
+    shifted = np.array([x if x < np.pi else x - 2 * np.pi for x in radians])
+    assert all(values.dtype == np.float32 for values in columns.values())
+    assert np.allclose(columns["azimuth_norm_abs"], np.abs(shifted) / np.pi, atol=1e-6)
+    assert np.allclose(columns["azimuth_radians_shifted_0.5_pi_norm_abs"], np.abs(np_shift_05_pi(radians) / np.pi), atol=1e-6)
+    assert np.allclose(columns["azimuth_sin"], np.sin(radians), atol=1e-6)
+
+
+def test_store_round_trip(tmp_path):
+    df = pd.DataFrame(
+        {
+            "image_path": ["/data/images/a.JPEG", "/data/images/b.JPEG", "/data/other/c.JPEG", "d.JPEG", "/e.JPEG"],
+            "is_train": [1, 0, 1, 0, 0],
+            "azimuth": [10.0, 200.0, 300.0, 20.0, 30.0],
+        }
+    )
+    for path in [tmp_path / "annotations.arrow", tmp_path / "annotations.csv"]:
+        write_annotations(df, str(path))
+
+        assert count_annotations(path) == {"train": 2, "val": 3}
+        assert read_annotations(path)[["image_path", "is_train", "azimuth"]].values.tolist() == df.values.tolist()
+        train = read_annotations(path, ["image_path", "azimuth"], split="train")
+        assert list(train.columns) == ["image_path", "azimuth"]
+        assert train["image_path"].tolist() == ["/data/images/a.JPEG", "/data/other/c.JPEG"]
+        assert read_annotations(path, ["azimuth"], split="val")["azimuth"].tolist() == [200.0, 20.0, 30.0]
+        # Bare file names and files at the root come back as written, like os.path.join
+        assert read_annotations(path, ["image_path"], split="val")["image_path"].tolist()[1:] == ["d.JPEG", "/e.JPEG"]
@@ -0,0 +1,49 @@
+import numpy as np
+import tensorflow as tf
+
+from car_azimuth_predictor import batch_augmentation
+from car_azimuth_predictor.batch_augmentation import augment_batch
+from car_azimuth_predictor.utils.angle_codecs import (
+    horizontal_flip_pose_double_sigmoid,
+    horizontal_flip_pose_sin_cos_output,
+)
+
+PROBABILITIES = ["FLIP_P", "ROTATE_P", "DISTORTION_P", "CROP_P", "BRIGHTNESS_CONTRAST_P"]
+
+
+def test_augment_batch_flip_and_determinism(monkeypatch):
+    rng = np.random.default_rng(0)
+    images = tf.constant(rng.uniform(0, 255, (4, 32, 48, 3)), dtype=tf.float32)
+    targets = tf.constant(rng.uniform(0, 1, (4, 2)))
+    seed = tf.constant([1, 2], dtype=tf.int64)
+
+    first = augment_batch(images, targets, seed, horizontal_flip_pose_double_sigmoid)
+    second = augment_batch(images, targets, seed, horizontal_flip_pose_double_sigmoid)
+    assert np.array_equal(first[0], second[0]) and np.array_equal(first[1], second[1])
+    assert first[0].shape == images.shape
+
+    for name in PROBABILITIES:
+        monkeypatch.setattr(batch_augmentation, name, 0.0)
+    same_images, same_targets = augment_batch(images, targets, seed, horizontal_flip_pose_double_sigmoid)
+    np.testing.assert_allclose(same_images, images, atol=1e-3)
+    np.testing.assert_array_equal(same_targets, targets)
+
+    monkeypatch.setattr(batch_augmentation, "FLIP_P", 1.0)
+    flipped_images, flipped_targets = augment_batch(images, targets, seed, horizontal_flip_pose_double_sigmoid)
+    np.testing.assert_allclose(flipped_images, images[:, :, ::-1], atol=1e-3)
+    np.testing.assert_allclose(flipped_targets[:, 0], targets[:, 0])
+    np.testing.assert_allclose(flipped_targets[:, 1], 1 - targets[:, 1])
+
+    _, flipped_sin_cos = augment_batch(images, targets, seed, horizontal_flip_pose_sin_cos_output)
+    np.testing.assert_allclose(flipped_sin_cos, targets * [-1, 1])
+
+
+def test_batch_augmentation_seeds_change_every_epoch_reproducibly():
+    def epoch(dataset):
+        return [seed.numpy().tolist() for seed in tf.data.Dataset.zip((tf.data.Dataset.range(4), dataset)).map(lambda _, seed: seed)]
+
+    seeds = batch_augmentation.batch_augmentation_seeds(0)
+    first, second = epoch(seeds), epoch(seeds)
+    assert len({tuple(seed) for seed in first}) == 4 and first != second
+    assert epoch(batch_augmentation.batch_augmentation_seeds(0)) == first
+    assert epoch(batch_augmentation.batch_augmentation_seeds(1)) != first
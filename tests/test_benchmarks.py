@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from car_azimuth_predictor.annotation_store import read_annotations
+from car_azimuth_predictor.benchmarks import benchmark_inference, compare_results
+
+
+def test_make_synthetic_dataset(synthetic_dataset):
+    dataset = synthetic_dataset(n_images=10, image_size=(48, 64))
+
+    df = read_annotations(dataset["annotations_path"])
+    assert len(df) == 10 and dataset["n_train"] + dataset["n_val"] == 10
+    assert sorted(path.split("/")[-1] for path in df["image_path"]) == sorted(os.listdir(dataset["images_path"]))
+    # The targets match the annotated azimuth like in the real table
+    np.testing.assert_allclose(df["azimuth_radians"], np.deg2rad(df["azimuth"]), atol=1e-6)
+
+
+def test_compare_results_flags_regressions():
+    baseline = {
+        "results": {
+            "inference": {"images_per_second": 100.0, "load_seconds": 10.0, "images_per_epoch": 256},
+            "metrics": {"loss_ns": 5.0},
+            "parameters": {"n_images": 256},
+        }
+    }
+    results = {
+        "results": {
+            "inference": {"images_per_second": 80.0, "load_seconds": 9.0, "images_per_epoch": 512},
+            "metrics": {"loss_ns": 5.2},
+            "parameters": {"n_images": 512},
+            "new": {"x": 1.0},
+        }
+    }
+
+    comparison = compare_results(results, baseline, tolerance=0.1).set_index("result")
+    # Counts are not compared
+    assert list(comparison.index) == ["inference.images_per_second", "inference.load_seconds", "metrics.loss_ns"]
+    assert comparison["regression"].tolist() == [True, False, False]
+    assert np.isclose(comparison.loc["inference.images_per_second", "ratio"], 0.8)
+
+
+def test_benchmark_inference(tmp_path, synthetic_dataset):
+    dataset = synthetic_dataset(n_images=6)
+    model = tf.keras.Sequential(
+        [tf.keras.layers.GlobalAveragePooling2D(input_shape=(224, 224, 3)), tf.keras.layers.Dense(2, activation="sigmoid")]
+    )
+    model_path = str(tmp_path / "model.h5")
+    model.save(model_path)
+
+    results = benchmark_inference(model_path, dataset["images_path"], approach="2", batch_size=4, n_epochs=2)
+    assert results["images_per_epoch"] == 6 and len(results["epoch_seconds"]) == 2
+    assert results["load_seconds"] > 0 and results["images_per_second"] > 0
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+import tensorflow as tf
+from omegaconf import OmegaConf
+
+from car_azimuth_predictor.dataset_generation import generate_datasets
+from car_azimuth_predictor.distributed import distributed_steps, scaled_learning_rate
+
+
+def test_distributed_steps():
+    # 2 workers of 4: 50 val rows are sharded 25 + 25, in 7 batches on each worker
+    assert distributed_steps(100, 50, batch_size=4, n_workers=2) == (12, 7)
+    assert distributed_steps(100, 3, batch_size=4, n_workers=4) == (6, 1)
+    assert distributed_steps(10, 0, batch_size=4, n_workers=1) == (2, 1)
+    assert scaled_learning_rate(0.001, 4) == pytest.approx(0.004)
+
+
+@pytest.mark.parametrize("image_cache", [False, True])
+def test_worker_datasets_partition_the_rows(tmp_path, image_cache, synthetic_dataset):
+    n_workers, batch_size = 2, 3
+    dataset = synthetic_dataset(n_images=30)
+    config = OmegaConf.create(
+        {
+            "dataset_generation": {
+                "df_path": dataset["annotations_path"],
+                "image_height": 16,
+                "image_width": 16,
+                "image_cache_n_shards": 4,
+                "image_cache_shuffle_seed": 0,
+                "image_cache_shuffle_buffer": 8,
+                "augmentation": "albumentations",
+                "augmentation_seed": 0,
+                "images_zip_path": None,
+            }
+        }
+    )
+
+    train_rows, val_rows, val_batches = [], [], []
+    for worker_index in range(n_workers):
+        input_context = tf.distribute.InputContext(n_workers, worker_index, n_workers)
+        train_dataset, val_dataset = generate_datasets(
+            config,
+            ["azimuth_sin", "azimuth_cos"],
+            lambda pose: pose,
+            batch_size=batch_size,
+            augment=False,
+            image_cache_path=str(tmp_path / "shards") if image_cache else None,
+            input_context=input_context,
+        )
+        train_rows.append({float(y[0]) for _, y_batch in train_dataset for y in y_batch.numpy()})
+        batches = [y_batch.numpy() for _, y_batch in val_dataset]
+        val_batches.append(len(batches))
+        val_rows.extend(float(y[0]) for y_batch in batches for y in y_batch)
+
+    steps_per_epoch, validation_steps = distributed_steps(dataset["n_train"], dataset["n_val"], batch_size, n_workers)
+    # Workers never see the same train row, and one pass over the share of each covers an epoch
+    assert not train_rows[0] & train_rows[1]
+    assert all(len(rows) >= steps_per_epoch * batch_size for rows in train_rows)
+    # Every validation row is evaluated exactly once within validation_steps
+    assert len(val_rows) == dataset["n_val"] == len(set(val_rows))
+    assert max(val_batches) == validation_steps
@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+import tensorflow as tf
+from omegaconf import OmegaConf
+
+from car_azimuth_predictor import embedding_cache
+from car_azimuth_predictor.embedding_cache import EMBEDDING_SIZE, extract_embeddings, load_embedding_datasets
+
+
+def small_backbone(seed: int) -> tf.keras.Model:
+    tf.keras.utils.set_random_seed(seed)
+    inputs = tf.keras.layers.Input(shape=(16, 16, 3))
+    x = tf.keras.layers.GlobalAveragePooling2D()(inputs)
+    return tf.keras.models.Model(inputs=inputs, outputs=tf.keras.layers.Dense(EMBEDDING_SIZE)(x))
+
+
+def test_embeddings_are_reused_until_the_model_or_the_images_change(tmp_path, monkeypatch, synthetic_dataset):
+    dataset = synthetic_dataset(n_images=12)
+    config = OmegaConf.create(
+        {"dataset_generation": {"df_path": dataset["annotations_path"], "image_height": 16, "image_width": 16}}
+    )
+    gt_cols = ["azimuth_sin", "azimuth_cos"]
+    output_path = str(tmp_path / "embeddings")
+
+    n_passes = []
+    write_split = embedding_cache._write_split
+    monkeypatch.setattr(embedding_cache, "_write_split", lambda *args: n_passes.append(args[-1]) or write_split(*args))
+
+    def extract(backbone):
+        return extract_embeddings(config, backbone, gt_cols, lambda pose: pose, output_path, batch_size=4)
+
+    backbone = small_backbone(0)
+    metadata = extract(backbone)
+    assert n_passes == ["train", "val"]
+    _, val_dataset = load_embedding_datasets(output_path, gt_cols, batch_size=4)
+    embeddings = np.concatenate([x for x, _ in val_dataset.as_numpy_iterator()])
+    assert embeddings.shape == (dataset["n_val"], EMBEDDING_SIZE)
+
+    # Same model and images: nothing is recomputed
+    assert extract(small_backbone(0)) == metadata
+    assert n_passes == ["train", "val"]
+
+    # Other weights, then a touched image, rebuild the embeddings
+    assert extract(small_backbone(1))["fingerprint"] != metadata["fingerprint"]
+    assert n_passes == ["train", "val"] * 2
+    rebuilt_embeddings = np.concatenate([x for x, _ in load_embedding_datasets(output_path, gt_cols, 4)[1].as_numpy_iterator()])
+    assert not np.allclose(rebuilt_embeddings, embeddings)
+
+    image_path = os.path.join(dataset["images_path"], sorted(os.listdir(dataset["images_path"]))[0])
+    stat = os.stat(image_path)
+    os.utime(image_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    extract(small_backbone(1))
+    assert n_passes == ["train", "val"] * 3
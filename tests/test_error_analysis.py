@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from car_azimuth_predictor.annotation_store import write_annotations
+from car_azimuth_predictor.error_analysis import QUADRANTS, analyze_errors, grouped_error_statistics
+from car_azimuth_predictor.utils.angle_codecs import np_get_sin_cos_from_angle
+
+
+def test_grouped_error_statistics_match_pandas():
+    np.random.seed(0)
+    groups = np.random.randint(0, 6, size=1000)
+    groups[groups == 4] = 3  # an empty group
+    abs_errors = np.random.random(size=1000) * 180
+
+    statistics = grouped_error_statistics(groups, 6, abs_errors)
+    expected = pd.Series(abs_errors).groupby(groups)
+    assert statistics["count"].tolist() == [int((groups == g).sum()) for g in range(6)]
+    assert np.allclose(statistics["mean_absolute_angle_error"].drop(4), expected.mean())
+    assert np.allclose(statistics["p90_absolute_angle_error"].drop(4), expected.quantile(0.9, interpolation="higher"))
+    assert np.allclose(statistics["acc_pi_6"].drop(4), expected.apply(lambda errors: (errors < 30).mean()))
+    assert np.isnan(statistics.loc[4, "mean_absolute_angle_error"])
+
+
+def test_analyze_errors_joins_annotations(tmp_path):
+    annotations = pd.DataFrame(
+        {
+            "image_path": [f"images/{i}.jpg" for i in range(8)],
+            "is_train": [0, 0, 0, 0, 0, 0, 1, 1],
+            "azimuth": [10, 20, 100, 200, 300, 350, 10, 10],
+            "elevation": [0, 5, 12, 25, -3, 8, 0, 0],
+            "distance": [1, 2, 3, 4, 5, 6, 7, 8],
+        }
+    )
+    annotations_path = str(tmp_path / "annotations.arrow")
+    write_annotations(annotations, annotations_path)
+
+    # Store rows in another order than the table; the prediction of images/5.jpg is in the wrong quadrant
+    order = [5, 0, 1, 2, 3, 4]
+    y_true_angle = np.deg2rad(annotations["azimuth"].to_numpy()[order])
+    y_pred_angle = y_true_angle + np.deg2rad([60, 1, 2, 3, 4, 5])
+    store = {
+        "decoding": "sin_cos",
+        "image_ids": np.asarray([f"images/{i}.jpg" for i in order]),
+        "targets": np_get_sin_cos_from_angle(y_true_angle),
+        "predictions": np_get_sin_cos_from_angle(y_pred_angle),
+    }
+
+    report = analyze_errors(store, annotations_path, azimuth_bin_degrees=90, elevation_bin_degrees=10, n_distance_bins=2)
+    assert report["azimuth"]["count"].tolist() == [2, 1, 1, 2]
+    assert np.allclose(report["azimuth"]["mean_absolute_angle_error"], [1.5, 3, 4, 32.5])
+    assert report["elevation"]["bin_start"].tolist() == [-10, 0, 10, 20]
+    assert report["elevation"]["count"].tolist() == [1, 3, 1, 1]
+    assert report["distance"]["count"].tolist() == [3, 3]
+    assert report["split"]["split"].tolist() == ["val"]
+
+    confusion = report["quadrant_confusion"]
+    assert confusion.to_numpy().sum() == 6
+    assert confusion.loc["front_left", "front_right"] == 1
+    assert np.trace(confusion.to_numpy()) == 5
+    assert list(confusion.columns) == QUADRANTS
@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+import scipy.io as sio
+from omegaconf import OmegaConf
+
+from car_azimuth_predictor import feature_generation
+from car_azimuth_predictor.annotation_store import read_annotations
+from car_azimuth_predictor.feature_generation import generate_features
+
+
+def write_annotation(path, azimuth, elevation=10.0, distance=5.0):
+    viewpoint = np.array([[(azimuth, elevation, distance)]], dtype=[("azimuth", "O"), ("elevation", "O"), ("distance", "O")])
+    objects = np.array([[(viewpoint,)]], dtype=[("viewpoint", "O")])
+    sio.savemat(path, {"record": np.array([[(objects,)]], dtype=[("objects", "O")])})
+
+
+def test_incremental_feature_generation(tmp_path, monkeypatch):
+    base_path = tmp_path / "dataset"
+    annotations_path = base_path / "Annotations" / "car_imagenet"
+    os.makedirs(annotations_path)
+    os.makedirs(base_path / "Image_sets")
+    (base_path / "Image_sets" / "car_imagenet_train.txt").write_text("a\nb\n")
+    (base_path / "Image_sets" / "car_imagenet_val.txt").write_text("c\n")
+    for name, azimuth in [("a", 30.0), ("b", 200.0), ("c", 90.0)]:
+        write_annotation(annotations_path / f"{name}.mat", azimuth)
+
+    config = OmegaConf.create(
+        {
+            "data_processing": {
+                "dataset_base_path": "dataset",
+                "annotations_filename": "annotations.arrow",
+                "annotations_manifest_filename": "manifest.json",
+            }
+        }
+    )
+    monkeypatch.chdir(tmp_path)
+    generate_features(config, num_workers=2)
+    df = read_annotations(base_path / "annotations.arrow")
+    assert df["azimuth"].tolist() == [30.0, 200.0, 90.0]
+    assert df["is_train"].tolist() == [1, 1, 0]
+
+    # Only the rewritten file is parsed again
+    parsed = []
+    parse_annotation = feature_generation._parse_annotation
+    monkeypatch.setattr(feature_generation, "_parse_annotation", lambda path: parsed.append(path) or parse_annotation(path))
+    write_annotation(annotations_path / "b.mat", 120.0)
+    os.utime(annotations_path / "b.mat", ns=(0, 0))
+    generate_features(config, num_workers=1, incremental=True)
+
+    assert [os.path.basename(path) for path in parsed] == ["b.mat"]
+    df = read_annotations(base_path / "annotations.arrow")
+    assert df["azimuth"].tolist() == [30.0, 120.0, 90.0]
+    assert np.allclose(df["azimuth_sin"], np.sin(np.radians([30.0, 120.0, 90.0])))
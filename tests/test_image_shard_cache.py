@@ -0,0 +1,72 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from car_azimuth_predictor.annotation_store import read_annotations
+from car_azimuth_predictor.image_shard_cache import build_image_shards, load_image_shards
+
+
+def test_train_shards_are_permuted_and_val_shards_keep_table_order(tmp_path, synthetic_dataset):
+    dataset = synthetic_dataset(n_images=40)
+    gt_cols = ["azimuth_sin", "azimuth_cos"]
+    manifest = build_image_shards(dataset["annotations_path"], gt_cols, (16, 16), str(tmp_path / "shards"), n_shards=4)
+
+    def streamed_targets(split):
+        return np.array([target for _, target in load_image_shards(str(tmp_path / "shards"), manifest, split, shuffle=False).as_numpy_iterator()])
+
+    for split in ["train", "val"]:
+        expected = read_annotations(dataset["annotations_path"], gt_cols, split=split).to_numpy()
+        targets = streamed_targets(split)
+        # Same dtype as the JPEG path, which feeds the table columns
+        assert targets.dtype == expected.dtype == np.float32
+        # Every row once
+        np.testing.assert_allclose(np.sort(targets[:, 0]), np.sort(expected[:, 0]))
+        if split == "val":
+            np.testing.assert_allclose(targets, expected)
+        else:
+            assert not np.allclose(targets, expected)
+
+    # Another seed is another build
+    rebuilt = build_image_shards(dataset["annotations_path"], gt_cols, (16, 16), str(tmp_path / "shards"), n_shards=4, shuffle_seed=1)
+    assert rebuilt["fingerprint"] != manifest["fingerprint"]
+
+
+def test_worker_shards_partition_the_rows(tmp_path, synthetic_dataset):
+    dataset = synthetic_dataset(n_images=30)
+    gt_cols = ["azimuth_sin", "azimuth_cos"]
+    manifest = build_image_shards(dataset["annotations_path"], gt_cols, (16, 16), str(tmp_path / "shards"), n_shards=5)
+
+    worker_targets = [
+        [tuple(target) for _, target in load_image_shards(str(tmp_path / "shards"), manifest, "train", shuffle=True, num_shards=2, shard_index=index).as_numpy_iterator()]
+        for index in range(2)
+    ]
+    assert not set(worker_targets[0]) & set(worker_targets[1])
+    assert len(worker_targets[0]) + len(worker_targets[1]) == dataset["n_train"]
+
+    with pytest.raises(ValueError):
+        load_image_shards(str(tmp_path / "shards"), manifest, "train", shuffle=True, num_shards=6, shard_index=0)
+
+
+def test_builds_of_other_fingerprints_only_remove_their_own_shards(tmp_path, synthetic_dataset):
+    dataset = synthetic_dataset(n_images=20)
+    gt_cols = ["azimuth_sin", "azimuth_cos"]
+    cache_path = tmp_path / "shards"
+
+    def build(shuffle_seed):
+        return build_image_shards(dataset["annotations_path"], gt_cols, (16, 16), str(cache_path), n_shards=2, shuffle_seed=shuffle_seed)
+
+    def shard_files(manifest):
+        return {shard_file for split_shards in manifest["shards"].values() for shard_file in split_shards}
+
+    old = build(0)
+    # Two workers build the new fingerprint at once over the old cache
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        new, same = list(pool.map(build, [1, 1]))
+    assert new == same and new["fingerprint"] != old["fingerprint"]
+    assert not shard_files(new) & shard_files(old)
+    assert set(os.listdir(cache_path)) == shard_files(new) | {"manifest.json"}
+
+    rows = [target for split in ["train", "val"] for _, target in load_image_shards(str(cache_path), new, split, shuffle=False).as_numpy_iterator()]
+    assert len(rows) == 20
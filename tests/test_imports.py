@@ -0,0 +1,20 @@
+import subprocess
+import sys
+
+import pytest
+
+LIGHT_MODULES = [
+    "car_azimuth_predictor.utils.angle_codecs",
+    "car_azimuth_predictor.feature_generation",
+    "car_azimuth_predictor.utils.visualization_tools",
+    "car_azimuth_predictor.visualize",
+    "car_azimuth_predictor.prediction_store",
+    "car_azimuth_predictor.benchmarks",
+    "car_azimuth_predictor.utils.worker_tools",
+]
+
+
+@pytest.mark.parametrize("module", LIGHT_MODULES)
+def test_module_does_not_import_tensorflow(module):
+    code = f"import sys, {module}; assert 'tensorflow' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True)
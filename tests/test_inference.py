@@ -0,0 +1,26 @@
+import os
+
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from car_azimuth_predictor.inference import generate_inference_dataset
+from scripts.inference import load_image_to_tensor
+
+SAMPLE_IMAGES_PATH = os.path.join(os.path.dirname(__file__), "sample_images")
+
+
+def test_tf_data_pipeline_matches_the_serial_pil_path():
+    image_paths = [os.path.join(SAMPLE_IMAGES_PATH, file) for file in sorted(os.listdir(SAMPLE_IMAGES_PATH))[:8]]
+
+    from_tf_data = np.concatenate(list(generate_inference_dataset(image_paths, batch_size=3).as_numpy_iterator()))
+    from_pil = tf.stack([load_image_to_tensor(image_path) for image_path in image_paths]).numpy()
+    assert from_tf_data.dtype == from_pil.dtype == np.float32
+    assert np.array_equal(from_tf_data, from_pil)
+
+
+def test_serial_pipeline_is_single_process(tmp_path):
+    from scripts.inference import main
+
+    with pytest.raises(ValueError, match="--num_workers 1"):
+        main("model.h5", SAMPLE_IMAGES_PATH, "2", output_path=str(tmp_path / "out.json"), pipeline="serial", num_workers=4)
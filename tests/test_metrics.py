@@ -24,3 +24,97 @@ def test_angle_decoding():
         tf_get_angle_from_double_sigmoids(y_output=sigmoids).numpy().astype(np.float64)
     )
     assert np.sum(np.round(test_angles - angles_recovered_tf, 6)) == 0
+
+
+def test_angle_metrics_are_dataset_level():
+    from car_azimuth_predictor.utils.angle_codecs import np_get_sin_cos_from_angle
+    from car_azimuth_predictor.utils.numpy_metrics import np_angle_metrics
+    from car_azimuth_predictor.utils.training_tools import AngleMetrics
+
+    np.random.seed(1)
+    y_true_angle = (np.random.random(size=(300,)) * 2 - 1) * np.pi
+    y_pred_angle = y_true_angle + np.random.normal(scale=0.6, size=(300,))
+    y_pred_angle = (y_pred_angle + np.pi) % (2 * np.pi) - np.pi
+
+    metric = AngleMetrics("sin_cos")
+    # Uneven batches: the mean of per-batch values would differ
+    for start, end in [(0, 7), (7, 200), (200, 300)]:
+        metric.update_state(
+            np_get_sin_cos_from_angle(y_true_angle[start:end]), np_get_sin_cos_from_angle(y_pred_angle[start:end])
+        )
+
+    expected = np_angle_metrics(y_true_angle, y_pred_angle)
+    results = {name: float(value) for name, value in metric.result().items()}
+    assert set(results) == {"mean_absolute_angle_error", "rmse", "r2", "acc_pi_6"}
+    for name, value in results.items():
+        assert np.isclose(value, expected[name], atol=1e-3), name
+
+    metric.reset_state()
+    assert float(metric.result()["mean_absolute_angle_error"]) == 0
+
+
+def test_angle_error_percentiles_within_one_bin():
+    from car_azimuth_predictor.utils.angle_codecs import np_get_sin_cos_from_angle
+    from car_azimuth_predictor.utils.training_tools import AngleErrorPercentiles
+
+    np.random.seed(2)
+    y_true_angle = (np.random.random(size=(20000,)) * 2 - 1) * np.pi
+    y_pred_angle = y_true_angle + np.random.standard_cauchy(size=(20000,)) * 0.1
+    y_pred_angle = (y_pred_angle + np.pi) % (2 * np.pi) - np.pi
+    abs_error = np.abs((y_pred_angle - y_true_angle + np.pi) % (2 * np.pi) - np.pi) / np.pi * 180
+
+    # Two "workers" with their own histograms, merged by summing
+    metrics = [AngleErrorPercentiles("sin_cos", n_bins=360) for _ in range(2)]
+    for i, start in enumerate(range(0, 20000, 3000)):
+        end = start + 3000
+        metrics[i % 2].update_state(
+            np_get_sin_cos_from_angle(y_true_angle[start:end]), np_get_sin_cos_from_angle(y_pred_angle[start:end])
+        )
+    metrics[0].histogram.assign_add(metrics[1].histogram)
+
+    results = metrics[0].result()
+    for percentile in [50, 90, 99]:
+        value = float(results[f"p{percentile}_absolute_angle_error"])
+        assert abs(value - np.percentile(abs_error, percentile)) <= 180 / 360, percentile
+
+
+def test_double_output_loss_is_per_sample():
+    import tensorflow as tf
+
+    from car_azimuth_predictor.utils.training_tools import angle_double_output_loss
+
+    y_true = np.array([[0.2, 0.7], [0.9, 0.1]], dtype=np.float32)
+    y_pred = np.array([[0.3, 0.6], [0.8, 0.3]], dtype=np.float32)
+    per_sample = angle_double_output_loss(y_true, y_pred).numpy()
+    expected = [
+        tf.keras.metrics.binary_crossentropy(y_true[:, column], y_pred[:, column]).numpy() for column in range(2)
+    ]
+    assert per_sample.shape == (2,)
+    np.testing.assert_allclose(per_sample.mean(), sum(expected), rtol=1e-6)
+    # An empty batch (a worker without validation rows left) is empty, not NaN
+    assert angle_double_output_loss(y_true[:0], y_pred[:0]).shape == (0,)
+
+
+def test_numpy_metrics_match_the_tf_metrics():
+    from car_azimuth_predictor.utils import training_tools
+    from car_azimuth_predictor.utils.numpy_metrics import np_absolute_angle_errors, np_angle_metrics
+
+    np.random.seed(3)
+    y_true_angle = (np.random.random(size=(500,)) * 2 - 1) * np.pi
+    y_pred_angle = (y_true_angle + np.random.normal(scale=0.7, size=(500,)) + np.pi) % (2 * np.pi) - np.pi
+
+    expected = np_angle_metrics(y_true_angle, y_pred_angle)
+    tf_metrics = {
+        "mean_absolute_angle_error": training_tools.tf_mean_absolute_angle_error,
+        "median_absolute_angle_error": training_tools.tf_median_absolute_angle_error,
+        "rmse": training_tools.tf_rmse_angle,
+        "r2": training_tools.tf_r2_angle_score,
+        "acc_pi_6": training_tools.tf_acc_pi_6,
+    }
+    assert set(tf_metrics) == set(expected)
+    for name, tf_metric in tf_metrics.items():
+        value = float(tf_metric(y_true_angle.astype(np.float32), y_pred_angle.astype(np.float32)))
+        assert np.isclose(value, expected[name], rtol=1e-4, atol=1e-3), name
+
+    errors = np_absolute_angle_errors(y_true_angle, y_pred_angle)
+    assert errors.max() <= 180 and np.isclose(errors.mean(), expected["mean_absolute_angle_error"])
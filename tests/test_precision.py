@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from car_azimuth_predictor.model_generation import generate_top_model
+from car_azimuth_predictor.precision import cast_model_to_precision
+
+
+def model_with_head(approach: str) -> tf.keras.Model:
+    """A tiny convolutional backbone under the head of `approach`, nested like generate_model does"""
+    tf.keras.utils.set_random_seed(0)
+    inputs = tf.keras.layers.Input(shape=(32, 32, 3))
+    x = tf.keras.layers.Conv2D(8, 3, activation="relu", name="conv")(inputs / 255)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    x = tf.keras.layers.Dense(1280, activation="relu", name="embedding")(x)
+    return tf.keras.models.Model(inputs=inputs, outputs=generate_top_model(approach, 16, 0.0)(x))
+
+
+@pytest.mark.parametrize("approach", ["1", "2"])
+def test_cast_model_keeps_weights_and_float32_outputs(approach):
+    model = model_with_head(approach)
+    images = np.random.default_rng(0).uniform(0, 255, size=(8, 32, 32, 3)).astype(np.float32)
+
+    cast_model = cast_model_to_precision(model, "mixed_bfloat16")
+    assert cast_model_to_precision(model, "float32") is model
+    assert cast_model.get_layer("conv").compute_dtype == "bfloat16"
+    head = cast_model.layers[-1]
+    assert head.get_layer("mlp_middle").compute_dtype == "bfloat16"
+    for layer in head.layers[1:]:
+        if layer.name in ["mlp_output", "angle1_output", "angle2_output", "concatenate_angles_2_vars"]:
+            assert layer.compute_dtype == "float32", layer.name
+
+    # The weights are carried over as float32 variables
+    for weights, cast_weights in zip(model.get_weights(), cast_model.get_weights()):
+        assert cast_weights.dtype == np.float32
+        np.testing.assert_array_equal(weights, cast_weights)
+
+    outputs = cast_model.predict_on_batch(images)
+    assert outputs.dtype == np.float32
+    np.testing.assert_allclose(outputs, model.predict_on_batch(images), atol=0.02)
+
+
+def test_unnamed_sigmoid_heads_stay_float32():
+    # Models saved before the output layers were named: the sigmoids feed the output concatenation
+    inputs = tf.keras.layers.Input(shape=(4,))
+    hidden = tf.keras.layers.Dense(8, activation="relu")(inputs)
+    sigmoids = [tf.keras.layers.Dense(1, activation="sigmoid")(hidden) for _ in range(2)]
+    model = tf.keras.models.Model(inputs=inputs, outputs=tf.keras.layers.Concatenate()(sigmoids))
+
+    cast_model = cast_model_to_precision(model, "mixed_bfloat16")
+    assert [layer.compute_dtype for layer in cast_model.layers[1:]] == ["bfloat16", "float32", "float32", "float32"]
+    assert cast_model.predict_on_batch(np.ones((2, 4), np.float32)).dtype == np.float32
@@ -0,0 +1,45 @@
+import numpy as np
+
+from car_azimuth_predictor.prediction_cache import PredictionCache, model_fingerprint
+
+
+def test_prediction_cache_hits_and_eviction(tmp_path):
+    images = []
+    for i in range(4):
+        image_path = tmp_path / f"image_{i}.jpg"
+        image_path.write_bytes(bytes([i]) * 100)
+        images.append(str(image_path))
+    duplicate_path = tmp_path / "duplicate.jpg"
+    duplicate_path.write_bytes(bytes([0]) * 100)
+
+    model_path = tmp_path / "model.h5"
+    model_path.write_bytes(b"weights")
+    assert model_fingerprint(str(model_path), "1") != model_fingerprint(str(model_path), "2")
+
+    cache = PredictionCache(str(tmp_path / "cache.db"), model_fingerprint(str(model_path), "2"))
+    keys = [cache.key(image_path) for image_path in images]
+    assert cache.key(str(duplicate_path)) == keys[0]
+
+    assert cache.get_many(keys) == {}
+    outputs = [np.array([i / 10, 1 - i / 10], dtype=np.float32) for i in range(4)]
+    cache.put_many(list(zip(keys, outputs)))
+
+    found = cache.get_many(keys[:2])
+    assert np.array_equal(found[keys[1]], outputs[1])
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 4
+
+    # Keys 0 and 1 were just read, so 2 and 3 are the least recently used
+    row_size = cache.size_bytes() // 4
+    cache.evict(max_size_bytes=2 * row_size)
+    assert set(cache.get_many(keys)) == set(keys[:2])
+
+    # The running size follows replacements and evictions, and survives reopening
+    cache.put_many([(keys[0], np.zeros(8, dtype=np.float32)), (keys[2], outputs[2]), (keys[2], outputs[2])])
+    table_size = cache.connection.execute("SELECT SUM(size) FROM predictions").fetchone()[0]
+    assert cache.size_bytes() == table_size
+    cache.close()
+    cache = PredictionCache(str(tmp_path / "cache.db"), model_fingerprint(str(model_path), "2"), max_size_bytes=2 * row_size)
+    assert cache.size_bytes() == table_size
+    cache.put_many([(keys[3], outputs[3])])
+    assert cache.size_bytes() == cache.connection.execute("SELECT SUM(size) FROM predictions").fetchone()[0] <= 2 * row_size
+    cache.close()
@@ -0,0 +1,39 @@
+import numpy as np
+
+from car_azimuth_predictor.prediction_store import load_prediction_store, store_metrics, write_prediction_store
+from car_azimuth_predictor.utils.angle_codecs import np_get_angle_from_sin_cos, np_get_sin_cos_from_angle
+from car_azimuth_predictor.utils.numpy_metrics import np_angle_metrics
+
+
+class CountingModel:
+    """Adds noise to the targets, and counts its calls"""
+
+    def __init__(self):
+        self.n_calls = 0
+
+    def predict_on_batch(self, x_batch):
+        self.n_calls += 1
+        return np_get_sin_cos_from_angle(np_get_angle_from_sin_cos(x_batch) + 0.1)
+
+
+def test_prediction_store_single_pass(tmp_path):
+    np.random.seed(0)
+    targets = np_get_sin_cos_from_angle((np.random.random(size=(50,)) * 2 - 1) * np.pi).astype(np.float32)
+    # The "images" are the targets themselves, in batches of 16
+    dataset = [(targets[start:start + 16], targets[start:start + 16]) for start in range(0, 50, 16)]
+    image_ids = [f"images/{i:04d}.jpg" for i in range(50)]
+
+    model = CountingModel()
+    write_prediction_store(model, dataset, image_ids, str(tmp_path / "store"), "1", ["azimuth_sin", "azimuth_cos"])
+    assert model.n_calls == 4
+
+    store = load_prediction_store(str(tmp_path / "store"))
+    assert list(store["image_ids"]) == image_ids
+    assert np.array_equal(store["targets"], targets)
+
+    metrics = store_metrics(store, acc_thresholds_degrees=[5, 10])
+    expected = np_angle_metrics(np_get_angle_from_sin_cos(targets), np_get_angle_from_sin_cos(targets) + 0.1)
+    assert np.isclose(metrics["mean_absolute_angle_error"], expected["mean_absolute_angle_error"], atol=1e-3)
+    assert np.isclose(metrics["p90_absolute_angle_error"], 0.1 / np.pi * 180, atol=1e-3)
+    # 0.1 rad is 5.73 degrees
+    assert metrics["acc_5_degrees"] == 0 and metrics["acc_10_degrees"] == 1
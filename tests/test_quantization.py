@@ -0,0 +1,35 @@
+import numpy as np
+import tensorflow as tf
+
+from car_azimuth_predictor.model_generation import generate_top_model
+from car_azimuth_predictor.quantization import TFLiteModel, convert_to_int8_tflite, representative_dataset_from
+
+
+def small_model(approach: str) -> tf.keras.Model:
+    """A tiny convolutional backbone under the head of `approach`"""
+    tf.keras.utils.set_random_seed(0)
+    inputs = tf.keras.layers.Input(shape=(32, 32, 3))
+    x = tf.keras.layers.Conv2D(8, 3, activation="relu")(inputs / 255)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    x = tf.keras.layers.Dense(1280, activation="relu")(x)
+    return tf.keras.models.Model(inputs=inputs, outputs=generate_top_model(approach, 16, 0.0)(x))
+
+
+def test_int8_tflite_model_matches_keras(tmp_path):
+    rng = np.random.default_rng(0)
+    images = rng.uniform(0, 255, size=(24, 32, 32, 3)).astype(np.float32)
+    dataset = tf.data.Dataset.from_tensor_slices((images, np.zeros((24, 2), np.float32))).batch(8)
+
+    for approach in ["1", "2"]:
+        model = small_model(approach)
+        model_path = tmp_path / f"model_{approach}.tflite"
+        model_path.write_bytes(convert_to_int8_tflite(model, representative_dataset_from(dataset, 16)))
+
+        tflite_model = TFLiteModel(str(model_path), num_threads=1)
+        expected = model.predict(images, verbose=0)
+        # Batches of different sizes resize the interpreter input
+        outputs = np.concatenate(
+            [tflite_model.predict_on_batch(images[:5]), tflite_model.predict(tf.data.Dataset.from_tensor_slices(images[5:]).batch(19))]
+        )
+        assert outputs.dtype == np.float32 and outputs.shape == expected.shape
+        np.testing.assert_allclose(outputs, expected, atol=0.05)
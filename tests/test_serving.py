@@ -0,0 +1,66 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import numpy as np
+import pytest
+
+from car_azimuth_predictor.serving import MicroBatcher, PredictionServer, make_request_handler
+
+
+def test_micro_batcher_groups_concurrent_requests():
+    batch_sizes = []
+
+    def predict_fn(batch):
+        batch_sizes.append(len(batch))
+        return batch * 2
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=8, max_wait_ms=50)
+    items = [np.full((2,), i, dtype=np.float32) for i in range(32)]
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        results = list(pool.map(batcher.predict, items))
+    batcher.close()
+
+    for item, result in zip(items, results):
+        assert np.array_equal(result, item * 2)
+    assert sum(batch_sizes) == 32
+    assert max(batch_sizes) <= 8
+    assert len(batch_sizes) < 32
+
+    stats = batcher.stats()
+    assert stats["requests"] == 32
+    assert stats["latency_p50_ms"] <= stats["latency_p99_ms"]
+    assert 0 < stats["batch_fill"] <= 1
+
+
+def test_failed_batches_return_a_json_error():
+    def predict_fn(batch):
+        raise RuntimeError("model exploded")
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=4, max_wait_ms=1)
+    server = PredictionServer(("127.0.0.1", 0), make_request_handler(batcher, lambda outputs: outputs[:, 0]))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        sample_path = os.path.join(os.path.dirname(__file__), "sample_images", "sample_01.jpg")
+        with open(sample_path, "rb") as f:
+            request = urllib.request.Request(f"http://127.0.0.1:{server.server_port}/predict", data=f.read())
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(request, timeout=30)
+        assert error.value.code == 500
+        assert "model exploded" in json.loads(error.value.read())["error"]
+    finally:
+        server.shutdown()
+        server.server_close()
+        batcher.close()
+
+    # A model call that hangs fails the request instead of blocking it forever
+    release = threading.Event()
+    batcher = MicroBatcher(lambda batch: release.wait() and batch, max_wait_ms=1, inference_timeout_s=0.2)
+    with pytest.raises(TimeoutError):
+        batcher.predict(np.zeros(2, dtype=np.float32))
+    release.set()
+    batcher.close()
@@ -0,0 +1,59 @@
+import json
+
+import numpy as np
+from omegaconf import OmegaConf
+
+from car_azimuth_predictor.embedding_cache import EMBEDDING_SIZE
+from car_azimuth_predictor.sweep import rung_budgets, rung_patience, sample_trials, select_survivors
+from car_azimuth_predictor.train_model import train_approach_model
+
+
+def test_successive_halving_schedule():
+    assert rung_budgets(2, 18, 3) == [2, 6, 18]
+    assert rung_budgets(2, 10, 3) == [2, 6, 10]
+
+    scores = {0: 0.5, 1: 0.1, 2: float("nan"), 3: 0.3, 4: 0.2, 5: 0.9}
+    assert select_survivors(scores, 3) == [1, 4]
+    assert select_survivors(scores, 3, mode="max") == [5, 0]
+    assert select_survivors({7: 1.0}, 3) == [7]
+
+    space = {
+        "batch_size": [16, 32],
+        "learning_rate": {"distribution": "loguniform", "low": 1e-4, "high": 1e-2},
+    }
+    trials = sample_trials(space, 20, seed=1)
+    assert trials == sample_trials(space, 20, seed=1)
+    assert all(trial["batch_size"] in (16, 32) for trial in trials)
+    assert all(1e-4 <= trial["learning_rate"] <= 1e-2 for trial in trials)
+
+
+def test_rung_patience_can_trigger_within_the_rung():
+    assert [rung_patience(4, epochs) for epochs in [1, 2, 4, 12]] == [1, 1, 2, 4]
+
+
+def test_resumed_rungs_keep_the_optimizer_state(tmp_path):
+    rng = np.random.default_rng(0)
+    cache_path = tmp_path / "embeddings"
+    cache_path.mkdir()
+    gt_cols = ["azimuth_norm_abs", "azimuth_radians_shifted_0.5_pi_norm_abs"]
+    for split, n_rows in [("train", 32), ("val", 8)]:
+        np.save(cache_path / f"{split}_embeddings.npy", rng.normal(size=(n_rows, EMBEDDING_SIZE)).astype(np.float32))
+        np.save(cache_path / f"{split}_targets.npy", rng.uniform(size=(n_rows, 2)).astype(np.float32))
+    (cache_path / "metadata.json").write_text(json.dumps({"gt_cols": gt_cols}))
+
+    def train(epochs, initial_epoch):
+        model, _, _ = train_approach_model(
+            OmegaConf.create({}),
+            "2",
+            batch_size=16,
+            epochs=epochs,
+            initial_epoch=initial_epoch,
+            checkpoint_path=str(tmp_path / "trial_000"),
+            embedding_cache_path=str(cache_path),
+            verbose=0,
+        )
+        return model
+
+    train(epochs=1, initial_epoch=0)
+    # The second rung continues the optimizer's step count (and moments) of the first one
+    assert int(train(epochs=3, initial_epoch=1).optimizer.iterations) == 3 * 2
@@ -0,0 +1,73 @@
+import numpy as np
+
+from car_azimuth_predictor.video_inference import (
+    CircularExponentialSmoother,
+    circular_interpolate,
+    predict_video_azimuths,
+    select_keyframes,
+    wrap_angle,
+)
+
+
+def test_circular_interpolate_takes_the_short_arc_across_pi():
+    start, end = np.deg2rad(170), np.deg2rad(-170)
+    angles = np.rad2deg(circular_interpolate(start, end, np.array([0, 0.25, 0.5, 0.75, 1])))
+    # Through 180°, not through 0°
+    np.testing.assert_allclose(np.abs(angles), [170, 175, 180, 175, 170], atol=1e-9)
+    assert np.all(np.abs(angles) >= 170)
+
+
+def test_smoother_averages_across_pi():
+    smoother = CircularExponentialSmoother(alpha=0.5)
+    for angle in [179, -179, 179, -179]:
+        smoothed = smoother(np.deg2rad(angle))
+        assert abs(np.rad2deg(smoothed)) > 178
+    assert CircularExponentialSmoother(alpha=1)(np.deg2rad(-179)) == np.deg2rad(-179)
+
+
+def test_select_keyframes_by_interval_and_change():
+    frames = [np.zeros((16, 16, 3), dtype=np.uint8) for _ in range(8)]
+    frames[5] = np.full((16, 16, 3), 255, dtype=np.uint8)
+
+    by_interval = [is_keyframe for _, _, is_keyframe in select_keyframes(frames, keyframe_interval=3)]
+    assert by_interval == [True, False, False, True, False, False, True, False]
+
+    by_change = select_keyframes(frames, keyframe_interval=100, change_threshold=0.5)
+    assert [index for index, _, is_keyframe in by_change if is_keyframe] == [0, 5, 6]
+
+
+def test_predict_video_azimuths_interpolates_in_frame_order():
+    # The fake model reads the angle off the pixel values: frame i is at 150° + 10°·i,
+    # so the keyframes (every 3rd) cross ±π between frames 3 and 4
+    frames = [np.full((8, 8, 3), 10 * i, dtype=np.uint8) for i in range(11)]
+    calls = []
+
+    def predict_fn(images):
+        calls.append(len(images))
+        return images[:, 0, 0, 0]
+
+    def azimuth_converter(outputs):
+        return wrap_angle(np.deg2rad(150 + outputs))
+
+    results = list(
+        predict_video_azimuths(predict_fn, azimuth_converter, frames, keyframe_interval=3, batch_size=2, image_size=(8, 8), smoothing=1.0)
+    )
+
+    assert [index for index, _, _ in results] == list(range(11))
+    assert [index for index, _, is_keyframe in results if is_keyframe] == [0, 3, 6, 9]
+    assert calls == [2, 2]
+    expected = wrap_angle(np.deg2rad(150 + 10 * np.minimum(np.arange(11), 9)))
+    azimuths = np.array([azimuth for _, azimuth, _ in results])
+    np.testing.assert_allclose(wrap_angle(azimuths - expected), 0, atol=1e-6)
+
+
+def test_predict_video_azimuths_smooths_by_default():
+    frames = [np.full((8, 8, 3), 0 if i < 4 else 90, dtype=np.uint8) for i in range(8)]
+
+    def azimuth_converter(outputs):
+        return np.deg2rad(outputs.astype(np.float64))
+
+    results = predict_video_azimuths(lambda images: images[:, 0, 0, 0], azimuth_converter, frames, keyframe_interval=1, image_size=(8, 8))
+    azimuths = np.rad2deg([azimuth for _, azimuth, _ in results])
+    # The step to 90° is approached gradually instead of jumping
+    assert np.all(np.diff(azimuths) >= 0) and 0 < azimuths[4] < 90 and azimuths[-1] > 80
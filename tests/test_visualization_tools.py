@@ -0,0 +1,27 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from car_azimuth_predictor.utils.visualization_tools import render_prediction, render_predictions
+
+SAMPLE_IMAGE = os.path.join(os.path.dirname(__file__), "sample_images", "sample_01.jpg")
+
+
+@pytest.mark.parametrize("num_workers", [1, 2])
+def test_render_predictions_writes_every_item(tmp_path, num_workers):
+    array_image = np.zeros((60, 80, 3), dtype=np.uint8)
+    items = [
+        (SAMPLE_IMAGE, 30.0, 45.0, str(tmp_path / "path.png")),
+        (array_image, -120.0, None, str(tmp_path / "array.png")),
+        (SAMPLE_IMAGE, 179.0, -179.0, str(tmp_path / "wrap.png")),
+    ]
+
+    render_predictions(iter(items), num_workers=num_workers, chunksize=1)
+
+    for image, y_pred_angle, y_true_angle, save_path in items:
+        with Image.open(save_path) as rendered:
+            expected = render_prediction(image, y_pred_angle, y_true_angle)
+            assert rendered.size == expected.size
+            assert np.array_equal(np.array(rendered.convert("RGB")), np.array(expected))
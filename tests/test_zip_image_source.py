@@ -0,0 +1,62 @@
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+import numpy as np
+import tensorflow as tf
+
+from car_azimuth_predictor.inference import decode_and_resize_image, generate_inference_dataset
+from car_azimuth_predictor.zip_image_source import ZipImageSource
+
+SAMPLE_IMAGES_PATH = os.path.join(os.path.dirname(__file__), "sample_images")
+
+
+def test_zip_image_source_matches_the_extracted_files(tmp_path):
+    files = sorted(os.listdir(SAMPLE_IMAGES_PATH))[:6]
+    archive_path = str(tmp_path / "images.zip")
+    with ZipFile(archive_path, "w") as z:
+        for i, file in enumerate(files):
+            compression = ZIP_STORED if i % 2 else ZIP_DEFLATED
+            z.write(os.path.join(SAMPLE_IMAGES_PATH, file), f"root/Images/{file}", compress_type=compression)
+        z.writestr("root/Images/nested/other.txt", b"other")
+
+    source = ZipImageSource(archive_path)
+    image_paths = source.list_images("root/Images")
+    assert image_paths == [f"root/Images/{file}" for file in files]
+    for file, image_path in zip(files, image_paths):
+        with open(os.path.join(SAMPLE_IMAGES_PATH, file), "rb") as f:
+            assert source.read(image_path) == f.read()
+
+    # Paths of the annotation table, as if extracted under data/raw
+    extracted_source = pickle.loads(pickle.dumps(ZipImageSource(archive_path, extracted_root="/data/raw")))
+    assert extracted_source.read(f"/data/raw/root/Images/{files[0]}") == source.read(image_paths[0])
+
+    # Parallel tf.data reads give the same tensors as the files
+    from_zip = np.concatenate(list(generate_inference_dataset(image_paths, batch_size=4, image_source=source).as_numpy_iterator()))
+    from_files = np.stack(
+        [decode_and_resize_image(tf.constant(os.path.join(SAMPLE_IMAGES_PATH, file)), (224, 224)).numpy() for file in files]
+    )
+    assert np.array_equal(from_zip, from_files)
+
+
+def test_close_unmaps_the_archive_of_every_thread(tmp_path):
+    files = sorted(os.listdir(SAMPLE_IMAGES_PATH))[:4]
+    archive_path = str(tmp_path / "images.zip")
+    with ZipFile(archive_path, "w") as z:
+        for file in files:
+            z.write(os.path.join(SAMPLE_IMAGES_PATH, file), file)
+
+    with ZipImageSource(archive_path) as source:
+        with ThreadPoolExecutor(4) as pool:
+            contents = list(pool.map(source.read, files))
+        archives = list(source._archives)
+        assert len(archives) > 1
+    assert all(archive.closed for archive in archives) and not source._archives
+    # Reads after close map the archive again
+    assert source.read(files[0]) == contents[0]
+    source.close()
+
+    # File reads must not be folded or deduplicated by TensorFlow
+    graph = tf.function(source.read_file).get_concrete_function(tf.TensorSpec((), tf.string)).graph
+    assert [op.type for op in graph.get_operations() if op.type.startswith("PyFunc")] == ["PyFunc"]
@@ -0,0 +1,49 @@
+import os
+from zipfile import ZipFile
+
+import pytest
+
+from car_azimuth_predictor.utils import zip_tools
+from car_azimuth_predictor.utils.zip_tools import unzip
+
+
+def test_unzip_skips_extracted_entries(tmp_path):
+    archive_path = str(tmp_path / "dataset.zip")
+    with ZipFile(archive_path, "w") as z:
+        for i in range(10):
+            z.writestr(f"root/Images/car/{i}.JPEG", os.urandom(100 + i))
+        z.writestr("root/Images/bus/0.JPEG", b"bus")
+        z.writestr("root/Image_sets/car_train.txt", b"0\n1\n")
+        z.writestr("root/Images/car/empty/", b"")
+
+    target_path = str(tmp_path / "raw")
+    members = ["root/Images/car", "root/Image_sets/car_train.txt"]
+    # The directory entry is made before the workers start, so it counts as skipped
+    assert unzip(archive_path, target_path, members, num_workers=2, chunk_size=3) == {"extracted": 11, "skipped": 1}
+    assert not os.path.exists(os.path.join(target_path, "root/Images/bus"))
+    assert os.path.isdir(os.path.join(target_path, "root/Images/car/empty"))
+    assert not [name for name in os.listdir(os.path.join(target_path, "root/Images/car")) if ".tmp-" in name]
+
+    # A truncated file and a missing one are extracted again, the others are kept
+    with open(os.path.join(target_path, "root/Images/car/3.JPEG"), "r+b") as f:
+        f.truncate(10)
+    os.remove(os.path.join(target_path, "root/Images/car/7.JPEG"))
+    assert unzip(archive_path, target_path, members, num_workers=1) == {"extracted": 2, "skipped": 10}
+    with ZipFile(archive_path) as z:
+        with open(os.path.join(target_path, "root/Images/car/3.JPEG"), "rb") as f:
+            assert f.read() == z.read("root/Images/car/3.JPEG")
+
+
+def test_interrupted_unzip_leaves_no_partial_file(tmp_path, monkeypatch):
+    archive_path = str(tmp_path / "dataset.zip")
+    with ZipFile(archive_path, "w") as z:
+        z.writestr("root/a.JPEG", os.urandom(1000))
+
+    def interrupted_copy(source, target, length=0):
+        target.write(source.read(10))
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(zip_tools.shutil, "copyfileobj", interrupted_copy)
+    with pytest.raises(KeyboardInterrupt):
+        unzip(archive_path, str(tmp_path / "raw"), ["root"], num_workers=1)
+    assert os.listdir(tmp_path / "raw" / "root") == []